@@ -0,0 +1,80 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Parity check and benchmark for the extract backends.
+
+Extracts every replay with both the 'slippi' and the 'raw'
+backend, checks that the payloads are identical, and
+compares parse time and peak memory per replay.
+
+Usage (from the repository root):
+
+    python -m benchmarks.backends <replay.slp | replay_directory> ...
+'''
+
+import sys
+import time
+import tracemalloc
+
+from src.extract import extract, BACKENDS
+from .istreams import replay_files
+
+def same_payload(a, b):
+    '''Returns true if two extract payloads are identical'''
+    if len(a) != len(b):
+        return False
+    for x, y in zip(a, b):
+        for key in ('game_id', 'character', 'name', 'code'):
+            if x[key] != y[key]:
+                return False
+        if x['istream'].shape != y['istream'].shape:
+            return False
+        if (x['istream'] != y['istream']).nnz != 0:
+            return False
+    return True
+
+def measure(f, backend):
+    '''Extracts f with the given backend, returns (payload, seconds, peak bytes)'''
+    tracemalloc.start()
+    t = time.perf_counter()
+    payload = extract(f, backend=backend)
+    seconds = time.perf_counter() - t
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return payload, seconds, peak
+
+def main(args):
+    files = replay_files(args)
+    if not files:
+        print(__doc__)
+        return
+
+    seconds = {backend: 0. for backend in BACKENDS}
+    peak = {backend: 0 for backend in BACKENDS}
+    mismatches = 0
+
+    for f in files:
+        payloads = {}
+        for backend in BACKENDS:
+            payloads[backend], s, p = measure(f, backend)
+            seconds[backend] += s
+            peak[backend] = max(peak[backend], p)
+
+        if not same_payload(*payloads.values()):
+            print(f'MISMATCH: {f}')
+            mismatches += 1
+
+    print(f'{len(files)} replays, {mismatches} mismatches')
+    for backend in BACKENDS:
+        print(
+            f'{backend:>7}: {seconds[backend] / len(files) * 1000:.1f} ms/replay, '
+            f'peak {peak[backend] / 2**20:.1f} MiB'
+        )
+
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
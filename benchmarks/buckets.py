@@ -0,0 +1,137 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Check and benchmark for length-bucketed full-game batches
+(data.character_games and base_model.masked_model).
+
+On a game store (or one built from synthetic replays of
+random lengths, see synthetic.py):
+
+    parity      masked_model on every padded batch gives the
+                same outputs as the model on each unpadded game
+    padding     frames of padding added per real frame, for
+                different numbers of length buckets
+    epoch       time of one forward pass over every game, with
+                8 buckets, with 1 bucket (padding to the longest
+                game), and over the same games cut into 30s clips
+
+Usage (from the repository root):
+
+    python -m benchmarks.buckets [game_store] [--games 16] [--batch 8]
+'''
+
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+from os import path, makedirs
+
+import numpy as np
+
+from src.base_model import base_model, masked_model, min_frames
+from src.data import bucket_boundaries, bucket_batches, character_games
+from src.games import write_game_store, open_game_store
+from .synthetic import write_replay
+
+CLIP_FRAMES = 1800
+
+def write_synthetic_store(directory, n_games, seed=0):
+    '''Writes replays of random lengths (30s to 6min) and a game store of them'''
+    rng = np.random.default_rng(seed)
+    replays = path.join(directory, 'replays')
+    makedirs(replays)
+    for i, n_frames in enumerate(rng.integers(1800, 21600, n_games)):
+        write_replay(path.join(replays, f'game-{i}.slp'), n_frames=int(n_frames), seed=i)
+    store = path.join(directory, 'store')
+    write_game_store(replays, store)
+    return store
+
+def forward_epoch(model, batches):
+    '''Seconds to run model on every batch'''
+    t = time.perf_counter()
+    for inputs in batches:
+        model.predict_on_batch(inputs)
+    return time.perf_counter() - t
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Bucketed batching benchmark (see benchmarks/buckets.py)')
+    parser.add_argument('game_store', nargs='?', help='game store to read (default: synthetic games)')
+    parser.add_argument('--games', type=int, default=16, help='number of synthetic games')
+    parser.add_argument('--batch', type=int, default=8, help='games per batch')
+    args = parser.parse_args(args)
+
+    directory = None
+    store_directory = args.game_store
+    if store_directory is None:
+        directory = tempfile.mkdtemp(prefix='ssbml-buckets-')
+        store_directory = write_synthetic_store(directory, args.games)
+
+    try:
+        model = base_model()
+        masked = masked_model(model)
+        shortest = min_frames(model)
+
+        store = open_game_store(store_directory)
+        streams, starts, lengths = store.segments(store.streams(), min_frames=shortest)
+        print(f'\n{len(lengths)} games, {lengths.sum()} frames, {lengths.min()} to {lengths.max()} frames long')
+
+        # parity with the unpadded games
+        error = 0.
+        for (istreams, batch_lengths), _ in character_games(store_directory, args.batch, min_frames=shortest, n_buckets=4):
+            outputs = masked.predict_on_batch([istreams, batch_lengths])
+            for output, istream, length in zip(outputs, istreams, batch_lengths):
+                expected = model.predict_on_batch(istream[None, :length])[0]
+                error = max(error, np.abs(output - expected).max())
+        print(f'parity with unpadded games: max error {error:.1e}')
+
+        # padding overhead
+        for n_buckets in (1, 2, 4, 8, 16):
+            boundaries = bucket_boundaries(lengths, n_buckets)
+            padded = sum(
+                len(batch) * frames
+                for batch, frames in bucket_batches(lengths, boundaries, args.batch, shuffle=False)
+            )
+            print(f'{n_buckets:>2} buckets: {padded / lengths.sum() - 1:6.1%} padding')
+
+        # forward epochs
+        def game_batches(n_buckets):
+            boundaries = bucket_boundaries(lengths, n_buckets)
+            return [
+                [store.gather(streams[batch], starts[batch], lengths[batch], frames), lengths[batch].astype(np.int32)]
+                for batch, frames in bucket_batches(lengths, boundaries, args.batch, shuffle=False)
+            ]
+
+        bucketed, padded = game_batches(8), game_batches(1)
+        clip_streams = np.repeat(streams, lengths // CLIP_FRAMES)
+        clip_starts = np.concatenate([np.arange(n) * CLIP_FRAMES for n in lengths // CLIP_FRAMES])
+        clips = [
+            store.gather(
+                clip_streams[i:i+args.batch], clip_starts[i:i+args.batch],
+                np.full(len(clip_streams[i:i+args.batch]), CLIP_FRAMES)
+            )
+            for i in range(0, len(clip_streams), args.batch)
+        ]
+
+        # trace every batch shape once
+        forward_epoch(masked, bucketed + padded)
+        forward_epoch(model, clips[:1])
+
+        for name, seconds in (
+            ('8 buckets', forward_epoch(masked, bucketed)),
+            ('1 bucket', forward_epoch(masked, padded)),
+            ('30s clips', forward_epoch(model, clips)),
+        ):
+            print(f'{name:>10}: {seconds:6.2f}s per epoch ({lengths.sum() / seconds:8.0f} game frames/sec)')
+
+    finally:
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    if error > 1e-4:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
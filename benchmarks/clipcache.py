@@ -0,0 +1,102 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Check and benchmark for the in-memory clip cache
+(cache.ClipCache, the cache argument of the data loaders).
+
+Runs several epochs of data.player_data over a player and an
+anonymous clip directory (synthetic ones, see synthetic.py,
+unless given) without a cache, with the default cache, with a
+dense cache and with a budget too small for every clip, and
+reports the time of every epoch and the cache statistics.
+Cached batches are checked against uncached ones.
+
+Usage (from the repository root):
+
+    python -m benchmarks.clipcache [player_directory anonymous_directory] [--epochs 3]
+'''
+
+import sys
+import time
+import random
+import shutil
+import tempfile
+import argparse
+from os import path
+
+import numpy as np
+
+from src.data import player_data
+from src.cache import ClipCache, CLIP_CACHES
+from .synthetic import write_clips
+
+def epochs(player_directory, anonymous_directory, n_epochs, cache):
+    '''Seconds of every epoch of player_data, and the batches of the last one'''
+    random.seed(0)
+    np.random.seed(0)
+    seconds = []
+    for _ in range(n_epochs):
+        t = time.perf_counter()
+        batches = list(player_data(player_directory, anonymous_directory, cache=cache))
+        seconds.append(time.perf_counter() - t)
+    return seconds, batches
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Clip cache benchmark (see benchmarks/clipcache.py)')
+    parser.add_argument('directories', nargs='*', help='player and anonymous clip directories')
+    parser.add_argument('--epochs', type=int, default=3, help='epochs per run')
+    parser.add_argument('--clips', type=int, default=256, help='clips per synthetic directory')
+    args = parser.parse_args(args)
+
+    directory = None
+    if args.directories:
+        player_directory, anonymous_directory = args.directories
+    else:
+        directory = tempfile.mkdtemp(prefix='ssbml-clipcache-')
+        player_directory = path.join(directory, 'player')
+        anonymous_directory = path.join(directory, 'anonymous')
+        write_clips(player_directory, n_clips=args.clips, seed=1)
+        write_clips(anonymous_directory, n_clips=args.clips, character='FALCO', code='XYZ#2', seed=2)
+
+    failed = False
+    try:
+        baseline, expected = epochs(player_directory, anonymous_directory, args.epochs, None)
+        print(f'{"no cache":>12}: ' + ', '.join(f'{s:.2f}s' for s in baseline))
+
+        def same(batches):
+            return len(batches) == len(expected) and all(
+                np.allclose(x, ex, atol=1e-6) and np.array_equal(y, ey)
+                for (x, y), (ex, ey) in zip(batches, expected)
+            )
+
+        # cache=True uses the shared per-directory caches
+        seconds, batches = epochs(player_directory, anonymous_directory, args.epochs, True)
+        print(f'{"cache":>12}: ' + ', '.join(f'{s:.2f}s' for s in seconds) + f', same batches {same(batches)}')
+        for cached_directory, cache in CLIP_CACHES.items():
+            print(f'{"":>14}{path.basename(cached_directory)}: {cache}')
+        failed |= not same(batches)
+
+        dense = ClipCache(dense=True)
+        seconds, batches = epochs(player_directory, anonymous_directory, args.epochs, dense)
+        print(f'{"dense cache":>12}: ' + ', '.join(f'{s:.2f}s' for s in seconds) + f', same batches {same(batches)}')
+        print(f'{"":>14}{dense}')
+        failed |= not same(batches)
+
+        # a third of the clips fit: batches are the same, most reads miss
+        small = ClipCache(max_bytes=sum(cache.size for cache in CLIP_CACHES.values()) // 3)
+        seconds, batches = epochs(player_directory, anonymous_directory, args.epochs, small)
+        print(f'{"small cache":>12}: ' + ', '.join(f'{s:.2f}s' for s in seconds) + f', same batches {same(batches)}')
+        print(f'{"":>14}{small}')
+        failed |= not same(batches) or small.size > small.max_bytes
+
+    finally:
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
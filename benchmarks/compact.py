@@ -0,0 +1,86 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Round trip check and size/speed benchmark for compact istreams.
+
+Extracts every replay as float64 csr istreams and as compact
+istreams, checks that the compact ones decode to exactly the
+same values, and compares their size in memory, pickled size,
+and batch decode time for 30 second clips.
+
+Usage (from the repository root):
+
+    python -m benchmarks.compact <replay.slp | replay_directory> ...
+'''
+
+import sys
+import time
+import pickle
+
+import numpy as np
+from slippi.parse import ParseError
+
+from src.extract import extract, InvalidGameError, GameTooShortError
+from src.compact import stack_istreams
+from .istreams import replay_files
+
+CLIP_FRAMES = 1800
+
+def csr_nbytes(istream):
+    return istream.data.nbytes + istream.indices.nbytes + istream.indptr.nbytes
+
+def main(args):
+    files = replay_files(args)
+    if not files:
+        print(__doc__)
+        return
+
+    sizes = {'csr': 0, 'compact': 0}
+    pickled = {'csr': 0, 'compact': 0}
+    mismatches = 0
+    replays = 0
+    clips = {'csr': [], 'compact': []}
+
+    for f in files:
+        try:
+            players = zip(extract(f, backend='raw'), extract(f, backend='raw', compact=True))
+        except (ParseError, InvalidGameError, GameTooShortError) as e:
+            print(f'skipping {f}: {type(e).__name__}')
+            continue
+
+        replays += 1
+        for sparse, compact in players:
+            sparse, compact = sparse['istream'], compact['istream']
+
+            if not np.array_equal(sparse.toarray(), compact.toarray()):
+                print(f'MISMATCH: {f}')
+                mismatches += 1
+
+            sizes['csr'] += csr_nbytes(sparse)
+            sizes['compact'] += compact.nbytes
+            pickled['csr'] += len(pickle.dumps(sparse))
+            pickled['compact'] += len(pickle.dumps(compact))
+
+            for i in range(0, sparse.shape[0] - CLIP_FRAMES, CLIP_FRAMES):
+                clips['csr'].append(sparse[i:i + CLIP_FRAMES])
+                clips['compact'].append(compact[i:i + CLIP_FRAMES])
+
+    print(f'{replays} replays, {mismatches} mismatches')
+    for kind in sizes:
+        print(f'{kind:>8}: {sizes[kind] / 2**20:.2f} MiB in memory, {pickled[kind] / 2**20:.2f} MiB pickled')
+    print(f'    ratio: {sizes["csr"] / sizes["compact"]:.1f}x in memory, {pickled["csr"] / pickled["compact"]:.1f}x pickled')
+
+    for kind, batch in clips.items():
+        t = time.perf_counter()
+        for i in range(0, len(batch), 32):
+            stack_istreams(batch[i:i + 32])
+        seconds = time.perf_counter() - t
+        print(f'{kind:>8}: decoded {len(batch)} clips in {seconds * 1000:.1f} ms')
+
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,131 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Parity check and latency/throughput benchmark for
+the CPU exports of src/export.py.
+
+Builds SSBML-Base-Model (with random BatchNormalization
+statistics, so folding has something to fold) and
+replace_head of it, exports both as float32, float16 and
+int8 TFLite, and compares every artifact (and the folded
+keras model) against the keras model it came from:
+output error, prediction agreement, size, batch-1 latency
+and batch throughput.
+
+Clips come from a clip directory, or synthetic clips
+(see synthetic.py) when none is given.
+
+Usage (from the repository root):
+
+    python -m benchmarks.export [clip_directory] [--output directory]
+'''
+
+import sys
+import time
+import tempfile
+import argparse
+from os import path
+
+import numpy as np
+from tensorflow import keras
+
+from src.base_model import base_model
+from src.transfer import replace_head
+from src.stream import flatten_layers
+from src.export import fold_model, export_tflite, calibration_clips, TFLiteModel, parity, QUANTIZATIONS
+from .synthetic import write_clips
+
+BATCH_SIZE = 32
+LATENCY_CALLS = 20
+THROUGHPUT_BATCHES = 5
+
+def randomize_batch_norm(model, rng):
+    '''Gives every BatchNormalization of model random (trained looking) statistics'''
+    for layer in flatten_layers(model):
+        if isinstance(layer, keras.layers.BatchNormalization):
+            shape = layer.gamma.shape
+            layer.set_weights([
+                rng.uniform(.5, 1.5, shape).astype(np.float32),
+                rng.normal(0, .3, shape).astype(np.float32),
+                rng.normal(0, .3, shape).astype(np.float32),
+                rng.uniform(.5, 2, shape).astype(np.float32),
+            ])
+
+def speed(model, clips):
+    '''Batch-1 latency (median and p99, ms) and batch throughput (clips/sec)'''
+    model.predict_on_batch(clips[:1])
+    latencies = []
+    for i in range(LATENCY_CALLS):
+        t = time.perf_counter()
+        model.predict_on_batch(clips[i % len(clips)][None])
+        latencies.append(time.perf_counter() - t)
+
+    batch = clips[:BATCH_SIZE]
+    model.predict_on_batch(batch)
+    t = time.perf_counter()
+    for _ in range(THROUGHPUT_BATCHES):
+        model.predict_on_batch(batch)
+    seconds = time.perf_counter() - t
+
+    return {
+        'latency_ms': float(np.median(latencies) * 1000),
+        'p99_latency_ms': float(np.percentile(latencies, 99) * 1000),
+        'clips_per_sec': THROUGHPUT_BATCHES * len(batch) / seconds,
+    }
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Export benchmark (see benchmarks/export.py)')
+    parser.add_argument('clip_directory', nargs='?', help='clips to calibrate and compare on')
+    parser.add_argument('--output', help='directory to write the .tflite files to (default: a temporary directory)')
+    args = parser.parse_args(args)
+
+    output_directory = args.output or tempfile.mkdtemp(prefix='ssbml-export-')
+    clip_directory = args.clip_directory
+    if clip_directory is None:
+        clip_directory = path.join(output_directory, 'clips')
+        write_clips(clip_directory, n_clips=2 * BATCH_SIZE + 64)
+
+    clips = calibration_clips(clip_directory, n_clips=None)
+    calibration, clips = clips[:64], clips[64:]
+
+    rng = np.random.default_rng(0)
+    base = base_model()
+    base.build((None, clips.shape[1], 13))
+    randomize_batch_norm(base, rng)
+    transfer = replace_head(base)
+    randomize_batch_norm(transfer.layers[-1], rng)
+
+    failed = False
+    for model in (base, transfer):
+        print(f'\n{model.name}')
+        reference = speed(model, clips)
+        print(f'{"keras":>8}: {reference["latency_ms"]:6.1f} ms latency (p99 {reference["p99_latency_ms"]:.1f}), {reference["clips_per_sec"]:6.1f} clips/sec')
+
+        candidates = {'folded': fold_model(model)}
+        sizes = {}
+        for quantization in QUANTIZATIONS:
+            output_path = path.join(output_directory, f'{model.name}-{quantization}.tflite')
+            sizes[quantization] = export_tflite(model, output_path, quantization, calibration)
+            candidates[quantization] = TFLiteModel(output_path)
+
+        for name, candidate in candidates.items():
+            report = parity(model, candidate, clips)
+            timing = speed(candidate, clips)
+            size = f', {sizes[name] / 2**20:5.1f} MiB' if name in sizes else ''
+            print(
+                f'{name:>8}: {timing["latency_ms"]:6.1f} ms latency (p99 {timing["p99_latency_ms"]:.1f}), '
+                f'{timing["clips_per_sec"]:6.1f} clips/sec, '
+                f'max error {report["max_abs_error"]:.1e}, agreement {report["agreement"]:.2f}{size}'
+            )
+
+            # float exports should match the keras model to float error
+            if name in ('folded', 'float32') and report['max_abs_error'] > 1e-4:
+                failed = True
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,155 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Check and benchmark for extract.extract_many.
+
+On synthetic replays (plus one corrupt and one too short replay):
+
+    parity      every payload of extract_many (dense and sparse,
+                ordered and not) is the same as extract's
+    errors      the corrupt and the short replay come back as a
+                ParseError / GameTooShortError result
+    order       ordered=True gives the replays in input order
+    crash       a replay that kills its worker process comes back
+                as a BrokenProcessPool result, and every other
+                replay is still extracted
+    leaks       no shared memory block is left in /dev/shm after
+                consuming every result, or after stopping early
+
+Then times extracting every replay densely: a serial loop over
+extract, extract_many through shared memory, and extract_many
+pickling the istreams back. (With a single CPU only the overhead
+of the worker processes shows.)
+
+Usage (from the repository root):
+
+    python -m benchmarks.extract_many [--replays 16] [--frames 20000] [--workers 4]
+'''
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+from os import path
+
+import numpy as np
+from scipy.sparse import issparse
+
+import src.extract
+from src.extract import extract, extract_many, GameTooShortError
+from .synthetic import write_replays, write_replay
+
+def shared_blocks():
+    '''Names of the shared memory blocks that exist right now'''
+    return set(os.listdir('/dev/shm')) if path.isdir('/dev/shm') else set()
+
+def same_payload(a, b):
+    '''Returns true if two extract payloads are identical'''
+    if len(a) != len(b):
+        return False
+    for x, y in zip(a, b):
+        if any(x[key] != y[key] for key in ('game_id', 'character', 'name', 'code')):
+            return False
+        u, v = x['istream'], y['istream']
+        if issparse(u):
+            u, v = u.toarray(), v.toarray()
+        if u.shape != v.shape or not np.array_equal(u, v):
+            return False
+    return True
+
+def crashing_extract(f, **kwargs):
+    '''extract, except that it kills its process on replays named crash.slp'''
+    if path.basename(f) == 'crash.slp':
+        os._exit(1)
+    return extract(f, **kwargs)
+
+def main(args):
+    parser = argparse.ArgumentParser(description='extract_many benchmark (see benchmarks/extract_many.py)')
+    parser.add_argument('--replays', type=int, default=16, help='number of synthetic replays')
+    parser.add_argument('--frames', type=int, default=20000, help='frames per synthetic replay')
+    parser.add_argument('--workers', type=int, default=4, help='worker processes')
+    args = parser.parse_args(args)
+
+    failed = False
+    directory = tempfile.mkdtemp(prefix='ssbml-extract-many-')
+    try:
+        files = write_replays(directory, n_replays=args.replays, n_frames=args.frames)
+        corrupt, short = path.join(directory, 'corrupt.slp'), path.join(directory, 'short.slp')
+        with open(corrupt, 'wb') as f:
+            f.write(b'not a replay')
+        write_replay(short, n_frames=600)
+        everything = files[:2] + [corrupt] + files[2:4] + [short]
+
+        before = shared_blocks()
+
+        # parity, errors and order
+        for as_sparse in (False, True):
+            expected = {f: extract(f, as_sparse=as_sparse) for f in files[:4]}
+            for ordered in (False, True):
+                results = list(extract_many(everything, workers=args.workers, as_sparse=as_sparse, ordered=ordered))
+                same = all(same_payload(payload, expected[f]) for f, payload in results if f in expected)
+                errors = {f: type(payload).__name__ for f, payload in results if isinstance(payload, Exception)}
+                in_order = [f for f, _ in results] == everything
+                print(
+                    f'as_sparse={as_sparse!s:5} ordered={ordered!s:5}: '
+                    f'{"same" if same else "DIFFERENT"} payloads, errors {sorted(errors.values())}, '
+                    f'{"input" if in_order else "completion"} order'
+                )
+                failed |= not same
+                failed |= errors != {corrupt: 'ParseError', short: GameTooShortError.__name__}
+                failed |= ordered and not in_order
+                del results
+
+        # a worker process dying (workers are forked, so they see the patch)
+        crash = path.join(directory, 'crash.slp')
+        open(crash, 'wb').close()
+        paths = files[:3] + [crash] + files[3:]
+        src.extract.extract = crashing_extract
+        try:
+            results = list(extract_many(paths, workers=args.workers, as_sparse=False, ordered=True))
+        finally:
+            src.extract.extract = extract
+        errors = [(f, type(payload).__name__) for f, payload in results if isinstance(payload, Exception)]
+        print(f'worker crash: {len(results)} of {len(paths)} results, errors {errors}')
+        failed |= [f for f, _ in results] != paths or errors != [(crash, 'BrokenProcessPool')]
+        del results
+
+        # stopping early
+        for f, payload in extract_many(files, workers=args.workers, as_sparse=False):
+            break
+        del payload
+        leaked = shared_blocks() - before
+        print(f'shared memory blocks left: {len(leaked)}')
+        failed |= bool(leaked)
+
+        # timing
+        def serial():
+            return [(f, extract(f, as_sparse=False)) for f in files]
+
+        def many(shared):
+            return lambda: list(extract_many(files, workers=args.workers, as_sparse=False, shared=shared))
+
+        nbytes = sum(doc['istream'].nbytes for _, payload in serial() for doc in payload)
+        print(f'\n{len(files)} replays, {nbytes / 2**20:.0f} MiB of dense istreams, {os.cpu_count()} CPU(s)')
+        for name, run in (
+            ('serial loop', serial),
+            ('shared memory', many(True)),
+            ('pickled', many(False)),
+        ):
+            t = time.perf_counter()
+            run()
+            seconds = time.perf_counter() - t
+            print(f'{name:>14}: {seconds:6.2f}s ({len(files) / seconds:5.1f} replays/sec)')
+
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,77 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Check and benchmark for game stores (see src/games.py).
+
+Builds a game store from a directory of replays, checks
+that sampled windows are exact slices of the extracted
+games and that the game-level split never puts a game
+on both sides, then times random window batches against
+reading pre-cut clips with data.character_data.
+
+Usage (from the repository root):
+
+    python -m benchmarks.games <replay_directory> <game_store> [clip_directory]
+'''
+
+import sys
+import time
+from os import path
+
+import numpy as np
+
+from src.games import write_game_store, open_game_store
+from src.extract import extract
+from src.data import character_data, character_windows
+
+WINDOW_FRAMES = 1800
+BATCHES = 50
+
+def time_batches(batches):
+    t = time.perf_counter()
+    n = sum(1 for _ in batches)
+    return (time.perf_counter() - t) / max(n, 1), n
+
+def main(args):
+    if len(args) < 2:
+        print(__doc__)
+        return
+
+    replay_directory, store_directory = args[:2]
+    added, failures = write_game_store(replay_directory, store_directory)
+    store = open_game_store(store_directory)
+    print(f'\nadded {added} games ({failures} failures), {len(store)} player streams')
+    print(f'{store.frames.nbytes / 2**20:.2f} MiB of frames, {store.frames.shape[1]} bytes/frame')
+
+    # every window is an exact slice of its game
+    rng = np.random.default_rng(0)
+    mismatches = 0
+    for game_id in np.unique(store.games['game_id']):
+        streams = store.streams(clip_filter={'game_id': game_id})
+        players = extract(path.join(replay_directory, game_id), as_sparse=False, backend='raw')
+        batch, batch_streams = store.sample(streams, 8, WINDOW_FRAMES, rng, dtype=np.float64)
+        for istream, stream in zip(batch, batch_streams):
+            full = players[list(streams).index(stream)]['istream']
+            offsets = range(len(full) - WINDOW_FRAMES + 1)
+            if not any(np.array_equal(full[i:i + WINDOW_FRAMES], istream) for i in offsets):
+                mismatches += 1
+    print(f'{mismatches} window mismatches')
+
+    train = set(store.games['game_id'][store.streams('train')])
+    test = set(store.games['game_id'][store.streams('test')])
+    print(f'{len(train)} train games, {len(test)} test games, {len(train & test)} on both sides')
+
+    seconds, n = time_batches(character_windows(store_directory, num_batches=BATCHES, repeat=True, onehot=False))
+    print(f'character_windows: {seconds * 1000:.1f} ms/batch ({n} batches)')
+
+    if len(args) > 2:
+        seconds, n = time_batches(character_data(args[2], num_batches=BATCHES, onehot=False))
+        print(f'character_data: {seconds * 1000:.1f} ms/batch ({n} batches)')
+
+    if mismatches or train & test:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,133 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Correctness check and search benchmark for identify.PlayerIndex.
+
+With an (untrained) SSBML-Base-Model:
+
+    incremental     a synthetic clip directory of a few players is
+                    added, more clips are written into it, and adding
+                    it again only embeds the new clips
+    retrieval       every clip of the directory, searched by='clip',
+                    finds its own player first (similarity 1)
+
+Then the search is timed on a gallery of random embeddings of
+--players players with --clips clips each, both by='centroid' and
+by='clip', and checked against a brute force search.
+
+Usage (from the repository root):
+
+    python -m benchmarks.identify [--players 5000] [--clips 20] [--queries 32]
+'''
+
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+from os import path
+
+import numpy as np
+
+from src.base_model import base_model
+from src.identify import PlayerIndex, normalize
+from src.data import list_clips, get_clips
+from .synthetic import write_clips
+
+# synthetic players of the incremental check, and their clips per write
+CODES = ('ABC#1', 'DEF#2', 'GHI#3', 'JKL#4')
+CLIPS_PER_WRITE = 8
+
+def write_players(directory, first_clip_id, seed):
+    '''Writes CLIPS_PER_WRITE clips of every player of CODES into directory'''
+    for i, code in enumerate(CODES):
+        write_clips(
+            directory,
+            n_clips = CLIPS_PER_WRITE,
+            code = code,
+            seed = seed + i,
+            first_clip_id = first_clip_id + i * CLIPS_PER_WRITE
+        )
+    return first_clip_id + len(CODES) * CLIPS_PER_WRITE
+
+def brute_force(index, queries, by):
+    '''(queries, players) similarities, the slow and obvious way'''
+    queries = normalize(queries)
+    if by == 'centroid':
+        centroids = normalize([index.sums[row] / index.counts[row] for row in range(index.n_players)])
+        return queries @ centroids.T
+    vectors = np.concatenate(index.chunks).astype(np.float32)
+    labels = np.concatenate(index.labels)
+    similarities = queries @ vectors.T
+    return np.stack([similarities[:, labels == row].max(axis=1) for row in range(index.n_players)], axis=1)
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Player index benchmark (see benchmarks/identify.py)')
+    parser.add_argument('--players', type=int, default=5000, help='players in the timed gallery')
+    parser.add_argument('--clips', type=int, default=20, help='clips per player in the timed gallery')
+    parser.add_argument('--queries', type=int, default=32, help='clips identified per search')
+    args = parser.parse_args(args)
+
+    failed = False
+    base = base_model()
+    base.build((None, 1800, 13))
+
+    # incremental insertion
+    directory = tempfile.mkdtemp(prefix='ssbml-identify-')
+    try:
+        next_id = write_players(directory, 0, seed=0)
+        index = PlayerIndex(base)
+        first = index.add_directory(directory)
+        again = index.add_directory(directory)
+        write_players(directory, next_id, seed=100)
+        t = time.perf_counter()
+        added = index.add_directory(directory)
+        seconds = time.perf_counter() - t
+        print(f'incremental: {first} clips added, then {again} on re-adding, then {added} new ones in {seconds:.2f}s')
+        failed |= (first, again, added) != (len(CODES) * CLIPS_PER_WRITE, 0, len(CODES) * CLIPS_PER_WRITE)
+
+        # every clip finds itself
+        istreams, _ = get_clips(list_clips(directory), directory)
+        candidates = index.identify(istreams, k=1, by='clip')
+        codes = [path.basename(f).split('-')[1] for f in list_clips(directory)]
+        hits = np.mean([c[0][0] == code for c, code in zip(candidates, codes)])
+        print(f'retrieval: {hits:.2f} of clips find their own player first')
+        failed |= hits < 1
+
+        saved = path.join(directory, 'players.npz')
+        index.save(saved)
+        loaded = PlayerIndex.load(saved, base)
+        same = loaded.identify(istreams[:4], k=2) == index.identify(istreams[:4], k=2)
+        print(f'save / load: {"same" if same else "different"} results')
+        failed |= not same
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    # search speed on a large random gallery
+    rng = np.random.default_rng(0)
+    n_clips = args.players * args.clips
+    index = PlayerIndex(base)
+    codes = [f'P{p}#{p}' for p in range(args.players)]
+    t = time.perf_counter()
+    for i in range(0, n_clips, 10000):
+        rows = np.arange(i, min(i + 10000, n_clips))
+        index.add(rng.normal(size=(len(rows), 512)), [codes[r % args.players] for r in rows])
+    print(f'\ngallery: {args.players} players, {n_clips} clips added in {time.perf_counter() - t:.2f}s')
+
+    queries = rng.normal(size=(args.queries, 512)).astype(np.float32)
+    for by in ('centroid', 'clip'):
+        index.search(queries, by=by)
+        t = time.perf_counter()
+        index.search(queries, by=by)
+        seconds = time.perf_counter() - t
+        error = np.abs(index.similarities(queries, by) - brute_force(index, queries, by)).max()
+        print(f'{by:>9}: {seconds * 1000:7.1f} ms per {args.queries} queries, max error vs brute force {error:.1e}')
+        failed |= error > 1e-3
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,85 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Import time benchmark.
+
+Imports parts of the project in fresh interpreters and
+reports wall time, peak RSS, and whether TensorFlow
+(or tensorflow_addons) got imported along the way.
+'eager src' imports every submodule the way src/__init__.py
+used to, as the "before" side of the benchmark.
+
+Usage (from the repository root):
+
+    python -m benchmarks.imports [--repeats 5] [--json]
+'''
+
+import sys
+import json
+import argparse
+import subprocess
+
+import numpy as np
+
+STATEMENTS = {
+    'src': 'import src',
+    'src.extract': 'import src.extract',
+    'src.clippify': 'import src.clippify',
+    'src.predict': 'import src.predict',
+    'src.games': 'import src.games',
+    'src.data': 'import src.data',
+    'src.base_model': 'import src.base_model',
+    'src.transfer': 'import src.transfer',
+    'eager src': 'import src.util, src.extract, src.clippify, src.data, src.base_model, src.transfer',
+}
+
+# run in the child interpreter: time the import, then report
+PROBE = '''
+import sys, time, json, resource
+t = time.perf_counter()
+{statement}
+seconds = time.perf_counter() - t
+print(json.dumps({{
+    'seconds': seconds,
+    'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'tensorflow': 'tensorflow' in sys.modules,
+    'tensorflow_addons': 'tensorflow_addons' in sys.modules,
+}}))
+'''
+
+def measure(statement, repeats):
+    '''Imports statement in repeats fresh interpreters, returns median time and the last report'''
+    runs = []
+    for _ in range(repeats):
+        out = subprocess.run(
+            [sys.executable, '-c', PROBE.format(statement=statement)],
+            capture_output=True, text=True, check=True
+        ).stdout
+        runs.append(json.loads(out.strip().splitlines()[-1]))
+
+    result = runs[-1]
+    result['seconds'] = float(np.median([run['seconds'] for run in runs]))
+    return result
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Import time benchmark (see benchmarks/imports.py)')
+    parser.add_argument('--repeats', type=int, default=5, help='fresh interpreters per import, the median is reported')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args(args)
+
+    results = {name: measure(statement, args.repeats) for name, statement in STATEMENTS.items()}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    for name, result in results.items():
+        loaded = 'tensorflow' if result['tensorflow'] else '-'
+        if result['tensorflow_addons']:
+            loaded += ', tensorflow_addons'
+        print(f'{name:>15}: {result["seconds"] * 1000:7.0f} ms, {result["peak_rss_mb"]:6.0f} MiB peak RSS, imports {loaded}')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
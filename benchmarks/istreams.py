@@ -0,0 +1,139 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Before/after benchmark for extract.get_istreams.
+
+Compares the original frame-by-frame lil_matrix builder
+against the current column-wise builder on a set of
+replay files, and checks that both give the same output.
+
+Usage (from the repository root):
+
+    python -m benchmarks.istreams <replay.slp | replay_directory> ...
+'''
+
+import sys
+import time
+from os import path, listdir
+
+from slippi import Game
+from scipy.sparse import lil_matrix, csr_matrix
+
+from src.extract import get_istreams
+
+def get_istreams_legacy(game, as_sparse=True):
+    '''
+    Original implementation of extract.get_istreams,
+    kept here as the "before" side of the benchmark.
+    '''
+
+    istreams = []
+
+    for j in range(4):
+
+        istream = lil_matrix((len(game.frames), 13))
+
+        for i, frame in enumerate(game.frames):
+
+            if frame.ports[j] is None:
+                istream = None
+                break
+
+            port = frame.ports[j].leader.pre
+
+            istream[i, 0] = port.joystick.x
+            istream[i, 1] = port.joystick.y
+            istream[i, 2] = port.cstick.x
+            istream[i, 3] = port.cstick.y
+            istream[i, 4] = port.triggers.physical.l
+            istream[i, 5] = port.triggers.physical.r
+
+            b = port.buttons
+            if b.Physical.Y in b.physical.pressed():
+                istream[i, 6] = 1
+            if b.Physical.X in b.physical.pressed():
+                istream[i, 7] = 1
+            if b.Physical.B in b.physical.pressed():
+                istream[i, 8] = 1
+            if b.Physical.A in b.physical.pressed():
+                istream[i, 9] = 1
+            if b.Physical.L in b.physical.pressed():
+                istream[i, 10] = 1
+            if b.Physical.R in b.physical.pressed():
+                istream[i, 11] = 1
+            if b.Physical.Z in b.physical.pressed():
+                istream[i, 12] = 1
+
+        else:
+            if as_sparse:
+                istream = csr_matrix(istream)
+            else:
+                istream = istream.toarray()
+
+        istreams.append(istream)
+
+    return tuple(istreams)
+
+def same_istreams(a, b):
+    '''Returns true if two 4-tuples of csr istreams are identical'''
+    for x, y in zip(a, b):
+        if x is None or y is None:
+            if x is not y:
+                return False
+        elif x.shape != y.shape or (x != y).nnz != 0:
+            return False
+    return True
+
+def replay_files(args):
+    '''Expands the command line arguments into a list of .slp files'''
+    files = []
+    for arg in args:
+        if path.isdir(arg):
+            files += [path.join(arg, f) for f in sorted(listdir(arg))
+                      if path.splitext(f)[1] == '.slp']
+        else:
+            files.append(arg)
+    return files
+
+def main(args):
+    files = replay_files(args)
+    if not files:
+        print(__doc__)
+        return
+
+    frames = 0
+    before = 0.
+    after = 0.
+
+    for f in files:
+
+        # parse once up front, and touch every pre-frame
+        # so py-slippi's lazy parsing is not timed by either side
+        game = Game(f)
+        for frame in game.frames:
+            for port in frame.ports:
+                if port is not None:
+                    port.leader.pre
+
+        t = time.perf_counter()
+        old = get_istreams_legacy(game)
+        before += time.perf_counter() - t
+
+        t = time.perf_counter()
+        new = get_istreams(game)
+        after += time.perf_counter() - t
+
+        if not same_istreams(old, new):
+            raise AssertionError(f'istreams differ for {f}')
+
+        frames += len(game.frames)
+
+    print(f'{len(files)} replays, {frames} frames')
+    print(f'before: {before:.3f}s ({frames / before:,.0f} frames/s)')
+    print(f'after:  {after:.3f}s ({frames / after:,.0f} frames/s)')
+    print(f'speedup: {before / after:.1f}x')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,51 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Throughput benchmark for sliding-window replay scoring.
+
+Scores every replay with an (untrained) SSBML-Base-Model
+through predict.predict_directory, and reports replays
+per hour and windows per second.
+
+Usage (from the repository root):
+
+    python -m benchmarks.predict <replay_directory> [workers]
+'''
+
+import sys
+import time
+
+from src.base_model import base_model
+from src.predict import predict_directory
+
+def main(args):
+    if not args:
+        print(__doc__)
+        return
+
+    input_directory = args[0]
+    workers = int(args[1]) if len(args) > 1 else 1
+
+    model = base_model()
+    model.build((None, None, 13))
+
+    replays = 0
+    failures = 0
+    windows = 0
+
+    t = time.perf_counter()
+    for _, predictions in predict_directory(input_directory, model, workers=workers):
+        if isinstance(predictions, Exception):
+            failures += 1
+            continue
+        replays += 1
+        windows += sum(p['windows'] for p in predictions)
+    seconds = time.perf_counter() - t
+
+    print(f'{replays} replays scored ({failures} failed) in {seconds:.1f}s')
+    print(f'{replays / seconds * 3600:.0f} replays/hour, {windows / seconds:.0f} windows/s')
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
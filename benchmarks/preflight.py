@@ -0,0 +1,136 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Check and benchmark for slp.preflight.
+
+On a directory of synthetic replays (1v1 games, games under a
+minute, 4 player games, and corrupt and truncated files):
+
+    agreement   every replay preflight rejects as corrupt or too
+                short is also rejected by extract, for the same
+                reason, and every 1v1 game extract accepts passes
+    timing      preflight per replay against extract per replay
+    clippify    a clippify run with and without preflight, and
+                where its failed replays were rejected
+
+Usage (from the repository root):
+
+    python -m benchmarks.preflight [--replays 8] [--frames 20000]
+'''
+
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+from os import path, makedirs
+from contextlib import redirect_stdout
+from io import StringIO
+
+from slippi.parse import ParseError
+
+from src.slp import preflight, PARSE_ERROR, TOO_SHORT, NOT_1V1
+from src.extract import extract, GameTooShortError
+from src.clippify import clippify
+from .synthetic import write_replay, FOX, FALCO
+
+def write_corpus(directory, n_replays, n_frames):
+    '''Writes the synthetic replays, returns {filepath: expected preflight result}'''
+    makedirs(directory)
+    expected = {}
+    for i in range(n_replays):
+        for kind, frames, characters, reason in (
+            ('game', n_frames, (FOX, FALCO, None, None), None),
+            ('short', 1200 + 200 * i, (FOX, FALCO, None, None), TOO_SHORT),
+            ('doubles', n_frames, (FOX, FALCO, FOX, FALCO), NOT_1V1),
+        ):
+            f = path.join(directory, f'{kind}-{i}.slp')
+            write_replay(f, n_frames=frames, characters=characters, codes=('ABC#1', 'XYZ#2', 'DEF#3', 'GHI#4'), seed=i)
+            expected[f] = reason
+
+    # not a replay at all, and a replay cut off halfway through
+    corrupt = path.join(directory, 'corrupt.slp')
+    with open(corrupt, 'wb') as f:
+        f.write(b'{U\x03raw[$U#l' + bytes(64))
+    expected[corrupt] = PARSE_ERROR
+
+    truncated = path.join(directory, 'truncated.slp')
+    write_replay(truncated, n_frames=n_frames)
+    with open(truncated, 'rb') as f:
+        data = f.read()
+    with open(truncated, 'wb') as f:
+        f.write(data[:len(data) // 2])
+    expected[truncated] = PARSE_ERROR
+
+    return expected
+
+def extract_outcome(f):
+    '''How extract ends on f (the preflight reason it should match)'''
+    try:
+        extract(f)
+    except GameTooShortError:
+        return TOO_SHORT
+    except ParseError:
+        return PARSE_ERROR
+    except Exception as e:
+        return type(e).__name__
+    return None
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Preflight benchmark (see benchmarks/preflight.py)')
+    parser.add_argument('--replays', type=int, default=8, help='synthetic replays of every kind')
+    parser.add_argument('--frames', type=int, default=20000, help='frames per full-length replay')
+    args = parser.parse_args(args)
+
+    failed = False
+    directory = tempfile.mkdtemp(prefix='ssbml-preflight-')
+    try:
+        replays = path.join(directory, 'replays')
+        expected = write_corpus(replays, args.replays, args.frames)
+
+        # agreement with extract
+        t = time.perf_counter()
+        reasons = {f: preflight(f) for f in expected}
+        preflight_seconds = time.perf_counter() - t
+
+        t = time.perf_counter()
+        outcomes = {f: extract_outcome(f) for f in expected}
+        extract_seconds = time.perf_counter() - t
+
+        wrong = [f for f in expected if reasons[f] != expected[f]]
+        disagree = [f for f in expected if reasons[f] != NOT_1V1 and reasons[f] != outcomes[f]]
+        print(f'{len(expected)} replays: {len(wrong)} with an unexpected preflight result, {len(disagree)} where extract disagrees')
+        for f in wrong + disagree:
+            print(f'    {path.basename(f)}: preflight {reasons[f]}, extract {outcomes[f]}, expected {expected[f]}')
+        failed |= bool(wrong or disagree)
+
+        # timing
+        n = len(expected)
+        print(f'preflight: {preflight_seconds / n * 1e6:8.0f} us per replay')
+        print(f'  extract: {extract_seconds / n * 1e6:8.0f} us per replay')
+
+        # clippify
+        for use_preflight in (True, False):
+            output = path.join(directory, f'clips-{use_preflight}')
+            with redirect_stdout(StringIO()):
+                stats = clippify(replays, output, preflight=use_preflight)
+            summary = stats.as_dict()
+            print(
+                f'\nclippify, preflight={use_preflight}: {summary["clips"]} clips in {summary["elapsed"]:.2f}s\n'
+                f'    rejected at pre-flight: {summary["preflight_rejections"]}\n'
+                f'    rejected after parsing: {summary["parse_rejections"]}'
+            )
+            if use_preflight:
+                failed |= summary['parse_rejections'] != {}
+                failed |= sum(summary['preflight_rejections'].values()) != sum(r is not None for r in expected.values())
+
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,110 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Round trip check and benchmark of run-length encoded
+istreams against the float64 csr istreams clips are
+pickled with by default (and compact istreams).
+
+For every replay, checks that the run-length istreams decode
+exactly, then compares pickled size of the 30 second clips,
+batch decode time, and the time to cut a clip out of a full
+game (run-length window vs. decoding and slicing the game).
+
+Usage (from the repository root):
+
+    python -m benchmarks.rle <replay.slp | replay_directory> ...
+'''
+
+import sys
+import time
+import pickle
+
+import numpy as np
+from slippi.parse import ParseError
+
+from src.extract import extract, InvalidGameError, GameTooShortError
+from src.compact import compact_istream, stack_istreams
+from src.rle import rle_istream
+from .istreams import replay_files
+
+CLIP_FRAMES = 1800
+BATCH_SIZE = 32
+
+def timed(fn, *args):
+    t = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - t
+
+def main(args):
+    files = replay_files(args)
+    if not files:
+        print(__doc__)
+        return
+
+    encoders = {
+        'csr': lambda istream: istream,
+        'compact': compact_istream,
+        'rle': rle_istream,
+    }
+
+    replays = 0
+    mismatches = 0
+    ratios = []
+    clips = {kind: [] for kind in encoders}
+    window_seconds = {'rle window': 0., 'decode + slice': 0.}
+
+    for f in files:
+        try:
+            players = extract(f, backend='raw')
+        except (ParseError, InvalidGameError, GameTooShortError) as e:
+            print(f'skipping {f}: {type(e).__name__}')
+            continue
+
+        replays += 1
+        for doc in players:
+            istream = doc['istream']
+            encoded = rle_istream(istream)
+            ratios.append(encoded.compression_ratio)
+
+            if not np.array_equal(encoded.toarray(), istream.toarray()):
+                print(f'MISMATCH: {f}')
+                mismatches += 1
+
+            for i in range(0, istream.shape[0] - CLIP_FRAMES, CLIP_FRAMES):
+                for kind, encode in encoders.items():
+                    clips[kind].append(encode(istream[i:i + CLIP_FRAMES]))
+
+                window_seconds['rle window'] += timed(lambda: encoded[i:i + CLIP_FRAMES].toarray())
+                window_seconds['decode + slice'] += timed(lambda: encoded.toarray()[i:i + CLIP_FRAMES])
+
+    n_clips = len(clips['csr'])
+    if not n_clips:
+        print('no clips')
+        return
+
+    print(f'{replays} replays, {n_clips} clips, {mismatches} mismatches')
+    print(f'rle compression ratio vs dense float64: mean {np.mean(ratios):.1f}x, min {np.min(ratios):.1f}x')
+
+    csr_bytes = sum(len(pickle.dumps(clip)) for clip in clips['csr'])
+    for kind, batch in clips.items():
+        pickled = sum(len(pickle.dumps(clip)) for clip in batch)
+        seconds = sum(
+            timed(stack_istreams, batch[i:i + BATCH_SIZE])
+            for i in range(0, n_clips, BATCH_SIZE)
+        )
+        print(
+            f'{kind:>8}: {pickled / n_clips / 1024:.1f} KiB/clip pickled '
+            f'({csr_bytes / pickled:.1f}x smaller than csr), '
+            f'batch decode {seconds / n_clips * 1e6:.0f} us/clip'
+        )
+
+    for kind, seconds in window_seconds.items():
+        print(f'{kind:>15}: {seconds / n_clips * 1e6:.0f} us/clip')
+
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,119 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Check and benchmark for the keras Sequence loaders
+(data.CharacterSequence and data.PlayerSequence).
+
+    determinism   the same seed gives the same batches, every
+                  epoch of CharacterSequence covers every clip once
+                  and is shuffled differently, PlayerSequence keeps
+                  about the requested player / anonymous ratio
+    throughput    batches/sec of character_data against
+                  CharacterSequence loaded by keras' OrderedEnqueuer
+                  (what model.fit uses) with 1 to --workers processes
+    fit           one model.fit epoch of SSBML-Base-Model on a
+                  CharacterSequence with worker processes
+
+Clips come from a clip directory, or synthetic clips
+(see synthetic.py) when none is given.
+
+Usage (from the repository root):
+
+    python -m benchmarks.sequences [clip_directory] [--workers 4] [--batch 32]
+'''
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import argparse
+from os import path
+
+import numpy as np
+from tensorflow import keras
+
+from src.data import character_data, list_clips, CharacterSequence, PlayerSequence
+from .synthetic import write_clips
+
+def time_enqueued(sequence, workers):
+    '''Batches/sec of sequence loaded by worker processes, as model.fit does'''
+    enqueuer = keras.utils.OrderedEnqueuer(sequence, use_multiprocessing=workers > 1)
+    enqueuer.start(workers=workers, max_queue_size=2 * workers)
+    try:
+        batches = enqueuer.get()
+        t = time.perf_counter()
+        for _ in range(len(sequence)):
+            next(batches)
+        return len(sequence) / (time.perf_counter() - t)
+    finally:
+        enqueuer.stop()
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Sequence loader benchmark (see benchmarks/sequences.py)')
+    parser.add_argument('clip_directory', nargs='?', help='clips to load')
+    parser.add_argument('--workers', type=int, default=4, help='largest number of worker processes')
+    parser.add_argument('--batch', type=int, default=32, help='clips per batch')
+    args = parser.parse_args(args)
+
+    directory = None
+    clip_directory = args.clip_directory
+    if clip_directory is None:
+        directory = tempfile.mkdtemp(prefix='ssbml-sequences-')
+        clip_directory = path.join(directory, 'clips')
+        write_clips(clip_directory, n_clips=8 * args.batch)
+        write_clips(clip_directory, n_clips=4 * args.batch, character='FALCO', code='XYZ#2', seed=1, first_clip_id=8 * args.batch)
+
+    failed = False
+    try:
+        # determinism and coverage
+        sequence = CharacterSequence(clip_directory, args.batch, onehot=False, seed=0)
+        again = CharacterSequence(clip_directory, args.batch, onehot=False, seed=0)
+        same = all(np.array_equal(sequence[i][0], again[i][0]) for i in range(len(sequence)))
+        epochs = []
+        for _ in range(2):
+            epochs.append(np.concatenate([sequence.order()[i * args.batch:(i + 1) * args.batch] for i in range(len(sequence))]))
+            sequence.on_epoch_end()
+        covered = all(np.array_equal(np.sort(epoch), np.arange(len(sequence.clips))) for epoch in epochs)
+        reshuffled = not np.array_equal(epochs[0], epochs[1])
+        print(f'character: same batches for the same seed {same}, every clip once per epoch {covered}, reshuffled every epoch {reshuffled}')
+        failed |= not (same and covered and reshuffled)
+
+        players = PlayerSequence(
+            clip_directory, clip_directory, args.batch, ratio=2, seed=0,
+            player_filter={'code': 'XYZ#2'}, anonymous_filter={'not_code': 'XYZ#2'}
+        )
+        labels = np.concatenate([players[i][1] for i in range(len(players))])
+        print(f'player: {len(players)} batches, {labels.mean():.2f} player clips (ratio 2 -> {1 / 3:.2f})')
+        failed |= abs(labels.mean() - 1 / 3) > .1 or not np.array_equal(players[1][1], players[1][1])
+
+        # throughput
+        t = time.perf_counter()
+        n = sum(1 for _ in character_data(clip_directory, args.batch, onehot=False))
+        print(f'\ncharacter_data: {n / (time.perf_counter() - t):6.1f} batches/sec')
+        for workers in sorted({1, 2, args.workers}):
+            rate = time_enqueued(CharacterSequence(clip_directory, args.batch, seed=0), workers)
+            print(f'CharacterSequence, {workers} worker(s): {rate:6.1f} batches/sec')
+        print(f'({os.cpu_count()} CPUs)')
+
+        # model.fit with worker processes
+        from src.base_model import base_model
+        model = base_model()
+        t = time.perf_counter()
+        history = model.fit(
+            CharacterSequence(clip_directory, args.batch, seed=0),
+            epochs = 1, workers = args.workers, use_multiprocessing = True, verbose = 0
+        )
+        print(f'\nfit: 1 epoch in {time.perf_counter() - t:.1f}s with {args.workers} workers, loss {history.history["loss"][-1]:.3f}')
+
+    finally:
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,73 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Parity check and latency benchmark for stream.StreamingVerifier.
+
+Streams every player of a replay through a verifier built
+from an (untrained) SSBML-Base-Model one frame at a time,
+checks every score against the model run on the same window,
+and reports per-frame latency.
+
+Usage (from the repository root):
+
+    python -m benchmarks.stream <replay.slp> [--no-spread]
+'''
+
+import sys
+import time
+
+import numpy as np
+
+from src.base_model import base_model
+from src.extract import extract
+from src.stream import StreamingVerifier
+
+# window starts are 32 frames apart (ConvCell-1 to 3 pool by 4 * 4 * 2)
+SCORE_STRIDE = 32
+
+def main(args):
+    if not args:
+        print(__doc__)
+        return
+
+    spread = '--no-spread' not in args
+    model = base_model()
+    model.build((None, None, 13))
+    verifier = StreamingVerifier(model, spread=spread)
+
+    latencies = []
+    max_error = 0.
+    for doc in extract(args[0], as_sparse=False, backend='raw'):
+        istream = doc['istream'].astype(np.float32)
+        verifier.reset()
+
+        scores = []
+        for frame_inputs in istream:
+            t = time.perf_counter()
+            score = verifier.push(frame_inputs)
+            latencies.append(time.perf_counter() - t)
+            if score is not None and (not scores or score is not scores[-1]):
+                scores.append(score)
+
+        windows = np.stack([
+            istream[i * SCORE_STRIDE:i * SCORE_STRIDE + 1800] for i in range(len(scores))
+        ])
+        expected = model.predict(windows, verbose=0)
+        max_error = max(max_error, float(np.abs(expected - np.stack(scores)).max()))
+
+    latencies = np.array(latencies) * 1e6
+    print(f'{len(latencies)} frames, spread={spread}, max score error {max_error:.2e}')
+    print(
+        f'latency: mean {latencies.mean():.0f}us, '
+        f'p50 {np.percentile(latencies, 50):.0f}us, '
+        f'p99 {np.percentile(latencies, 99):.0f}us, '
+        f'max {latencies.max():.0f}us'
+    )
+
+    if max_error > 1e-4:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,283 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+End-to-end benchmark suite for the hot paths of the project:
+
+    get_istreams      extract.get_istreams on parsed games
+    extract_slippi    extract.extract with the slippi backend
+    extract_raw       extract.extract with the raw backend
+    clippify_game     clippify.clippify_game, one replay at a time
+    clippify          clippify.clippify on the replay directory
+    character_data    data.character_data over pickled clips
+    character_store   data.character_data over a clip store
+    player_data       data.player_data over pickled clips
+    base_model        base_model.base_model() forward passes
+    transfer_model    transfer.replace_head() forward passes
+
+Everything runs on deterministic synthetic replays and clips
+(see synthetic.py), so results can be compared between versions.
+Every benchmark runs in a fresh process, so its peak RSS is its own
+(and includes the interpreter and its imports).
+
+Results are printed (or written with --output) as JSON:
+{
+    'environment': {commit, python, numpy, tensorflow, ...},
+    'config': {replays, frames, clips, repeats, batch_size},
+    'results': {benchmark: {seconds, frames_per_sec | clips_per_sec | batches_per_sec, peak_rss_mb}},
+}
+
+Usage (from the repository root):
+
+    python -m benchmarks.suite [--output results.json] [--only name ...]
+                               [--replays 8] [--frames 4000] [--clips 256]
+                               [--repeats 3] [--data directory]
+'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import resource
+import argparse
+import tempfile
+import subprocess
+from os import path, listdir, makedirs
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+from .synthetic import write_replays, write_clips
+
+BATCH_SIZE = 32
+CLIP_LENGTH = 30
+
+def best_of(fn, repeats):
+    '''Runs fn repeats times, returns (fastest seconds, last result)'''
+    best = np.inf
+    for _ in range(repeats):
+        t = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t)
+    return best, result
+
+def replays_of(data):
+    directory = path.join(data, 'replays')
+    return sorted(path.join(directory, f) for f in listdir(directory))
+
+def fresh_directory(data, name):
+    directory = path.join(data, 'out', name)
+    shutil.rmtree(directory, ignore_errors=True)
+    makedirs(directory)
+    return directory
+
+# ==============================
+#   benchmarks
+# ==============================
+
+def bench_get_istreams(data, repeats):
+    from slippi import Game
+    from src.extract import get_istreams
+
+    games = [Game(f) for f in replays_of(data)]
+    frames = sum(len(game.frames) for game in games)
+    seconds, _ = best_of(lambda: [get_istreams(game) for game in games], repeats)
+    return {'seconds': seconds, 'frames_per_sec': frames / seconds}
+
+def bench_extract(data, repeats, backend):
+    from src.extract import extract
+
+    files = replays_of(data)
+    seconds, payloads = best_of(lambda: [extract(f, backend=backend) for f in files], repeats)
+    frames = sum(payload[0]['istream'].shape[0] for payload in payloads)
+    return {'seconds': seconds, 'frames_per_sec': frames / seconds, 'replays_per_sec': len(files) / seconds}
+
+def bench_clippify_game(data, repeats):
+    from src.clippify import clippify_game
+
+    files = replays_of(data)
+
+    def run():
+        output_directory = fresh_directory(data, 'clippify_game')
+        clips = 0
+        for f in files:
+            clips += clippify_game(f, output_directory, clip_length=CLIP_LENGTH, current_clip_total=clips)[0]
+        return clips
+
+    seconds, clips = best_of(run, repeats)
+    return {'seconds': seconds, 'clips_per_sec': clips / seconds}
+
+def bench_clippify(data, repeats):
+    from src.clippify import clippify
+
+    def run():
+        output_directory = fresh_directory(data, 'clippify')
+        clippify(path.join(data, 'replays'), output_directory, clip_length=CLIP_LENGTH)
+        return len([f for f in listdir(output_directory) if f.endswith('.pkl')])
+
+    seconds, clips = best_of(run, repeats)
+    return {'seconds': seconds, 'clips_per_sec': clips / seconds}
+
+def count_batches(batches):
+    return sum(1 for _ in batches)
+
+def bench_character_data(data, repeats, clip_directory):
+    from src.data import character_data
+
+    seconds, batches = best_of(
+        lambda: count_batches(character_data(path.join(data, clip_directory), batch_size=BATCH_SIZE, onehot=False)),
+        repeats
+    )
+    return {'seconds': seconds, 'batches_per_sec': batches / seconds, 'clips_per_sec': batches * BATCH_SIZE / seconds}
+
+def bench_player_data(data, repeats):
+    from src.data import player_data
+
+    seconds, batches = best_of(
+        lambda: count_batches(player_data(
+            path.join(data, 'player'), path.join(data, 'anonymous'), batch_size=BATCH_SIZE
+        )),
+        repeats
+    )
+    return {'seconds': seconds, 'batches_per_sec': batches / seconds, 'clips_per_sec': batches * BATCH_SIZE / seconds}
+
+def bench_forward(model, repeats, batches=8):
+    batch = np.random.default_rng(0).random((BATCH_SIZE, CLIP_LENGTH * 60, 13), dtype=np.float32)
+
+    # the first call traces the model
+    model.predict_on_batch(batch)
+    seconds, _ = best_of(lambda: [model.predict_on_batch(batch) for _ in range(batches)], repeats)
+    return {
+        'seconds': seconds,
+        'batches_per_sec': batches / seconds,
+        'frames_per_sec': batches * BATCH_SIZE * CLIP_LENGTH * 60 / seconds,
+    }
+
+def bench_base_model(data, repeats):
+    from src.base_model import base_model
+    return bench_forward(base_model(), repeats)
+
+def bench_transfer_model(data, repeats):
+    from src.base_model import base_model
+    from src.transfer import replace_head
+
+    model = base_model()
+    model.build((None, CLIP_LENGTH * 60, 13))
+    return bench_forward(replace_head(model), repeats)
+
+BENCHMARKS = {
+    'get_istreams': bench_get_istreams,
+    'extract_slippi': lambda data, repeats: bench_extract(data, repeats, 'slippi'),
+    'extract_raw': lambda data, repeats: bench_extract(data, repeats, 'raw'),
+    'clippify_game': bench_clippify_game,
+    'clippify': bench_clippify,
+    'character_data': lambda data, repeats: bench_character_data(data, repeats, 'clips'),
+    'character_store': lambda data, repeats: bench_character_data(data, repeats, 'store'),
+    'player_data': bench_player_data,
+    'base_model': bench_base_model,
+    'transfer_model': bench_transfer_model,
+}
+
+def peak_rss_mb():
+    '''Peak resident set size of this process and its children, in MiB (ru_maxrss is KiB on linux)'''
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    return peak / 1024
+
+def run_benchmark(name, data, repeats):
+    '''Runs one benchmark, in its own process'''
+
+    # progress output (eg. from clippify) goes to stderr,
+    # so stdout of the suite is only the JSON report
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    result = BENCHMARKS[name](data, repeats)
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
+# ==============================
+#   data and environment
+# ==============================
+
+def generate_data(data, n_replays, n_frames, n_clips):
+    '''Writes the synthetic replays and clip directories the benchmarks read'''
+    write_replays(path.join(data, 'replays'), n_replays=n_replays, n_frames=n_frames)
+    write_clips(path.join(data, 'clips'), n_clips=n_clips)
+    write_clips(path.join(data, 'store'), n_clips=n_clips, clip_format='npy')
+    write_clips(path.join(data, 'player'), n_clips=n_clips, seed=1)
+    write_clips(path.join(data, 'anonymous'), n_clips=n_clips, character='FALCO', code='XYZ#2', seed=2)
+
+def environment():
+    '''Versions of everything the numbers depend on'''
+    import tensorflow as tf
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'tensorflow': tf.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Benchmark suite (see benchmarks/suite.py)')
+    parser.add_argument('--output', help='write the JSON results to this file instead of printing them')
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help='only run these benchmarks')
+    parser.add_argument('--replays', type=int, default=8, help='number of synthetic replays')
+    parser.add_argument('--frames', type=int, default=4000, help='frames per synthetic replay')
+    parser.add_argument('--clips', type=int, default=256, help='clips per synthetic clip directory')
+    parser.add_argument('--repeats', type=int, default=3, help='runs per benchmark, the fastest is reported')
+    parser.add_argument('--data', help='directory for the synthetic data (default: a temporary directory)')
+    args = parser.parse_args(args)
+
+    data = args.data or tempfile.mkdtemp(prefix='ssbml-bench-')
+    try:
+        generate_data(data, args.replays, args.frames, args.clips)
+
+        results = {}
+        for name in args.only or BENCHMARKS:
+            # a fresh process per benchmark, so peak RSS is not shared between them
+            with ProcessPoolExecutor(1, mp_context=get_context('spawn')) as executor:
+                results[name] = executor.submit(run_benchmark, name, data, args.repeats).result()
+            print(f'{name}: {results[name]}', file=sys.stderr)
+
+    finally:
+        if args.data is None:
+            shutil.rmtree(data, ignore_errors=True)
+
+    report = {
+        'environment': environment(),
+        'config': {
+            'replays': args.replays,
+            'frames': args.frames,
+            'clips': args.clips,
+            'repeats': args.repeats,
+            'batch_size': BATCH_SIZE,
+        },
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
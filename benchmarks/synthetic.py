@@ -0,0 +1,276 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Deterministic synthetic data for the benchmarks -
+.slp replays that both extract backends can parse,
+and clip directories in the formats clippify writes.
+
+The same arguments (and seed) always give the same bytes,
+so numbers from different versions of the project are
+measured on the same data.
+
+Usage (from the repository root):
+
+    python -m benchmarks.synthetic replays <output_directory> [n_replays]
+    python -m benchmarks.synthetic clips <output_directory> [n_clips]
+'''
+
+import io
+import sys
+import struct
+import pickle
+from os import path, makedirs
+
+import numpy as np
+import ubjson
+from scipy.sparse import csr_matrix
+
+from src.store import ShardWriter
+from src.index import IndexWriter
+
+# payload sizes of the events a replay is written with
+GAME_START_SIZE = 418
+PRE_FRAME_SIZE = 63
+POST_FRAME_SIZE = 52
+GAME_END_SIZE = 2
+
+# the first frame of a game is indexed -123
+FIRST_FRAME_INDEX = -123
+
+# CSS character ids
+FOX = 2
+FALCO = 20
+
+# bits of the pre-frame physical buttons field, in istream
+# column order (Y X B A L R Z), then start and d-pad left
+BUTTON_BITS = np.array([0x800, 0x400, 0x200, 0x100, 0x40, 0x20, 0x10, 0x1000, 0x1])
+
+def random_inputs(rng, n_frames, hold=0.):
+    '''
+    Random controller inputs on the stick/trigger grid
+
+    Parameters
+    -----------
+    rng (np.random.Generator) : random number generator
+    n_frames (int) : number of frames
+    hold (float) : probability that a frame repeats the inputs
+                   of the frame before it (0 for independent frames,
+                   about .85 for the change rate of real play)
+
+    Returns
+    -----------
+    sticks (ndarray) : (n_frames, 4) float32 joystick and cstick positions
+    triggers (ndarray) : (n_frames, 2) float32 trigger positions
+    buttons (ndarray) : (n_frames,) physical button bitfields
+    '''
+
+    sticks = np.where(rng.random((n_frames, 4)) < .5, rng.integers(-80, 81, (n_frames, 4)), 0)
+    triggers = np.where(rng.random((n_frames, 2)) < .2, rng.integers(0, 141, (n_frames, 2)), 0)
+    pressed = rng.random((n_frames, len(BUTTON_BITS))) < .1
+    buttons = (pressed * BUTTON_BITS).sum(axis=1)
+
+    # held frames copy the last frame that changed
+    changed = rng.random(n_frames) >= hold
+    changed[0] = True
+    source = np.maximum.accumulate(np.where(changed, np.arange(n_frames), 0))
+
+    sticks = (sticks[source] / np.float32(80)).astype(np.float32)
+    triggers = (triggers[source] / np.float32(140)).astype(np.float32)
+    return sticks, triggers, buttons[source]
+
+def write_replay(
+        filepath,
+        n_frames = 4000,
+        characters = (FOX, FALCO, None, None),
+        codes = ('ABC#1', 'XYZ#2', None, None),
+        seed = 0,
+        hold = 0.,
+        follower = False,
+        rollback = ()
+    ):
+    '''
+    Writes a synthetic .slp replay
+
+    Only the events the extract backends read are written
+    (event payloads, game start, pre/post frames and game end),
+    with random inputs for every active port.
+
+    Parameters
+    -----------
+    filepath (string) : path of the .slp file to write
+    n_frames (int) : length of the game in frames
+    characters (tuple) : CSS character id of each port, None for an empty port
+    codes (tuple) : connect code of each port
+    seed (int) : seed of the random inputs
+    hold (float) : probability that a frame repeats the inputs before it
+    follower (bool) : if true, the first port also gets follower
+                      (eg. Nana) pre-frame events
+    rollback (tuple) : frames after which the two frames before them
+                       are replayed, like a rollback netplay replay
+    '''
+
+    rng = np.random.default_rng(seed)
+    active = [port for port in range(4) if characters[port] is not None]
+    inputs = {port: random_inputs(rng, n_frames, hold) for port in active}
+
+    raw = io.BytesIO()
+
+    sizes = {0x36: GAME_START_SIZE, 0x37: PRE_FRAME_SIZE, 0x38: POST_FRAME_SIZE, 0x39: GAME_END_SIZE}
+    raw.write(bytes([0x35, 1 + 3 * len(sizes)]))
+    for event, size in sizes.items():
+        raw.write(struct.pack('>BH', event, size))
+
+    start = bytearray(GAME_START_SIZE)
+    start[0:4] = bytes([3, 7, 0, 0])
+    struct.pack_into('>H', start, 18, 31)
+    for port in range(4):
+        block = 100 + 36 * port
+        if characters[port] is None:
+            start[block + 1] = 3
+        else:
+            start[block] = characters[port]
+            start[block + 2] = 4
+    raw.write(b'\x36' + bytes(start))
+
+    frames = []
+    for frame in range(n_frames):
+        frames.append(frame)
+        if frame in rollback:
+            frames += [frame - 2, frame - 1, frame]
+
+    pre = bytearray(PRE_FRAME_SIZE)
+    post = bytearray(POST_FRAME_SIZE)
+    for frame in frames:
+        index = frame + FIRST_FRAME_INDEX
+        for port in active:
+            sticks, triggers, buttons = inputs[port]
+            struct.pack_into(
+                '>iB?LHffffffffLHffBf', pre, 0,
+                index, port, False, 0, 14, 0., 0., 1.,
+                *sticks[frame], 0., 0, int(buttons[frame]), *triggers[frame], 0, 0.
+            )
+            raw.write(b'\x37' + bytes(pre))
+
+            if follower and port == active[0]:
+                nana = bytearray(pre)
+                nana[5] = 1
+                struct.pack_into('>f', nana, 24, .5)
+                raw.write(b'\x37' + bytes(nana))
+
+            struct.pack_into('>iB?', post, 0, index, port, False)
+            raw.write(b'\x38' + bytes(post))
+
+    raw.write(b'\x39' + bytes([2, 255]))
+    raw = raw.getvalue()
+
+    metadata = {
+        'startAt': '2021-03-19T12:00:00Z',
+        'lastFrame': n_frames + FIRST_FRAME_INDEX - 1,
+        'playedOn': 'dolphin',
+        'players': {
+            str(port): {
+                'characters': {str(characters[port]): n_frames},
+                'names': {'netplay': f'name{port}', 'code': codes[port]},
+            }
+            for port in active
+        },
+    }
+
+    with open(filepath, 'wb') as f:
+        f.write(b'{U\x03raw[$U#l' + struct.pack('>l', len(raw)) + raw)
+        f.write(b'U\x08metadata' + ubjson.dumpb(metadata) + b'}')
+
+def write_replays(output_directory, n_replays=8, n_frames=4000, seed=0, **kwargs):
+    '''
+    Writes n_replays synthetic replays (game-{i}.slp) into output_directory.
+    Replay i is written with seed + i, other arguments go to write_replay.
+
+    Returns
+    -----------
+    filepaths (list) : paths of the replays
+    '''
+
+    makedirs(output_directory, exist_ok=True)
+    filepaths = []
+    for i in range(n_replays):
+        filepath = path.join(output_directory, f'game-{i}.slp')
+        write_replay(filepath, n_frames=n_frames, seed=seed + i, **kwargs)
+        filepaths.append(filepath)
+    return filepaths
+
+def write_clips(
+        output_directory,
+        n_clips = 256,
+        clip_length = 30,
+        character = 'FOX',
+        code = 'ABC#1',
+        clip_format = 'pkl',
+        seed = 0,
+        first_clip_id = 0
+    ):
+    '''
+    Writes a directory of synthetic clips, with the same
+    payloads, filenames and clip index clippify writes
+
+    Parameters
+    -----------
+    output_directory (string) : directory to write the clips into
+    n_clips (int) : number of clips
+    clip_length (int or float) : length of clips in seconds
+    character (string) : character of every clip
+    code (string) : player code of every clip
+    clip_format (string) : 'pkl' for one pickle file per clip, 'npy' for a clip store
+    seed (int) : seed of the random inputs
+    first_clip_id (int) : clip_id of the first clip
+    '''
+
+    makedirs(output_directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    frames = int(clip_length * 60)
+
+    index = IndexWriter(output_directory)
+    writer = ShardWriter(output_directory, index=index) if clip_format == 'npy' else None
+    try:
+        for i in range(n_clips):
+            sticks, triggers, buttons = random_inputs(rng, frames, hold=.85)
+            pressed = (buttons[:, None] & BUTTON_BITS[:7]) != 0
+            istream = np.concatenate((sticks, triggers, pressed), axis=1).astype(np.float64)
+
+            clip_id = first_clip_id + i
+            clip_payload = {
+                'istream': csr_matrix(istream),
+                'character': character,
+                'name': code.split('#')[0],
+                'code': code,
+                'clip_id': clip_id,
+                'game_id': f'game-{clip_id // 8}.slp',
+            }
+
+            if writer is not None:
+                writer.write(clip_payload)
+            else:
+                clip_filename = f'{character}-{code}-{clip_id}.pkl'
+                with open(path.join(output_directory, clip_filename), 'wb') as f:
+                    pickle.dump(clip_payload, f)
+                index.add_clip(None, clip_payload, clip_path=clip_filename)
+    finally:
+        if writer is not None:
+            writer.close()
+        index.commit()
+        index.close()
+
+def main(args):
+    if len(args) < 2 or args[0] not in ('replays', 'clips'):
+        print(__doc__)
+        return
+
+    kind, output_directory = args[:2]
+    if kind == 'replays':
+        write_replays(output_directory, *map(int, args[2:3]))
+    else:
+        write_clips(output_directory, *map(int, args[2:3]))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,104 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Parity check and player scaling benchmark for
+transfer.MultiHeadVerifier.
+
+Builds SSBML-Base-Model and a few player models with
+replace_head (all with random BatchNormalization statistics),
+checks that the verifier's scores match every player model's
+own predictions, then times verifying a batch of clips against
+1 to --players registered players, next to the cost of running
+every player's full model.
+
+Clips come from a clip directory, or synthetic clips
+(see synthetic.py) when none is given.
+
+Usage (from the repository root):
+
+    python -m benchmarks.verifier [clip_directory] [--players 500] [--batch 8]
+'''
+
+import sys
+import time
+import tempfile
+import argparse
+from os import path
+
+import numpy as np
+
+from src.base_model import base_model
+from src.transfer import replace_head, MultiHeadVerifier
+from src.export import calibration_clips
+from .export import randomize_batch_norm
+from .synthetic import write_clips
+
+# distinct player models built for the parity check
+PARITY_PLAYERS = 4
+REPEATS = 5
+
+def best_time(fn, repeats=REPEATS):
+    fn()
+    best = np.inf
+    for _ in range(repeats):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+def main(args):
+    parser = argparse.ArgumentParser(description='Multi-head verifier benchmark (see benchmarks/verifier.py)')
+    parser.add_argument('clip_directory', nargs='?', help='clips to verify')
+    parser.add_argument('--players', type=int, default=500, help='largest number of registered players to time')
+    parser.add_argument('--batch', type=int, default=8, help='clips verified per call')
+    args = parser.parse_args(args)
+
+    clip_directory = args.clip_directory
+    if clip_directory is None:
+        clip_directory = path.join(tempfile.mkdtemp(prefix='ssbml-verifier-'), 'clips')
+        write_clips(clip_directory, n_clips=args.batch)
+    clips = calibration_clips(clip_directory, n_clips=args.batch)
+
+    rng = np.random.default_rng(0)
+    base = base_model()
+    base.build((None, clips.shape[1], 13))
+    randomize_batch_norm(base, rng)
+
+    players = []
+    for i in range(PARITY_PLAYERS):
+        model = replace_head(base, name=f'player-{i}')
+        randomize_batch_norm(model.layers[-1], rng)
+        players.append(model)
+
+    # parity with every player's own model
+    verifier = MultiHeadVerifier(base)
+    for model in players:
+        verifier.add_player(model.name, model)
+    scores = verifier.predict_on_batch(clips)
+    expected = np.stack([model.predict_on_batch(clips)[:, 0] for model in players], axis=1)
+    error = np.abs(scores - expected).max()
+    print(f'parity with {len(players)} player models: max error {error:.1e}')
+
+    # cost of one full model, what every extra player costs without the verifier
+    model_seconds = best_time(lambda: players[0].predict_on_batch(clips))
+    backbone_seconds = best_time(lambda: verifier.backbone.predict_on_batch(clips))
+    print(f'one player model: {model_seconds * 1000:.1f} ms per {len(clips)} clips (backbone alone {backbone_seconds * 1000:.1f} ms)')
+
+    # scaling: registering more players only adds heads, the backbone runs once
+    for n_players in sorted({n for n in (1, 10, 100) if n < args.players} | {args.players}):
+        verifier = MultiHeadVerifier(base)
+        for i in range(n_players):
+            verifier.add_player(f'player-{i}', players[i % len(players)].layers[-1])
+        seconds = best_time(lambda: verifier.predict_on_batch(clips))
+        print(
+            f'{n_players:>5} players: {seconds * 1000:7.1f} ms per {len(clips)} clips '
+            f'(separate models: ~{n_players * model_seconds * 1000:8.0f} ms)'
+        )
+
+    if error > 1e-4:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,6 +1,24 @@
-from . import util
-from . import extract
-from . import clippify
-from . import data
-from . import base_model
-from . import transfer
+'''
+Submodules are imported on first use (eg. src.extract or
+from src import clippify), so processes that only extract
+or clippify replays never import TensorFlow.
+'''
+
+import importlib
+
+__all__ = [
+    'util',
+    'extract',
+    'clippify',
+    'data',
+    'base_model',
+    'transfer',
+]
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module(f'.{name}', __name__)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
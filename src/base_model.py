@@ -4,9 +4,12 @@ Email : zack@magnotti.net
 Date : 3/19/2021
 
 Python module containing the Keras code
-for the creation of SSBML-Base-Model
+for the creation of SSBML-Base-Model,
+and of a masked version of it that takes
+zero-padded batches of variable-length games
 '''
 
+import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import metrics
 from tensorflow.keras.models import Sequential
@@ -14,27 +17,48 @@ from tensorflow.keras.layers import Conv1D, BatchNormalization, MaxPooling1D
 from tensorflow.keras.layers import GlobalAveragePooling1D, Flatten
 from tensorflow.keras.layers import Dense, Activation, Dropout
 from tensorflow.keras.activations import swish
-from tensorflow_addons.losses import SigmoidFocalCrossEntropy as Focal
+
+from .stream import flatten_layers
 
 NAME = 'SSBML-Base-Model'
 
 ACTIVATION = swish
 
-OPTIMIZER = keras.optimizers.Adam()
+# The default optimizer, loss and metrics are only built when a
+# model is compiled (importing tensorflow_addons for the focal loss
+# and building keras objects takes seconds). OPTIMIZER, LOSS and
+# METRICS are still importable, and build new objects on every access.
+
+def default_optimizer():
+    return keras.optimizers.Adam()
+
+def default_loss():
+    from tensorflow_addons.losses import SigmoidFocalCrossEntropy as Focal
+    return Focal()
 
-LOSS = Focal()
+def default_metrics():
+    return [
+        metrics.CategoricalAccuracy(name='accuracy'),
+        metrics.TopKCategoricalAccuracy(k=8, name='top 8 accuracy'),
+    ]
 
-METRICS = [
-    metrics.CategoricalAccuracy(name='accuracy'),
-    metrics.TopKCategoricalAccuracy(k=8, name='top 8 accuracy'),
-]
+DEFAULTS = {
+    'OPTIMIZER': default_optimizer,
+    'LOSS': default_loss,
+    'METRICS': default_metrics,
+}
+
+def __getattr__(name):
+    if name in DEFAULTS:
+        return DEFAULTS[name]()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 def base_model(
         name = NAME,
         activation = ACTIVATION,
-        optimizer = OPTIMIZER,
-        loss = LOSS,
-        metrics = METRICS,
+        optimizer = None,
+        loss = None,
+        metrics = None,
     ):
     '''
     Creates SSBML-Base-Model architecture 
@@ -45,9 +69,9 @@ def base_model(
     -----------
     name (string) : name of output model
     activation : activation function for output model
-    optimizer : optimizer for output model
-    loss : loss function for output model
-    metrics : metrics for output model
+    optimizer : optimizer for output model (default: Adam)
+    loss : loss function for output model (default: sigmoid focal cross entropy)
+    metrics : metrics for output model (default: accuracy and top 8 accuracy)
     
     Outputs (yield)
     -----------
@@ -135,9 +159,121 @@ def base_model(
     # final output layer
     model.add(Dense(26, activation='softmax', name='final'))
     model.compile(
-        loss = loss,
-        optimizer = optimizer,
-        metrics = metrics
+        loss = default_loss() if loss is None else loss,
+        optimizer = default_optimizer() if optimizer is None else optimizer,
+        metrics = default_metrics() if metrics is None else metrics
     )
 
     return model
+
+def output_length(model, frames):
+    '''
+    Number of time steps the convolutions and poolings of
+    model leave of an input of the given number of frames
+    (the steps GlobalAveragePooling1D averages over)
+
+    Parameters
+    -----------
+    model (Sequential) : SSBML-Base-Model (or any model
+                         of Conv1D / MaxPooling1D layers)
+    frames (int | ndarray | Tensor) : input length(s)
+
+    Outputs
+    -----------
+    length (int | ndarray | Tensor) : output length(s), < 1 if
+                                      the input is too short
+    '''
+
+    length = frames
+    for layer in flatten_layers(model):
+        if isinstance(layer, keras.layers.GlobalAveragePooling1D):
+            break
+
+        if isinstance(layer, keras.layers.Conv1D):
+            if layer.padding != 'valid':
+                raise ValueError(f'{layer.name}: only valid padding is supported')
+            size = (layer.kernel_size[0] - 1) * layer.dilation_rate[0] + 1
+            length = (length - size) // layer.strides[0] + 1
+
+        elif isinstance(layer, keras.layers.MaxPooling1D):
+            if layer.padding != 'valid':
+                raise ValueError(f'{layer.name}: only valid padding is supported')
+            length = (length - layer.pool_size[0]) // layer.strides[0] + 1
+
+    return length
+
+def min_frames(model):
+    '''Shortest input model can score'''
+    frames = 1
+    while output_length(model, frames) < 1:
+        frames += 1
+    return frames
+
+class MaskedGlobalAveragePooling1D(keras.layers.Layer):
+    '''
+    GlobalAveragePooling1D over the first `lengths`
+    time steps of every sequence of a padded batch.
+
+    Called on [features, lengths]: (batch, steps, channels)
+    features and (batch,) number of valid steps of each.
+    '''
+
+    def call(self, inputs):
+        features, lengths = inputs
+        mask = tf.sequence_mask(lengths, tf.shape(features)[1], dtype=features.dtype)
+        total = tf.reduce_sum(features * mask[..., None], axis=1)
+        return total / tf.maximum(tf.reduce_sum(mask, axis=1, keepdims=True), 1)
+
+def masked_model(
+        model,
+        optimizer = None,
+        loss = None,
+        metrics = None
+    ):
+    '''
+    Wraps SSBML-Base-Model (or a transfer model of it) to take
+    zero-padded batches of variable-length istreams.
+
+    The wrapper shares the layers (and so the weights) of model,
+    and takes [istreams, lengths]: (batch, frames, 13) istreams,
+    padded at the end, and the (batch,) number of real frames of
+    each. Its global average pooling only averages the time steps
+    computed from real frames, so every output is the same as
+    model's output on the unpadded istream.
+    (While training, BatchNormalization batch statistics
+     do include the steps computed from padding.)
+
+    Parameters
+    -----------
+    model (Sequential) : SSBML-Base-Model or SSBML-Transfer-Model
+    optimizer : optimizer for output model (default: Adam)
+    loss : loss function for output model (default: sigmoid focal cross entropy)
+    metrics : metrics for output model (default: accuracy and top 8 accuracy)
+
+    Outputs (yield)
+    -----------
+    masked (Model) : model taking [istreams, lengths]
+    '''
+
+    istreams = keras.Input(shape=(None, 13), name='istreams')
+    lengths = keras.Input(shape=(), dtype=tf.int32, name='lengths')
+
+    x = istreams
+    pooled = False
+    for layer in flatten_layers(model):
+        if isinstance(layer, keras.layers.GlobalAveragePooling1D):
+            x = MaskedGlobalAveragePooling1D(name='masked_pooling')([x, output_length(model, lengths)])
+            pooled = True
+        else:
+            x = layer(x)
+
+    if not pooled:
+        raise ValueError('model has no GlobalAveragePooling1D layer')
+
+    masked = keras.Model([istreams, lengths], x, name=model.name)
+    masked.compile(
+        loss = default_loss() if loss is None else loss,
+        optimizer = default_optimizer() if optimizer is None else optimizer,
+        metrics = default_metrics() if metrics is None else metrics
+    )
+    return masked
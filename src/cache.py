@@ -0,0 +1,332 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Python module containing a persistent on-disk cache
+of extract's full-game payloads, so replays only
+have to be parsed once no matter how many times
+they are re-clipped.
+
+Entries are keyed by a hash of the replay file's contents
+plus extract.EXTRACTOR_VERSION, and evicted least recently
+used first once the cache grows past its size limit.
+
+Also contains ClipCache, an in-memory cache of unpickled
+clips that data.get_batch reads through, so training on a
+small dataset only reads its clip files on the first epoch.
+'''
+
+import os
+import pickle
+import hashlib
+import threading
+from os import path, makedirs
+from collections import OrderedDict
+
+import numpy as np
+from slippi.parse import ParseError
+
+from .extract import extract, get_id, EXTRACTOR_VERSION
+from .extract import InvalidGameError, GameTooShortError
+from .compact import stack_istreams
+
+# default size limit of the cache in bytes
+DEFAULT_CACHE_SIZE = 16 * 2**30
+
+# default memory budget of a clip cache in bytes
+DEFAULT_CLIP_CACHE_SIZE = 2 * 2**30
+
+# replays that fail with these errors are cached as failures,
+# so they are not re-parsed just to fail again
+CACHED_ERRORS = (GameTooShortError, InvalidGameError, ParseError)
+
+def replay_hash(f, chunk_size=2**20):
+    '''
+    Hashes the contents of a replay file
+
+    Parameters
+    -----------
+    f (string) : Full path to game replay file
+
+    Returns
+    -----------
+    digest (string) : hex sha1 digest of the file contents
+    '''
+
+    sha1 = hashlib.sha1()
+    with open(f, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+class ExtractionCache:
+    '''
+    Persistent cache of extract payloads.
+
+    The cache only holds a directory name and a running size
+    estimate, so it can be handed to clippify's worker processes.
+    '''
+
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_SIZE):
+        '''
+        Parameters
+        -----------
+        directory (string) : directory to keep cache entries in
+        max_bytes (int) : size limit of the cache, None for no limit
+        '''
+
+        self.directory = path.abspath(directory)
+        self.max_bytes = max_bytes
+        makedirs(self.directory, exist_ok=True)
+        self.size = sum(size for _, size, _ in self.entries())
+
+    def key(self, f):
+        '''Returns the cache key for a replay file'''
+        return f'{replay_hash(f)}-v{EXTRACTOR_VERSION}'
+
+    def entry_path(self, key):
+        '''Returns the path of a cache entry (entries are spread over 256 subdirectories)'''
+        return path.join(self.directory, key[:2], key + '.pkl')
+
+    def entries(self):
+        '''Yields (path, size in bytes, last use time) of every cache entry'''
+        for subdirectory in os.scandir(self.directory):
+            if not subdirectory.is_dir():
+                continue
+            for entry in os.scandir(subdirectory.path):
+                if entry.name.endswith('.pkl'):
+                    stat = entry.stat()
+                    yield entry.path, stat.st_size, stat.st_mtime
+
+    def get(self, key):
+        '''
+        Looks up a cache entry
+
+        Returns
+        -----------
+        hit (bool) : whether the key was in the cache
+        value (tuple | Exception) : the cached payload or error
+        '''
+
+        entry = self.entry_path(key)
+        try:
+            with open(entry, 'rb') as fp:
+                value = pickle.load(fp)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+            return False, None
+
+        # mark as recently used
+        os.utime(entry)
+        return True, value
+
+    def put(self, key, value):
+        '''Adds a payload (or error) to the cache, evicting old entries if needed'''
+
+        entry = self.entry_path(key)
+        makedirs(path.dirname(entry), exist_ok=True)
+
+        # write to a temporary file so concurrent
+        # readers never see half an entry
+        tmp_entry = f'{entry}.{os.getpid()}.tmp'
+        with open(tmp_entry, 'wb') as fp:
+            pickle.dump(value, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        self.size += path.getsize(tmp_entry)
+        os.replace(tmp_entry, entry)
+
+        if self.max_bytes is not None and self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        '''
+        Deletes least recently used entries until
+        the cache is down to 90% of its size limit.
+
+        The size is re-measured from disk first, since
+        other processes may share this cache.
+        '''
+
+        entries = sorted(self.entries(), key=lambda entry: entry[2])
+        self.size = sum(size for _, size, _ in entries)
+
+        target = 0.9 * self.max_bytes
+        for entry, size, _ in entries:
+            if self.size <= target:
+                break
+            try:
+                os.remove(entry)
+            except FileNotFoundError:
+                pass
+            self.size -= size
+
+    def extract(self, f):
+        '''
+        Same as extract.extract(f), but served from the cache when possible.
+
+        Parameters
+        -----------
+        f (string) : Full path to game replay file
+
+        Returns
+        -----------
+        payload (tuple of dicts) : see extract.extract
+        '''
+
+        key = self.key(f)
+        hit, value = self.get(key)
+
+        if not hit:
+            try:
+                value = extract(f)
+            except CACHED_ERRORS as e:
+                value = e
+            self.put(key, value)
+
+        if isinstance(value, Exception):
+            raise value
+
+        # the cache is keyed by contents, so the same replay may
+        # have been cached under a different filename
+        game_id = get_id(f)
+        return tuple(dict(doc, game_id=game_id) for doc in value)
+
+class ClipCache:
+    '''
+    In-memory LRU cache of the clips of one clip directory,
+    with a byte budget and hit / miss counts.
+
+    Clips are kept as they were pickled (csr or compact istreams,
+    about their file size each), or with dense=True as decoded
+    float32 istreams, which use more memory but skip decoding.
+
+    Safe to share between threads (eg. keras loader threads).
+    '''
+
+    def __init__(self, max_bytes=DEFAULT_CLIP_CACHE_SIZE, dense=False):
+        '''
+        Parameters
+        -----------
+        max_bytes (int) : memory budget of the cache, None for no limit
+        dense (bool) : whether to keep decoded float32 istreams
+        '''
+
+        self.max_bytes = max_bytes
+        self.dense = dense
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        '''
+        Looks up a clip
+
+        Returns
+        -----------
+        hit (bool) : whether the key was in the cache
+        value (dict) : the cached clip
+        '''
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return True, entry[0]
+
+    def put(self, key, value, size):
+        '''
+        Adds a clip, evicting least recently used clips if needed
+
+        Parameters
+        -----------
+        key (string) : clip filename
+        value (dict) : unpickled clip
+        size (int) : bytes the clip takes up in memory
+        '''
+
+        if self.dense:
+            istream = stack_istreams([value['istream']], np.float32)[0]
+            value = dict(value, istream=istream)
+            size = istream.nbytes
+
+        # a clip bigger than the whole budget is not kept
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            self.entries[key] = value, size
+            self.size += size
+
+            while self.max_bytes is not None and self.size > self.max_bytes:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        '''Drops every clip and resets the counts'''
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        '''Hit and miss counts, and memory use'''
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.,
+                'evictions': self.evictions,
+                'clips': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+            }
+
+    def __str__(self):
+        stats = self.stats()
+        return (
+            f'{stats["clips"]} clips, {stats["bytes"] / 2**20:.1f} MiB cached, '
+            f'{stats["hits"]} hits, {stats["misses"]} misses ({stats["hit_rate"]:.0%} hit rate), '
+            f'{stats["evictions"]} evictions'
+        )
+
+# clip caches shared by every loader reading the same directory
+CLIP_CACHES = {}
+CLIP_CACHES_LOCK = threading.Lock()
+
+def clip_cache(directory, max_bytes=DEFAULT_CLIP_CACHE_SIZE, dense=False):
+    '''
+    Returns the shared clip cache of a clip directory, creating it
+    (with the given budget and mode) on first use, so eg. the player
+    and anonymous sides of player_data share one cache when both
+    read the same directory
+    '''
+
+    directory = path.abspath(directory)
+    with CLIP_CACHES_LOCK:
+        if directory not in CLIP_CACHES:
+            CLIP_CACHES[directory] = ClipCache(max_bytes, dense)
+        return CLIP_CACHES[directory]
@@ -5,19 +5,37 @@ Date : 3/19/2021
 
 Python module to create a dataset of "clips" -
 labeled examples of controller signals of a
-specified length saved as pickle files -
+specified length saved as pickle files
+(or packed into a sharded clip store) -
 from a directory of slippi replay files.
 '''
 
 import pickle
 from os import path, listdir, makedirs
 from random import random
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
 
 import errno
 from slippi.parse import ParseError
 
 from .util import display_progress
 from .extract import extract, InvalidGameError, GameTooShortError
+from .slp import preflight as preflight_check, TOO_SHORT, NOT_1V1
+from .compact import compact_istream
+from .rle import rle_istream
+from .store import ShardWriter, SHARD_SIZE
+from .manifest import Manifest, OK
+from .index import IndexWriter, IndexCollector
+from .stats import GameStats, ClippifyStats
+
+# when clippifying with multiple workers, game i of the
+# (sorted) input directory gets clip ids starting at i * CLIP_ID_STRIDE,
+# so clip ids do not depend on which worker finishes first.
+# 1000 clips is over 2 hours of 4 player footage at 30 second clips.
+CLIP_ID_STRIDE = 1000
+
+# on-disk formats clippify can write clips in
+CLIP_FORMATS = ('pkl', 'npy')
 
 class ClippifyFailureError(ValueError):
     '''
@@ -30,7 +48,14 @@ def clippify_game(
         output_directory,
         clip_length = 30,
         train_test_split = False,
-        current_clip_total = 0
+        current_clip_total = 0,
+        max_clips = None,
+        writer = None,
+        cache = None,
+        index = None,
+        compact = False,
+        run_length = False,
+        stats = None
     ):
     '''
     Clippifies a single game file and 
@@ -46,10 +71,40 @@ def clippify_game(
     output_directory (string) : directory to deposit clips
     clip_length (int or float) : length of clips in seconds
     train_test_split (bool) : whether or not to perform train/test split during process
+    current_clip_total (int) : clip_id of the first clip from this game
+    max_clips (int) : if given, stop after this many clips have been saved
+    writer (ShardWriter | ClipCollector) : if given, clips are handed to
+                                           writer.write(clip_payload, split)
+                                           instead of being pickled to
+                                           their own files
+    cache (ExtractionCache) : if given, the game is loaded from this
+                              cache and only parsed on a cache miss
+    index (IndexWriter | IndexCollector) : if given, every pickled clip is
+                                           added to the clip index
+    compact (bool) : if true, clip istreams are compact.CompactIstreams
+                     instead of float64 csr matrices
+    run_length (bool) : if true, clip istreams are rle.RunLengthIstreams,
+                        cut straight out of the encoded full game
+    stats (GameStats) : if given, every stage of clippifying the
+                        game is timed into it, and the clips, frames
+                        and bytes written are counted (see stats.py)
+
+    Returns
+    -----------
+    game_clip_total (int) : number of clips saved
+    game_clip_failures (int) : number of clips that failed to save
     '''
             
+    if stats is None:
+        stats = GameStats(input_filepath)
+
     # get data from game
-    player_documents = extract(input_filepath)
+    # (loading from the cache is timed as parsing)
+    if cache is not None:
+        with stats.stage('parse'):
+            player_documents = cache.extract(input_filepath)
+    else:
+        player_documents = extract(input_filepath, compact=compact, run_length=run_length, stats=stats)
 
     # for counting how many clips came from this game
     game_clip_total = 0
@@ -60,6 +115,12 @@ def clippify_game(
 
         # get istream and metadata
         full_game_istream = doc['istream']
+        with stats.stage('extract'):
+            if run_length:
+                full_game_istream = rle_istream(full_game_istream)
+            elif compact:
+                full_game_istream = compact_istream(full_game_istream)
+        stats.frames = max(stats.frames, full_game_istream.shape[0])
         character = doc['character']
         code = doc['code']
         name = doc['name']
@@ -72,9 +133,13 @@ def clippify_game(
         step = int(clip_length * 60)          
 
         while f+step < full_game_istream.shape[0]:
+            if max_clips is not None and game_clip_total >= max_clips:
+                break
+
             try:
                 # get clip from full game istream
-                clip_istream = full_game_istream[f:f+step]
+                with stats.stage('slice'):
+                    clip_istream = full_game_istream[f:f+step]
                 clip_id = current_clip_total + game_clip_total
 
                 # construct clip payload
@@ -87,21 +152,34 @@ def clippify_game(
                     'game_id': game_id,
                 } 
 
-                # construct clip filename
-                clip_filename = f'{character}-{code}-{clip_id}.pkl'
-
-                # construct clip filepath
+                # pick this clip's split
+                split = None
                 if train_test_split:
-                    if random() < .1:
-                        clip_filepath = path.join(output_directory, 'test', clip_filename)
+                    split = 'test' if random() < .1 else 'train'
+
+                if writer is not None:
+                    writer.write(clip_payload, split)
+
+                else:
+                    # construct clip filename
+                    clip_filename = f'{character}-{code}-{clip_id}.pkl'
+
+                    # construct clip filepath
+                    if split is not None:
+                        clip_filepath = path.join(output_directory, split, clip_filename)
                     else:
-                        clip_filepath = path.join(output_directory, 'train', clip_filename)
-                
-                if not train_test_split:
-                    clip_filepath = path.join(output_directory, clip_filename)
+                        clip_filepath = path.join(output_directory, clip_filename)
 
-                # pickle whole document and save to disk
-                pickle.dump(clip_payload, open(clip_filepath, 'wb'))
+                    # pickle whole document and save to disk
+                    with stats.stage('serialize'):
+                        clip_bytes = pickle.dumps(clip_payload)
+                    with stats.stage('write'):
+                        with open(clip_filepath, 'wb') as clip_file:
+                            clip_file.write(clip_bytes)
+                    stats.bytes_written += len(clip_bytes)
+
+                    if index is not None:
+                        index.add_clip(split, clip_payload, clip_path=clip_filename)
 
             # if there is a problem with this clip
             except: 
@@ -115,23 +193,89 @@ def clippify_game(
             finally:
                 f += step
 
+    stats.clips = game_clip_total
+
     if game_clip_total == 0:
         raise ClippifyFailureError
 
     return game_clip_total, game_clip_failures
 
+class ClipCollector:
+    '''
+    Stand-in for ShardWriter that keeps clips in memory,
+    so worker processes can hand their clips back to
+    the process that owns the clip store.
+    '''
+
+    def __init__(self):
+        self.clips = []
+
+    def write(self, clip_payload, split=None):
+        self.clips.append((clip_payload, split))
+
+def clippify_worker(clip_format, index=False, **kwargs):
+    '''
+    Runs clippify_game in a worker process.
+
+    Parameters
+    -----------
+    clip_format (string) : 'pkl' or 'npy' (see clippify)
+    index (bool) : whether clips are being indexed
+    kwargs : arguments for clippify_game
+
+    Returns
+    -----------
+    game_clip_total (int) : number of clips made
+    game_clip_failures (int) : number of clips that failed
+    clips (list) : (clip_payload, split) pairs still to be written
+                   to the clip store ('npy' format only)
+    index_rows (list) : (split, row) pairs still to be added to
+                        the clip index ('pkl' format only)
+    game_stats (GameStats) : timings of the game (see stats.py).
+                             When the game fails, they are attached
+                             to the exception as its stats attribute.
+    '''
+
+    stats = GameStats(kwargs['input_filepath'])
+    try:
+        if clip_format == 'npy':
+            collector = ClipCollector()
+            clip_total, clip_failures = clippify_game(writer=collector, stats=stats, **kwargs)
+            return clip_total, clip_failures, collector.clips, [], stats
+
+        rows = IndexCollector() if index else None
+        clip_total, clip_failures = clippify_game(index=rows, stats=stats, **kwargs)
+        return clip_total, clip_failures, [], rows.rows if index else [], stats
+
+    except Exception as e:
+        e.stats = stats
+        raise
+
 def clippify(
         input_directory,
         output_directory,
         clip_length = 30,
-        train_test_split = False
+        train_test_split = False,
+        workers = 1,
+        clip_format = 'pkl',
+        cache = None,
+        incremental = False,
+        index = True,
+        compact = False,
+        run_length = False,
+        preflight = True,
+        log = None
     ):
     ''' 
     Chops up all of the istreams from all of the 
     slp files in input_directory and chops them into clips
     of a given length and deposits the clips into output_directory.
 
-    Filename pattern for clips is:
+    With clip_format='pkl' every clip is its own pickle file.
+    With clip_format='npy' clips are packed into a sharded
+    clip store instead (see store.py).
+
+    Filename pattern for pickled clips is:
 
     {clip_id}-{player_code}-{character}.pkl
 
@@ -151,13 +295,52 @@ def clippify(
     output_directory (string) : directory to deposit clips
     clip_length (int or float) : length of clips in seconds
     train_test_split (bool) : whether or not to perform train/test split
+    workers (int) : number of processes to clippify games with.
+                    With more than one worker, the clips of the i-th
+                    replay (in sorted order) get clip ids starting
+                    at i * CLIP_ID_STRIDE, so ids do not depend on
+                    the order in which the workers finish.
+    clip_format (string) : 'pkl' for one pickle file per clip,
+                           'npy' for a sharded clip store
+    cache (ExtractionCache) : if given, full-game payloads are loaded
+                              from this cache, so replays that were
+                              clippified before are not parsed again
+    incremental (bool) : if true, keep a manifest of processed replays in
+                         output_directory (see manifest.py). Replays that
+                         are unchanged since they were recorded are skipped,
+                         new clip ids continue after the highest recorded one,
+                         and an interrupted run resumes where it stopped.
+    index (bool) : if true, keep a clip index (see index.py) in every
+                   directory clips are written to, so the loaders in
+                   data.py can list and filter clips without scanning
+                   the directory
+    compact (bool) : if true, pickled clips hold lossless compact istreams
+                     (see compact.py), about 8x smaller than float64
+                     csr matrices. The loaders in data.py read both.
+    run_length (bool) : if true, pickled clips hold run-length encoded
+                        istreams (see rle.py) instead, which only store
+                        the frames where inputs change
+    preflight (bool) : if true, every replay is checked with slp.preflight
+                       first, and replays that are corrupt, shorter than
+                       a minute or not 1v1 are rejected without being
+                       parsed. (Without it, games of any number of
+                       players are clippified.)
+    log (string) : if given, path of a JSON lines file to append the
+                   timings of every replay and a summary of the run to
+
+    Returns
+    -----------
+    stats (ClippifyStats) : per-stage timings, throughput, bytes written
+                            and slowest replays of the run (see stats.py)
     '''
 
+    if clip_format not in CLIP_FORMATS:
+        raise ValueError(f'clip_format must be one of {CLIP_FORMATS}')
+
     # normalize paths, list and count files
     input_directory = path.abspath(input_directory)
     output_directory = path.abspath(output_directory)
-    file_list = listdir(input_directory)
-    N = len(file_list)
+    file_list = sorted(listdir(input_directory))
 
     # error checking
     if not path.exists(input_directory):
@@ -183,6 +366,7 @@ def clippify(
     # for error tracking
     parse_errors = 0
     games_too_short = 0
+    not_1v1 = 0
     invalid_games = 0
     failed_uploads = 0
     unknown_errors = 0
@@ -193,8 +377,9 @@ def clippify(
     # keep track of how many clips are produced
     clip_total = 0
 
-    # iterate over replay files
-    for i, f in enumerate(file_list):
+    # find the replay files
+    replays = []
+    for f in file_list:
 
         filepath = path.join(input_directory, f)
 
@@ -206,38 +391,195 @@ def clippify(
             wrong_filetype += 1
             continue
 
-        # create clips from replay file and save them to disk
-        try: new_clips, new_clippify_failures = clippify_game(
+        replays.append(filepath)
+
+    # skip replays that were already clippified into output_directory
+    already_processed = 0
+    next_clip_id = 0
+    if incremental:
+        manifest = Manifest(output_directory)
+        next_clip_id = manifest.next_clip_id
+        new_replays = [f for f in replays if not manifest.is_processed(f)]
+        already_processed = len(replays) - len(new_replays)
+        replays = new_replays
+    else:
+        manifest = None
+
+    # reject replays that fail preflight before any of them is parsed
+    rejected = []
+    if preflight:
+        accepted = []
+        for filepath in replays:
+            game_stats = GameStats(filepath)
+            with game_stats.stage('preflight'):
+                reason = preflight_check(filepath)
+            if reason is None:
+                accepted.append(filepath)
+            else:
+                rejected.append((filepath, reason, game_stats))
+        replays = accepted
+
+    N = len(replays)
+    run_stats = ClippifyStats(N, log=log)
+
+    for filepath, reason, game_stats in rejected:
+        failed_uploads += 1
+        if reason == TOO_SHORT:
+            games_too_short += 1
+        elif reason == NOT_1V1:
+            not_1v1 += 1
+        else:
+            parse_errors += 1
+        run_stats.reject(game_stats, reason)
+
+        if manifest is not None:
+            record = manifest.make_record(filepath, reason)
+            if clip_format == 'npy':
+                manifest.stage(record, 0)
+            else:
+                manifest.record(record)
+
+    # clip store writer (only used for the 'npy' format).
+    # when running incrementally, shards are only written at checkpoints,
+    # right before the manifest records of the games in them
+    index_writer = IndexWriter(output_directory) if index else None
+    if clip_format == 'npy':
+        writer = ShardWriter(
+            output_directory,
+            shard_size = None if incremental else SHARD_SIZE,
+            index = index_writer,
+            stats = run_stats.store
+        )
+    else:
+        writer = None
+
+    # create clips from replay file and save them to disk
+    def clippify_serially():
+        for filepath in replays:
+            result = Future()
+            game_stats = GameStats(filepath)
+
+            # next_clip_id is read when each game starts,
+            # so every game continues the running clip count
+            try: result.set_result(clippify_game(
+                    input_filepath = filepath,
+                    output_directory = output_directory,
+                    clip_length = clip_length,
+                    train_test_split = train_test_split,
+                    current_clip_total = next_clip_id,
+                    writer = writer,
+                    cache = cache,
+                    index = index_writer,
+                    compact = compact,
+                    run_length = run_length,
+                    stats = game_stats
+                ) + ([], [], game_stats))
+            except Exception as e:
+                e.stats = game_stats
+                result.set_exception(e)
+            yield filepath, next_clip_id, result
+
+    def clippify_in_parallel(executor):
+        first_clip_ids = {
+            executor.submit(
+                clippify_worker,
+                clip_format,
+                index = index_writer is not None,
                 input_filepath = filepath,
                 output_directory = output_directory,
                 clip_length = clip_length,
                 train_test_split = train_test_split,
-                current_clip_total = clip_total
-            )
-            
-        except GameTooShortError:
-            failed_uploads += 1
-            games_too_short += 1
+                current_clip_total = next_clip_id + i * CLIP_ID_STRIDE,
+                max_clips = CLIP_ID_STRIDE,
+                cache = cache,
+                compact = compact,
+                run_length = run_length
+            ): (filepath, next_clip_id + i * CLIP_ID_STRIDE)
+            for i, filepath in enumerate(replays)
+        }
+        for result in as_completed(first_clip_ids):
+            filepath, first_clip_id = first_clip_ids[result]
+            yield filepath, first_clip_id, result
+
+    if workers > 1:
+        executor = ProcessPoolExecutor(workers)
+        results = clippify_in_parallel(executor)
+    else:
+        executor = None
+        results = clippify_serially()
 
-        except ParseError:
-            failed_uploads += 1
-            parse_errors += 1
+    # iterate over results as games finish
+    try:
+        for i, (filepath, first_clip_id, result) in enumerate(results):
 
-        except InvalidGameError:
-            failed_uploads += 1
-            invalid_games += 1
-        
-        except:
-            failed_uploads += 1
-            unknown_errors += 1
+            new_clips = 0
+            outcome = OK
 
-        else:
-            successful_uploads += 1
-            clip_total += new_clips
-            clippify_failures += new_clippify_failures
+            # timings of the game, also kept when it failed
+            game_stats = getattr(result.exception(), 'stats', None) or GameStats(filepath)
+
+            try: new_clips, new_clippify_failures, clips, index_rows, game_stats = result.result()
+                
+            except GameTooShortError:
+                failed_uploads += 1
+                games_too_short += 1
+                outcome = 'too_short'
+
+            except ParseError:
+                failed_uploads += 1
+                parse_errors += 1
+                outcome = 'parse_error'
+
+            except InvalidGameError:
+                failed_uploads += 1
+                invalid_games += 1
+                outcome = 'invalid'
+            
+            except:
+                failed_uploads += 1
+                unknown_errors += 1
+                outcome = 'unknown_error'
+
+            else:
+                successful_uploads += 1
+                clip_total += new_clips
+                next_clip_id += new_clips
+                clippify_failures += new_clippify_failures
+
+                # clips made by worker processes for the clip store
+                for clip_payload, split in clips:
+                    writer.write(clip_payload, split)
+
+                # pickled clips made by worker processes
+                for split, row in index_rows:
+                    index_writer.add(split, row)
+                if index_writer is not None:
+                    index_writer.commit()
+
+            finally: # progress bar
+                run_stats.add(game_stats, outcome)
+                display_progress(i + 1, N, eta=run_stats.eta)
+
+            # record the replay in the manifest once its clips are on disk
+            if manifest is not None:
+                record = manifest.make_record(filepath, outcome, first_clip_id, new_clips)
+                if writer is None:
+                    manifest.record(record)
+                elif manifest.stage(record, new_clips) >= SHARD_SIZE:
+                    writer.close()
+                    manifest.commit()
+
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        if writer is not None:
+            writer.close()
+        if manifest is not None:
+            manifest.commit()
+        if index_writer is not None:
+            index_writer.close()
+        run_stats.close()
 
-        finally: # progress bar
-            display_progress(i, N)
     display_progress(N,N)
 
     # Display message after upload is complete
@@ -245,6 +587,10 @@ def clippify(
     - {games_too_short} were too short.
     - {parse_errors} failed to parse.\n'''
 
+    # if any games were not 1v1, display this
+    if not_1v1 > 0:
+        msg += f'    - {not_1v1} were not 1v1 games.\n'
+
     # if any games were rejected by extract function, display this
     if invalid_games > 0:
         msg += f'    - {invalid_games} were rejected by extract function.\n'
@@ -253,6 +599,10 @@ def clippify(
     if clippify_failures > 0:
         msg += f'    - {clippify_failures} clippify failures.\n'
 
+    # if any replays were skipped by an incremental run, display this
+    if already_processed > 0:
+        msg += f'    - {already_processed} were already processed.\n'
+
     # if any files had the wrong extension display this
     if wrong_filetype > 0:
         msg += f'    - {wrong_filetype} paths were not .slp files.\n'
@@ -261,4 +611,14 @@ def clippify(
     if unknown_errors > 0:
         msg += f'    - {unknown_errors} unknown errors.\n'
 
+    # where the failed games were rejected
+    if preflight:
+        msg += (
+            f'    ({sum(run_stats.preflight_rejections.values())} rejected at pre-flight, '
+            f'{sum(run_stats.parse_rejections.values())} after a full parse)\n'
+        )
+
     print(msg)
+    print(run_stats)
+
+    return run_stats
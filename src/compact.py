@@ -0,0 +1,243 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Python module for the compact istream encoding -
+a lossless, 7 bytes per frame alternative to the
+float64 istream matrices.
+
+    analog columns 0-5   one byte code per value
+                         (int8 stick positions in units of 1/80,
+                          uint8 trigger positions in units of 1/140)
+    button columns 6-12  one uint8 bitfield per frame
+
+Codes are turned back into floats with lookup tables built
+the way the game computes the values, so decoding gives back
+exactly the values the replay held.
+'''
+
+import numpy as np
+
+# istream column layout
+STICK_COLUMNS = 4
+TRIGGER_COLUMNS = 2
+ANALOG_COLUMNS = STICK_COLUMNS + TRIGGER_COLUMNS
+BUTTON_COLUMNS = 7
+
+# Melee quantizes stick positions to multiples of 1/80 and
+# trigger positions to multiples of 1/140. The tables are built
+# with float32 division, like the game, so every value in a
+# replay has an exact code.
+_codes = np.arange(256, dtype=np.uint8)
+STICK_VALUES = (_codes.view(np.int8).astype(np.float32) / np.float32(80)).astype(np.float64)
+TRIGGER_VALUES = (_codes.astype(np.float32) / np.float32(140)).astype(np.float64)
+
+# (6, 256) lookup table of the analog columns
+DEFAULT_TABLE = np.stack(
+    [STICK_VALUES] * STICK_COLUMNS + [TRIGGER_VALUES] * TRIGGER_COLUMNS
+)
+
+# bit of each button column in the bitfield
+BUTTON_BITS = np.arange(BUTTON_COLUMNS, dtype=np.uint8)
+
+class CompactIstream:
+    '''
+    Compact (frames, 13) istream.
+
+    Supports the parts of the csr_matrix interface the rest of
+    the project uses (shape, row slicing and toarray), so compact
+    istreams can go anywhere a sparse istream can.
+
+    Attributes
+    -----------
+    analog (ndarray) : (frames, 6) uint8 codes of the analog columns
+    buttons (ndarray) : (frames,) uint8 button bitfields
+    table (ndarray) : (6, 256) float64 lookup table, DEFAULT_TABLE unless
+                      a column held values off the stick/trigger grid
+    '''
+
+    __slots__ = ('analog', 'buttons', 'table')
+
+    def __init__(self, analog, buttons, table=DEFAULT_TABLE):
+        self.analog = analog
+        self.buttons = buttons
+        self.table = table
+
+    @property
+    def shape(self):
+        return (self.analog.shape[0], ANALOG_COLUMNS + BUTTON_COLUMNS)
+
+    @property
+    def nbytes(self):
+        table_bytes = 0 if self.table is DEFAULT_TABLE else self.table.nbytes
+        return self.analog.nbytes + self.buttons.nbytes + table_bytes
+
+    def __getitem__(self, rows):
+        if not isinstance(rows, slice):
+            raise TypeError('compact istreams can only be sliced by rows')
+        return CompactIstream(self.analog[rows], self.buttons[rows], self.table)
+
+    def __getstate__(self):
+        # the default table is left out of pickles, and
+        # restored as the shared DEFAULT_TABLE object
+        table = None if self.table is DEFAULT_TABLE else self.table
+        return self.analog, self.buttons, table
+
+    def __setstate__(self, state):
+        self.analog, self.buttons, table = state
+        self.table = DEFAULT_TABLE if table is None else table
+
+    def toarray(self):
+        '''Decodes to a dense (frames, 13) float64 istream'''
+        return decode_batch([self])[0]
+
+    @staticmethod
+    def stack(istreams, dtype=np.float64):
+        return decode_batch(istreams, dtype)
+
+def encode_analog(analog):
+    '''
+    Encodes the analog columns of an istream
+
+    Parameters
+    -----------
+    analog (ndarray) : (frames, 6) joystick, cstick and trigger positions
+
+    Returns
+    -----------
+    codes (ndarray) : (frames, 6) uint8 codes
+    table (ndarray) : lookup table for the codes
+    '''
+
+    analog = np.asarray(analog, dtype=np.float64)
+
+    codes = np.empty(analog.shape, dtype=np.uint8)
+    codes[:, :STICK_COLUMNS] = np.rint(analog[:, :STICK_COLUMNS] * 80).clip(-128, 127).astype(np.int8).view(np.uint8)
+    codes[:, STICK_COLUMNS:] = np.rint(analog[:, STICK_COLUMNS:] * 140).clip(0, 255).astype(np.uint8)
+
+    exact = DEFAULT_TABLE[np.arange(ANALOG_COLUMNS), codes] == analog
+    if exact.all():
+        return codes, DEFAULT_TABLE
+
+    # a column with values off the grid gets a table of its own distinct values
+    table = DEFAULT_TABLE.copy()
+    for column in np.nonzero(~exact.all(axis=0))[0]:
+        values, inverse = np.unique(analog[:, column], return_inverse=True)
+        if len(values) > 256:
+            raise ValueError(f'analog column {column} has more than 256 distinct values')
+        table[column, :len(values)] = values
+        codes[:, column] = inverse
+
+    return codes, table
+
+def encode_buttons(pressed):
+    '''Packs (frames, 7) pressed flags into (frames,) uint8 bitfields'''
+    pressed = np.asarray(pressed) != 0
+    return (pressed.astype(np.uint8) << BUTTON_BITS).sum(axis=1, dtype=np.uint8)
+
+def compact_istream(istream):
+    '''
+    Encodes a float istream
+
+    Parameters
+    -----------
+    istream (csr_matrix | ndarray) : (frames, 13) istream
+
+    Returns
+    -----------
+    istream (CompactIstream) : the same istream, compactly encoded
+    '''
+
+    if isinstance(istream, CompactIstream):
+        return istream
+    if hasattr(istream, 'toarray'):
+        istream = istream.toarray()
+
+    analog, table = encode_analog(istream[:, :ANALOG_COLUMNS])
+    buttons = encode_buttons(istream[:, ANALOG_COLUMNS:])
+    return CompactIstream(analog, buttons, table)
+
+def decode_batch(istreams, dtype=np.float64):
+    '''
+    Decodes compact istreams of the same length, all at once
+
+    Parameters
+    -----------
+    istreams (list) : CompactIstreams, all with the same number of frames
+    dtype : dtype of the output
+
+    Returns
+    -----------
+    batch (ndarray) : (len(istreams), frames, 13) dense istreams
+    '''
+
+    return decode_codes(
+        np.stack([istream.analog for istream in istreams]),
+        np.stack([istream.buttons for istream in istreams]),
+        [istream.table for istream in istreams],
+        dtype
+    )
+
+def decode_codes(analog, buttons, tables, dtype=np.float64):
+    '''
+    Decodes analog codes and button bitfields
+
+    Parameters
+    -----------
+    analog (ndarray) : (istreams, frames, 6) uint8 analog codes
+    buttons (ndarray) : (istreams, frames) uint8 button bitfields
+    tables (list) : lookup table of every istream
+    dtype : dtype of the output
+
+    Returns
+    -----------
+    batch (ndarray) : (istreams, frames, 13) dense istreams
+    '''
+
+    batch = np.empty(analog.shape[:2] + (ANALOG_COLUMNS + BUTTON_COLUMNS,), dtype=dtype)
+
+    if all(table is DEFAULT_TABLE for table in tables):
+        # same float32 division the default tables are built with,
+        # which vectorizes better than a table gather
+        sticks = analog[..., :STICK_COLUMNS].view(np.int8).astype(np.float32)
+        sticks /= np.float32(80)
+        triggers = analog[..., STICK_COLUMNS:].astype(np.float32)
+        triggers /= np.float32(140)
+        batch[..., :STICK_COLUMNS] = sticks
+        batch[..., STICK_COLUMNS:ANALOG_COLUMNS] = triggers
+    else:
+        columns = np.arange(ANALOG_COLUMNS)
+        for i, table in enumerate(tables):
+            batch[i, :, :ANALOG_COLUMNS] = table[columns, analog[i]]
+
+    bits = np.unpackbits(buttons[..., None], axis=-1, bitorder='little')
+    batch[..., ANALOG_COLUMNS:] = bits[..., :BUTTON_COLUMNS]
+    return batch
+
+def stack_istreams(istreams, dtype=np.float64):
+    '''
+    Stacks istreams of the same length into one dense batch.
+    Encoded istreams of a single kind (CompactIstreams, or
+    rle.RunLengthIstreams) are decoded together by their stack method.
+
+    Parameters
+    -----------
+    istreams (list) : encoded istreams, csr_matrices or ndarrays
+
+    Returns
+    -----------
+    batch (ndarray) : (len(istreams), frames, 13) array
+                      ((0, 0, 13) for no istreams)
+    '''
+
+    if not len(istreams):
+        return np.empty((0, 0, 13), dtype=dtype)
+
+    kind = type(istreams[0])
+    if hasattr(kind, 'stack') and all(type(istream) is kind for istream in istreams):
+        return kind.stack(istreams, dtype)
+    return np.stack([
+        istream.toarray() if hasattr(istream, 'toarray') else istream
+        for istream in istreams
+    ]).astype(dtype, copy=False)
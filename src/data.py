@@ -4,6 +4,7 @@ Email : zack@magnotti.net
 Date : 3/19/2021
 
 Python module containing generator functions
+(and equivalent keras Sequences and tf.data pipelines)
 to feed the "clips" dataset (created with clippify.py)
 into the training loops for SSBML-Base-Model
 and SSBML-Transfer-Model.
@@ -13,8 +14,14 @@ import numpy as np
 import pickle
 import random
 import math
+import tensorflow as tf
 from tensorflow import one_hot
 from src.util import characters, id_from_char, char_from_id
+from src.store import is_store, open_store
+from src.index import has_index, open_index
+from src.compact import stack_istreams
+from src.games import open_game_store, TEST_SIZE
+from src.cache import clip_cache
 import os
 from os.path import join, splitext
 
@@ -22,7 +29,7 @@ def valid_files(file_list):
     '''Given a list of filenames, return a list of only .pkl filenames'''
     return [f for f in file_list if splitext(f)[1] == '.pkl']
 
-def get_batch(batch_filenames, batch_dir):
+def get_batch(batch_filenames, batch_dir, cache=None):
     '''
     Unpickles and returns the contents of the files
     listed in batch_filenames, which are located in 
@@ -32,33 +39,133 @@ def get_batch(batch_filenames, batch_dir):
     -----------
     batch_filenames (list) : filenames of datapoints for this batch
     batch_dir (string) : path to directory to fetch batch from
+    cache (ClipCache) : if given, clips are served from (and added to)
+                        this in-memory cache (see cache.ClipCache)
     
     Outputs (yield)
     -----------
     batch (list) : datapoints (dictionaries) for this batch
     '''
-    batch_abspaths = [join(batch_dir, f) for f in batch_filenames]
-    batch = [pickle.load(open(abspath, 'rb')) for abspath in batch_abspaths]
+    batch = []
+    for f in batch_filenames:
+        abspath = join(batch_dir, f)
+        if cache is not None:
+            hit, clip = cache.get(abspath)
+            if hit:
+                batch.append(clip)
+                continue
+
+        with open(abspath, 'rb') as clip_file:
+            clip = pickle.load(clip_file)
+
+        if cache is not None:
+            cache.put(abspath, clip, os.path.getsize(abspath))
+        batch.append(clip)
     return batch
 
+def resolve_cache(cache, directory):
+    '''
+    Returns the clip cache a loader should read directory through:
+    None for no cache, the shared cache of directory for True
+    (see cache.clip_cache), or the given ClipCache
+    '''
+    if cache is None or cache is False:
+        return None
+    if cache is True:
+        return clip_cache(directory)
+    return cache
+
+def list_clips(input_directory, clip_filter=None):
+    '''
+    Lists the clips in input_directory
+
+    When the directory has a clip index (see index.py)
+    the clips are looked up in it instead of listing the directory.
+
+    Parameters
+    -----------
+    input_directory (string) : directory of pickled clips or a clip store
+    clip_filter (dict) : if given, only list the matching clips, eg.
+                         {'character': 'FOX'} or {'not_code': 'ABC#123'}
+                         (see index.filter_terms). If the directory
+                         has no clip index yet, one is built first.
+
+    Outputs
+    -----------
+    clips (list) : filenames of the pickled clips,
+                   or row numbers of the clips in the clip store
+    '''
+
+    if clip_filter is not None or has_index(input_directory):
+        with open_index(input_directory) as index:
+            rows = index.select(clip_filter)
+
+        if is_store(input_directory):
+            store = open_store(input_directory)
+            return store.rows(
+                [shard for _, shard, _ in rows if shard is not None],
+                [offset for _, shard, offset in rows if shard is not None]
+            )
+        return [clip_path for clip_path, _, _ in rows if clip_path is not None]
+
+    if is_store(input_directory):
+        return list(range(len(open_store(input_directory))))
+    return valid_files(os.listdir(input_directory))
+
+def get_clips(batch_clips, batch_dir, cache=None):
+    '''
+    Fetches the istreams and characters of the clips
+    listed in batch_clips, which are located in batch_dir
+
+    Parameters
+    -----------
+    batch_clips (list) : clips (from list_clips) for this batch
+    batch_dir (string) : path to directory to fetch batch from
+    cache (ClipCache) : in-memory cache of pickled clips (see get_batch);
+                        not used for clip stores, which are memory-mapped
+
+    Outputs
+    -----------
+    batch_istreams (ndarray) : (batch size, frames, 13) istreams
+    batch_characters (list) : character names
+    '''
+
+    # clip store: one gather from the memory-mapped shards
+    if is_store(batch_dir):
+        store = open_store(batch_dir)
+        batch_istreams = store.istreams(batch_clips)
+        batch_characters = list(store.metadata['character'][batch_clips])
+        return batch_istreams, batch_characters
+
+    # compact istreams are decoded together
+    batch = get_batch(batch_clips, batch_dir, cache)
+    batch_istreams = stack_istreams([clip['istream'] for clip in batch])
+    batch_characters = [clip['character'] for clip in batch]
+    return batch_istreams, batch_characters
+
 def character_data(
         input_directory, 
         batch_size = 32,
         num_batches = None,
         repeat = False,
         onehot = True,
-        shuffle = True
+        shuffle = True,
+        clip_filter = None,
+        cache = None
     ):
     ''' 
     Fetches data from given directory in batches
 
     Parameters
     -----------
-    input_directory (string) : directory from which to fetch data
+    input_directory (string) : directory (of pickled clips or a clip store) from which to fetch data
     batch_size (int) : number of documents per batch
     repeat (bool) : if true, generator loops back after exhausting data, if false, generator stops when data runs out
     onehot (bool) : whether or not to return labels in onehot form
     shuffle (bool) : whether or not to shuffle data 
+    clip_filter (dict) : if given, only use the matching clips (see list_clips)
+    cache (bool | ClipCache) : if true, clips are kept in memory after their first
+                               read (see cache.clip_cache), or in the given ClipCache
     
     Outputs (yield)
     -----------
@@ -66,9 +173,11 @@ def character_data(
     batch_labels (array | ndarray)
     '''
 
+    cache = resolve_cache(cache, input_directory)
+
     while True:
 
-        filenames = valid_files(os.listdir(input_directory))
+        filenames = list_clips(input_directory, clip_filter)
 
         if shuffle:
             random.shuffle(filenames)
@@ -86,14 +195,10 @@ def character_data(
             except IndexError:
                 batch_filenames = filenames[i:]
             finally:
-                batch = get_batch(batch_filenames, input_directory)
+                batch_istreams, batch_characters = get_clips(batch_filenames, input_directory, cache)
 
-            # extract istreams and labels
-            batch_istreams = [clip['istream'].toarray() for clip in batch]
-            batch_labels = [id_from_char[clip['character']] for clip in batch]
-
-            # convert istreams to single ndarray
-            batch_istreams = np.stack(batch_istreams, axis=0)
+            # extract labels
+            batch_labels = [id_from_char[character] for character in batch_characters]
 
             if onehot:
                 batch_labels = one_hot(batch_labels, 26)
@@ -112,15 +217,22 @@ def player_data(
         shuffle = True,
         ratio = 1,
         onehot = False,
+        player_filter = None,
+        anonymous_filter = None,
+        cache = None
     ):
     ''' 
     Fetches data from given directories, and yields a blend of both
     datasets specified by the ratio provided (default is 1, for 50/50 split) 
 
+    With clip filters both sides can come from one indexed directory,
+    eg. player_filter={'code': 'ABC#123'}, anonymous_filter={'not_code': 'ABC#123'}
+
     Parameters
     -----------
     player_dir (string) : directory containing the player's data
     anonymous_dir (string) : directory containing random data that is not the player's
+                             (either directory can hold pickled clips or a clip store)
     batch_size (int) : number of documents per batch
     repeat (bool | int) : if true generator loops back after exhausting data.
                           if false generator stops when data runs out.
@@ -128,6 +240,11 @@ def player_data(
     onehot (bool) : whether or not to return labels in onehot form
     shuffle (bool) : whether or not to shuffle data 
     ratio (int | float) : ratio of Anonymous games with given player's games (Anonymous / Player) 
+    player_filter (dict) : if given, only use the matching clips of player_dir (see list_clips)
+    anonymous_filter (dict) : if given, only use the matching clips of anonymous_dir
+    cache (bool | ClipCache) : if true, clips are kept in memory after their first
+                               read, in one cache per directory (see cache.clip_cache),
+                               or in the given ClipCache
     
     Outputs (yield)
     -----------
@@ -146,11 +263,14 @@ def player_data(
     if not ratio > 0:
         raise ValueError
 
-    player_filenames = valid_files(os.listdir(player_dir))
+    player_cache = resolve_cache(cache, player_dir)
+    anonymous_cache = resolve_cache(cache, anonymous_dir)
+
+    player_filenames = list_clips(player_dir, player_filter)
     player_batch_size = np.random.binomial(n = batch_size, p = ratio  / (ratio + 1))
     player_current_index = np.inf
 
-    anonymous_filenames = valid_files(os.listdir(anonymous_dir))
+    anonymous_filenames = list_clips(anonymous_dir, anonymous_filter)
     anonymous_batch_size = batch_size - player_batch_size
     anonymous_current_index = np.inf
 
@@ -181,11 +301,11 @@ def player_data(
         player_current_index += player_batch_size
 
         # get data for player batch
-        player_batch = get_batch(player_filenames[pstart:pend], player_dir)
+        player_istreams, _ = get_clips(player_filenames[pstart:pend], player_dir, player_cache)
 
         # list of tuple(istream, label)
         # label for player is 0
-        player_batch_tuples = [(clip['istream'].toarray(), 1.0) for clip in player_batch]
+        player_batch_tuples = [(istream, 1.0) for istream in player_istreams]
         
         # ======================
         #  get anonymous batch
@@ -202,11 +322,11 @@ def player_data(
         anonymous_current_index += anonymous_batch_size
 
         # get anonymous batch
-        anonymous_batch = get_batch(anonymous_filenames[npstart:npend], anonymous_dir)
+        anonymous_istreams, _ = get_clips(anonymous_filenames[npstart:npend], anonymous_dir, anonymous_cache)
 
         # list of tuple(istream, label)
         # label for anonymous is 1
-        anonymous_batch_tuples = [(clip['istream'].toarray(), 0.0) for clip in anonymous_batch]
+        anonymous_batch_tuples = [(istream, 0.0) for istream in anonymous_istreams]
         
         # ==============
         #  mix batches 
@@ -228,3 +348,770 @@ def player_data(
             batch_labels = one_hot(batch_labels, 2)
 
         yield batch_istreams, batch_labels
+
+# ==============================
+#   keras Sequences
+# ==============================
+
+def epoch_rng(seed, epoch, *keys):
+    '''Random number generator of one epoch (and batch), the same in every worker process'''
+    return np.random.default_rng([seed, epoch, *keys])
+
+class CharacterSequence(tf.keras.utils.Sequence):
+    '''
+    keras Sequence version of character_data, so model.fit
+    can load batches in worker processes:
+
+        model.fit(CharacterSequence(directory), workers=8, use_multiprocessing=True)
+
+    Batch i of an epoch is always the same clips (the order of
+    every epoch only depends on seed and the epoch number), so
+    any worker can load any batch. Labels are numpy arrays,
+    so worker processes never run tensorflow ops.
+    '''
+
+    def __init__(
+            self,
+            input_directory,
+            batch_size = 32,
+            onehot = True,
+            shuffle = True,
+            clip_filter = None,
+            seed = None,
+            cache = None
+        ):
+        '''
+        Parameters
+        -----------
+        input_directory (string) : directory (of pickled clips or a clip store) from which to fetch data
+        batch_size (int) : number of clips per batch
+        onehot (bool) : whether or not to return labels in onehot form
+        shuffle (bool) : whether or not to shuffle the clips every epoch
+        clip_filter (dict) : if given, only use the matching clips (see list_clips)
+        seed (int) : seed of the shuffling (default: a random one)
+        cache (bool | ClipCache) : if true, clips are kept in memory after their first
+                                   read (see cache.clip_cache), or in the given ClipCache.
+                                   With use_multiprocessing every worker has its own
+                                   cache, and keras starts new workers every epoch,
+                                   so caching needs thread workers (or none)
+        '''
+
+        super().__init__()
+        self.input_directory = input_directory
+        self.batch_size = batch_size
+        self.onehot = onehot
+        self.shuffle = shuffle
+        self.seed = np.random.SeedSequence().entropy if seed is None else seed
+        self.clips = list_clips(input_directory, clip_filter)
+        self.cache = resolve_cache(cache, input_directory)
+        self.epoch = 0
+        self._order = None
+
+    def __len__(self):
+        return math.ceil(len(self.clips) / self.batch_size)
+
+    def order(self):
+        '''Order of the clips in the current epoch'''
+        if self._order is None or self._order[0] != self.epoch:
+            order = np.arange(len(self.clips))
+            if self.shuffle:
+                order = epoch_rng(self.seed, self.epoch).permutation(order)
+            self._order = self.epoch, order
+        return self._order[1]
+
+    def __getitem__(self, i):
+        batch = self.order()[i * self.batch_size:(i + 1) * self.batch_size]
+        batch_istreams, batch_characters = get_clips([self.clips[c] for c in batch], self.input_directory, self.cache)
+        batch_labels = np.array([id_from_char[character] for character in batch_characters])
+
+        if self.onehot:
+            batch_labels = np.eye(26, dtype=np.float32)[batch_labels]
+
+        return batch_istreams, batch_labels
+
+    def on_epoch_end(self):
+        self.epoch += 1
+
+class PlayerSequence(tf.keras.utils.Sequence):
+    '''
+    keras Sequence version of player_data, so model.fit
+    can load batches in worker processes.
+
+    Every batch mixes about batch_size / (ratio + 1) of the
+    player's clips (label 1) with anonymous clips (label 0),
+    and an epoch goes through the player's clips once.
+    Like CharacterSequence, batch i of an epoch is always the
+    same clips, and labels are numpy arrays.
+    '''
+
+    def __init__(
+            self,
+            player_dir,
+            anonymous_dir,
+            batch_size = 32,
+            shuffle = True,
+            ratio = 1,
+            onehot = False,
+            player_filter = None,
+            anonymous_filter = None,
+            seed = None,
+            cache = None
+        ):
+        '''
+        Parameters
+        -----------
+        player_dir (string) : directory containing the player's data
+        anonymous_dir (string) : directory containing random data that is not the player's
+                                 (either directory can hold pickled clips or a clip store)
+        batch_size (int) : number of clips per batch
+        shuffle (bool) : whether or not to shuffle the clips every epoch
+        ratio (int | float) : ratio of Anonymous clips with given player's clips (Anonymous / Player)
+        onehot (bool) : whether or not to return labels in onehot form
+        player_filter (dict) : if given, only use the matching clips of player_dir (see list_clips)
+        anonymous_filter (dict) : if given, only use the matching clips of anonymous_dir
+        seed (int) : seed of the shuffling and mixing (default: a random one)
+        cache (bool | ClipCache) : if true, clips are kept in memory after their first
+                                   read, in one cache per directory
+                                   (see cache.clip_cache), or in the given ClipCache.
+                                   With use_multiprocessing every worker has its own
+                                   cache, and keras starts new workers every epoch,
+                                   so caching needs thread workers (or none)
+        '''
+
+        if not ratio > 0:
+            raise ValueError
+
+        super().__init__()
+        self.player_dir = player_dir
+        self.anonymous_dir = anonymous_dir
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.ratio = ratio
+        self.onehot = onehot
+        self.seed = np.random.SeedSequence().entropy if seed is None else seed
+        self.player_clips = list_clips(player_dir, player_filter)
+        self.anonymous_clips = list_clips(anonymous_dir, anonymous_filter)
+        self.player_cache = resolve_cache(cache, player_dir)
+        self.anonymous_cache = resolve_cache(cache, anonymous_dir)
+        self.epoch = 0
+        self._plan = None
+
+    def __len__(self):
+        return math.ceil(len(self.player_clips) * (self.ratio + 1) / self.batch_size)
+
+    def plan(self):
+        '''
+        Clips of every batch of the current epoch
+
+        Returns
+        -----------
+        player_order, anonymous_order (ndarray) : order of the clips of either side
+        player_ends (ndarray) : end of every batch's player clips in player_order
+        anonymous_ends (ndarray) : end of every batch's anonymous clips in anonymous_order
+        '''
+
+        if self._plan is None or self._plan[0] != self.epoch:
+            rng = epoch_rng(self.seed, self.epoch)
+            player_order = np.arange(len(self.player_clips))
+            anonymous_order = np.arange(len(self.anonymous_clips))
+            if self.shuffle:
+                player_order = rng.permutation(player_order)
+                anonymous_order = rng.permutation(anonymous_order)
+
+            player_sizes = rng.binomial(n = self.batch_size, p = 1 / (self.ratio + 1), size = len(self))
+            anonymous_sizes = self.batch_size - player_sizes
+            self._plan = self.epoch, (
+                player_order, anonymous_order,
+                np.cumsum(player_sizes), np.cumsum(anonymous_sizes)
+            )
+        return self._plan[1]
+
+    def __getitem__(self, i):
+        player_order, anonymous_order, player_ends, anonymous_ends = self.plan()
+
+        # consecutive clips of either side (wrapping around), see plan
+        player_start = player_ends[i - 1] if i else 0
+        anonymous_start = anonymous_ends[i - 1] if i else 0
+        player_batch = player_order[np.arange(player_start, player_ends[i]) % len(player_order)]
+        anonymous_batch = anonymous_order[np.arange(anonymous_start, anonymous_ends[i]) % len(anonymous_order)]
+
+        # either side can be empty in a small batch
+        batch_istreams = np.concatenate([
+            get_clips([clips[c] for c in batch], directory, cache)[0]
+            for clips, batch, directory, cache in (
+                (self.player_clips, player_batch, self.player_dir, self.player_cache),
+                (self.anonymous_clips, anonymous_batch, self.anonymous_dir, self.anonymous_cache),
+            )
+            if len(batch)
+        ])
+
+        # label for player is 1, label for anonymous is 0
+        batch_labels = np.concatenate((
+            np.ones(len(player_batch)),
+            np.zeros(len(anonymous_batch)),
+        ))
+
+        # mix batches
+        order = epoch_rng(self.seed, self.epoch, i).permutation(len(batch_labels))
+        batch_istreams = batch_istreams[order]
+        batch_labels = batch_labels[order]
+
+        if self.onehot:
+            batch_labels = np.eye(2, dtype=np.float32)[batch_labels.astype(np.int64)]
+
+        return batch_istreams, batch_labels
+
+    def on_epoch_end(self):
+        self.epoch += 1
+
+# ==============================
+#   random windows of full games
+# ==============================
+
+def character_windows(
+        input_directory,
+        batch_size = 32,
+        num_batches = None,
+        repeat = False,
+        onehot = True,
+        shuffle = True,
+        window = 30,
+        split = None,
+        test_size = TEST_SIZE,
+        clip_filter = None,
+        seed = None
+    ):
+    ''' 
+    Drop-in alternative to character_data that samples
+    random windows from a game store (see games.py)
+    instead of reading pre-cut clips.
+
+    An epoch is as many windows as the games would have
+    been cut into clips of the same length.
+
+    Parameters
+    -----------
+    input_directory (string) : game store from which to fetch data
+    batch_size (int) : number of windows per batch
+    num_batches (int) : if given, stop after this many batches
+    repeat (bool) : if true, generator loops back after an epoch, if false, generator stops after one
+    onehot (bool) : whether or not to return labels in onehot form
+    shuffle (bool) : accepted for compatibility with character_data,
+                     windows are always sampled at random
+    window (int or float) : length of windows in seconds
+    split (string) : 'train' or 'test' to only sample from one side
+                     of the game-level split, None for every game
+    test_size (float) : fraction of games in the test split
+    clip_filter (dict) : if given, only use the matching players (see index.filter_terms)
+    seed (int) : seed of the window sampler
+    
+    Outputs (yield)
+    -----------
+    batch_istreams (ndarray)
+    batch_labels (array | ndarray)
+    '''
+
+    store = open_game_store(input_directory)
+    streams = store.streams(split, test_size, clip_filter)
+    window_frames = int(window * 60)
+    rng = np.random.default_rng(seed)
+
+    epoch = (store.games['length'][streams] // window_frames).sum()
+    if epoch == 0:
+        raise ValueError(f'no games of at least {window_frames} frames')
+    batches_per_epoch = math.ceil(epoch / batch_size)
+
+    batch = 0
+    while True:
+        for _ in range(batches_per_epoch):
+
+            # if num_batches specified
+            # stop generator once that many batches have been yielded
+            if num_batches and batch >= num_batches:
+                return
+            batch += 1
+
+            batch_istreams, batch_streams = store.sample(streams, batch_size, window_frames, rng)
+            batch_labels = [id_from_char[character] for character in store.games['character'][batch_streams]]
+
+            if onehot:
+                batch_labels = one_hot(batch_labels, 26)
+
+            yield batch_istreams, batch_labels
+
+        if not repeat:
+            return
+
+def player_windows(
+        player_dir,
+        anonymous_dir,
+        batch_size = 32,
+        repeat = False,
+        shuffle = True,
+        ratio = 1,
+        onehot = False,
+        player_filter = None,
+        anonymous_filter = None,
+        window = 30,
+        split = None,
+        test_size = TEST_SIZE,
+        seed = None
+    ):
+    ''' 
+    Drop-in alternative to player_data that samples
+    random windows from game stores (see games.py)
+    instead of reading pre-cut clips.
+
+    An epoch is as many windows as the player's games
+    would have been cut into clips of the same length.
+    Both sides can come from one game store, eg.
+    player_filter={'code': 'ABC#123'}, anonymous_filter={'not_code': 'ABC#123'}
+
+    Parameters
+    -----------
+    player_dir (string) : game store containing the player's games
+    anonymous_dir (string) : game store containing random games that are not the player's
+    batch_size (int) : number of windows per batch
+    repeat (bool | int) : if true generator loops back after an epoch.
+                          if false generator stops after one.
+                          if integer, repeat the given number of times
+    shuffle (bool) : accepted for compatibility with player_data,
+                     windows are always sampled at random
+    ratio (int | float) : ratio of Anonymous windows with given player's windows (Anonymous / Player) 
+    onehot (bool) : whether or not to return labels in onehot form
+    player_filter (dict) : if given, only use the matching players of player_dir (see index.filter_terms)
+    anonymous_filter (dict) : if given, only use the matching players of anonymous_dir
+    window (int or float) : length of windows in seconds
+    split (string) : 'train' or 'test' to only sample from one side
+                     of the game-level split, None for every game
+    test_size (float) : fraction of games in the test split
+    seed (int) : seed of the window sampler
+    
+    Outputs (yield)
+    -----------
+    batch_istreams (ndarray)
+    batch_labels (array | ndarray)
+    '''
+
+    if repeat is True:
+        repeat = np.inf
+    if repeat is False:
+        repeat = 0
+    if type(repeat) is int:
+        if repeat < 0:
+            raise ValueError
+
+    if not ratio > 0:
+        raise ValueError
+
+    player_store = open_game_store(player_dir)
+    player_streams = player_store.streams(split, test_size, player_filter)
+    anonymous_store = open_game_store(anonymous_dir)
+    anonymous_streams = anonymous_store.streams(split, test_size, anonymous_filter)
+
+    window_frames = int(window * 60)
+    rng = np.random.default_rng(seed)
+
+    # an epoch ends once about as many player windows
+    # as the player's games hold have been sampled
+    epoch = (player_store.games['length'][player_streams] // window_frames).sum()
+    if epoch == 0:
+        raise ValueError(f'no player games of at least {window_frames} frames')
+    if not (anonymous_store.games['length'][anonymous_streams] >= window_frames).any():
+        raise ValueError(f'no anonymous games of at least {window_frames} frames')
+
+    while repeat + 1 > 0:
+        sampled = 0
+        while sampled < epoch:
+
+            # label for player is 1, label for anonymous is 0
+            player_batch_size = rng.binomial(n = batch_size, p = 1 / (ratio + 1))
+            anonymous_batch_size = batch_size - player_batch_size
+            sampled += player_batch_size
+
+            player_istreams, _ = player_store.sample(player_streams, player_batch_size, window_frames, rng)
+            anonymous_istreams, _ = anonymous_store.sample(anonymous_streams, anonymous_batch_size, window_frames, rng)
+
+            # mix batches
+            batch_istreams = np.concatenate((player_istreams, anonymous_istreams))
+            batch_labels = np.concatenate((
+                np.ones(player_batch_size),
+                np.zeros(anonymous_batch_size),
+            ))
+            order = rng.permutation(batch_size)
+            batch_istreams = batch_istreams[order]
+            batch_labels = batch_labels[order]
+
+            if onehot:
+                batch_labels = one_hot(batch_labels.astype(np.int32), 2)
+
+            yield batch_istreams, batch_labels
+
+        repeat -= 1
+
+# ==============================
+#   length-bucketed full games
+# ==============================
+
+# padded lengths are rounded up to a multiple of this many frames
+BUCKET_GRANULARITY = 64
+
+def bucket_boundaries(lengths, n_buckets=8, granularity=BUCKET_GRANULARITY):
+    '''
+    Chooses the padded lengths of length buckets so that
+    padding every sequence to the boundary of its bucket
+    adds as few frames as possible (exactly, by dynamic
+    programming over the distinct rounded lengths).
+
+    Parameters
+    -----------
+    lengths (ndarray) : length of every sequence
+    n_buckets (int) : (maximum) number of buckets
+    granularity (int) : boundaries are multiples of this,
+                        so few distinct batch shapes are made
+
+    Outputs
+    -----------
+    boundaries (ndarray) : ascending padded length of every bucket,
+                           the last one fits the longest sequence
+    '''
+
+    lengths = np.asarray(lengths, dtype=np.int64)
+    rounded = -(-lengths // granularity) * granularity
+    values, counts = np.unique(rounded, return_counts=True)
+    n_buckets = min(n_buckets, len(values))
+
+    # cost of one bucket holding values[i..j]: frames padded up to values[j]
+    count_sums = np.concatenate([[0], np.cumsum(counts)])
+    length_sums = np.concatenate([[0], np.cumsum(np.bincount(np.searchsorted(values, rounded), lengths))])
+    def padding(i, j):
+        return values[j] * (count_sums[j + 1] - count_sums[i]) - (length_sums[j + 1] - length_sums[i])
+
+    # cost[b, j]: least padding of values[..j] in b + 1 buckets, start[b, j]: where its last bucket starts
+    m = len(values)
+    cost = np.full((n_buckets, m), np.inf)
+    start = np.zeros((n_buckets, m), dtype=np.int64)
+    cost[0] = padding(0, np.arange(m))
+    for b in range(1, n_buckets):
+        for j in range(b, m):
+            i = np.arange(b, j + 1)
+            candidates = cost[b - 1, i - 1] + padding(i, j)
+            best = np.argmin(candidates)
+            cost[b, j], start[b, j] = candidates[best], i[best]
+
+    # walk the last bucket starts back
+    boundaries = []
+    j = m - 1
+    for b in reversed(range(n_buckets)):
+        boundaries.append(values[j])
+        j = start[b, j] - 1
+        if j < 0:
+            break
+    return np.array(boundaries[::-1], dtype=np.int64)
+
+def bucket_batches(lengths, boundaries, batch_size=32, shuffle=True, rng=np.random):
+    '''
+    Groups sequences into batches of sequences from the same length bucket
+
+    Parameters
+    -----------
+    lengths (ndarray) : length of every sequence
+    boundaries (ndarray) : padded length of every bucket (see bucket_boundaries)
+    batch_size (int) : maximum number of sequences per batch
+    shuffle (bool) : whether to shuffle the sequences of every bucket, and the batches
+    rng (np.random.Generator) : random number generator
+
+    Outputs
+    -----------
+    batches (list) : (sequences, padded length) of every batch
+    '''
+
+    buckets = np.searchsorted(boundaries, lengths, side='left')
+    if (buckets >= len(boundaries)).any():
+        raise ValueError('a sequence is longer than the last bucket boundary')
+
+    batches = []
+    for bucket, boundary in enumerate(boundaries):
+        members = np.flatnonzero(buckets == bucket)
+        if shuffle:
+            members = rng.permutation(members)
+        for i in range(0, len(members), batch_size):
+            batches.append((members[i:i+batch_size], int(boundary)))
+
+    if shuffle:
+        batches = [batches[i] for i in rng.permutation(len(batches))]
+    return batches
+
+def character_games(
+        input_directory,
+        batch_size = 32,
+        repeat = False,
+        onehot = True,
+        shuffle = True,
+        max_frames = None,
+        min_frames = 1,
+        n_buckets = 8,
+        split = None,
+        test_size = TEST_SIZE,
+        clip_filter = None,
+        seed = None
+    ):
+    '''
+    Alternative to character_data that feeds whole games
+    (or segments of at most max_frames frames) from a game
+    store (see games.py) instead of fixed-length clips.
+
+    Games are grouped into length buckets (see bucket_boundaries)
+    and every batch is padded to the boundary of its bucket, for
+    base_model.masked_model, which ignores the padding. Every
+    game (segment) is in one batch per epoch.
+
+    Parameters
+    -----------
+    input_directory (string) : game store from which to fetch data
+    batch_size (int) : maximum number of games per batch
+    repeat (bool) : if true, generator loops back after an epoch, if false, generator stops after one
+    onehot (bool) : whether or not to return labels in onehot form
+    shuffle (bool) : whether or not to shuffle the games and batches every epoch
+    max_frames (int) : if given, longer games are cut into equal segments
+                       of at most this many frames, None for whole games
+    min_frames (int) : shorter games are left out (see base_model.min_frames)
+    n_buckets (int) : number of length buckets
+    split (string) : 'train' or 'test' to only use one side
+                     of the game-level split, None for every game
+    test_size (float) : fraction of games in the test split
+    clip_filter (dict) : if given, only use the matching players (see index.filter_terms)
+    seed (int) : seed of the shuffling
+
+    Outputs (yield)
+    -----------
+    batch_inputs (tuple) : (batch_istreams, batch_lengths) zero-padded
+                           (games, frames, 13) istreams and (games,) real lengths
+    batch_labels (array | ndarray)
+    '''
+
+    store = open_game_store(input_directory)
+    streams = store.streams(split, test_size, clip_filter)
+    segment_streams, starts, lengths = store.segments(streams, max_frames, min_frames)
+    if not len(lengths):
+        raise ValueError(f'no games of at least {min_frames} frames')
+
+    boundaries = bucket_boundaries(lengths, n_buckets)
+    rng = np.random.default_rng(seed)
+
+    while True:
+        for batch, frames in bucket_batches(lengths, boundaries, batch_size, shuffle, rng):
+            batch_streams = segment_streams[batch]
+            batch_istreams = store.gather(batch_streams, starts[batch], lengths[batch], frames)
+            batch_labels = [id_from_char[character] for character in store.games['character'][batch_streams]]
+
+            if onehot:
+                batch_labels = one_hot(batch_labels, 26)
+
+            yield (batch_istreams, lengths[batch].astype(np.int32)), batch_labels
+
+        if not repeat:
+            return
+
+# ==============================
+#   tf.data input pipelines
+# ==============================
+
+# number of clip files read concurrently by the tf.data pipelines
+READ_CYCLE_LENGTH = 16
+
+# number of clips gathered at once from a clip store
+STORE_READ_SIZE = 256
+
+def decode_clip(raw):
+    '''Unpickles a clip file's bytes into (istream, character_id)'''
+    clip = pickle.loads(raw)
+    istream = clip['istream'].toarray().astype(np.float32)
+    return istream, np.int32(id_from_char[clip['character']])
+
+def read_clips(input_directory, shuffle=True, repeat=False, clip_filter=None):
+    '''
+    Builds an (unbatched) tf.data.Dataset of every clip in input_directory
+
+    Pickled clips are read with parallel interleaved file reads
+    and decoded from sparse to dense inside the pipeline.
+    Clip stores are gathered STORE_READ_SIZE clips at a time.
+
+    Parameters
+    -----------
+    input_directory (string) : directory (of pickled clips or a clip store) from which to fetch data
+    shuffle (bool) : whether or not to shuffle data (reshuffled every pass)
+    repeat (bool | int) : if true loop over the data forever.
+                          if false make a single pass.
+                          if integer, repeat the given number of times
+    clip_filter (dict) : if given, only use the matching clips (see list_clips)
+
+    Outputs
+    -----------
+    dataset (tf.data.Dataset) : yields (istream, character_id)
+    '''
+
+    clips = list_clips(input_directory, clip_filter)
+    if not clips:
+        raise ValueError(f'no clips in {input_directory}')
+
+    if is_store(input_directory):
+        dataset = tf.data.Dataset.from_tensor_slices(np.array(clips, dtype=np.int64))
+    else:
+        dataset = tf.data.Dataset.from_tensor_slices([join(input_directory, f) for f in clips])
+
+    # shuffle filenames / store rows, not decoded clips,
+    # so the shuffle buffer can hold the whole dataset
+    if shuffle:
+        dataset = dataset.shuffle(len(clips), reshuffle_each_iteration=True)
+
+    if repeat is True:
+        dataset = dataset.repeat()
+    elif repeat:
+        dataset = dataset.repeat(repeat + 1)
+
+    if is_store(input_directory):
+        store = open_store(input_directory)
+
+        def gather(indices):
+            istreams = store.istreams(indices)
+            characters = store.metadata['character'][indices]
+            labels = np.array([id_from_char[c] for c in characters], dtype=np.int32)
+            return istreams, labels
+
+        dataset = dataset.batch(STORE_READ_SIZE)
+        dataset = dataset.map(
+            lambda indices: tf.numpy_function(gather, [indices], (tf.float32, tf.int32)),
+            num_parallel_calls = tf.data.AUTOTUNE,
+            deterministic = not shuffle,
+        )
+        dataset = dataset.unbatch()
+
+    else:
+        dataset = dataset.interleave(
+            lambda filepath: tf.data.Dataset.from_tensors(tf.io.read_file(filepath)),
+            cycle_length = READ_CYCLE_LENGTH,
+            num_parallel_calls = tf.data.AUTOTUNE,
+            deterministic = not shuffle,
+        )
+        dataset = dataset.map(
+            lambda raw: tf.numpy_function(decode_clip, [raw], (tf.float32, tf.int32)),
+            num_parallel_calls = tf.data.AUTOTUNE,
+            deterministic = not shuffle,
+        )
+
+    return dataset.map(lambda istream, label: (
+        tf.ensure_shape(istream, (None, 13)),
+        tf.ensure_shape(label, ()),
+    ))
+
+def character_dataset(
+        input_directory,
+        batch_size = 32,
+        num_batches = None,
+        repeat = False,
+        onehot = True,
+        shuffle = True,
+        clip_filter = None
+    ):
+    ''' 
+    tf.data version of character_data.
+
+    Reading and decoding run in parallel inside the pipeline
+    and batches are prefetched, so data loading overlaps with model.fit.
+
+    Parameters
+    -----------
+    input_directory (string) : directory (of pickled clips or a clip store) from which to fetch data
+    batch_size (int) : number of documents per batch
+    num_batches (int) : if given, stop after this many batches
+    repeat (bool) : if true, dataset loops back after exhausting data, if false, dataset stops when data runs out
+    onehot (bool) : whether or not to return labels in onehot form
+    shuffle (bool) : whether or not to shuffle data 
+    clip_filter (dict) : if given, only use the matching clips (see list_clips)
+    
+    Outputs
+    -----------
+    dataset (tf.data.Dataset) : yields (batch_istreams, batch_labels)
+    '''
+
+    dataset = read_clips(input_directory, shuffle=shuffle, repeat=repeat, clip_filter=clip_filter)
+    dataset = dataset.batch(batch_size)
+
+    if onehot:
+        dataset = dataset.map(
+            lambda istreams, labels: (istreams, tf.one_hot(labels, 26)),
+            num_parallel_calls = tf.data.AUTOTUNE,
+        )
+
+    if num_batches:
+        dataset = dataset.take(num_batches)
+
+    return dataset.prefetch(tf.data.AUTOTUNE)
+
+def player_dataset(
+        player_dir,
+        anonymous_dir,
+        batch_size = 32,
+        repeat = False,
+        shuffle = True,
+        ratio = 1,
+        onehot = False,
+        player_filter = None,
+        anonymous_filter = None,
+    ):
+    ''' 
+    tf.data version of player_data.
+
+    Player and anonymous clips are sampled so that on average
+    1 in (ratio + 1) clips comes from the player.
+    The dataset ends when the player's data runs out;
+    anonymous data loops for as long as it is needed.
+
+    Parameters
+    -----------
+    player_dir (string) : directory containing the player's data
+    anonymous_dir (string) : directory containing random data that is not the player's
+                             (either directory can hold pickled clips or a clip store)
+    batch_size (int) : number of documents per batch
+    repeat (bool | int) : if true dataset loops back after exhausting data.
+                          if false dataset stops when data runs out.
+                          if integer, repeat the given number of times
+    onehot (bool) : whether or not to return labels in onehot form
+    shuffle (bool) : whether or not to shuffle data 
+    ratio (int | float) : ratio of Anonymous games with given player's games (Anonymous / Player) 
+    player_filter (dict) : if given, only use the matching clips of player_dir (see list_clips)
+    anonymous_filter (dict) : if given, only use the matching clips of anonymous_dir
+    
+    Outputs
+    -----------
+    dataset (tf.data.Dataset) : yields (batch_istreams, batch_labels)
+    '''
+
+    if type(repeat) is int and repeat < 0:
+        raise ValueError
+    
+    if not ratio > 0:
+        raise ValueError
+
+    # label for player is 1, label for anonymous is 0
+    player = read_clips(player_dir, shuffle=shuffle, repeat=repeat, clip_filter=player_filter)
+    player = player.map(lambda istream, _: (istream, 1.0))
+
+    anonymous = read_clips(anonymous_dir, shuffle=shuffle, repeat=True, clip_filter=anonymous_filter)
+    anonymous = anonymous.map(lambda istream, _: (istream, 0.0))
+
+    dataset = tf.data.Dataset.sample_from_datasets(
+        [player, anonymous],
+        weights = [1 / (ratio + 1), ratio / (ratio + 1)],
+        stop_on_empty_dataset = True,
+    )
+    dataset = dataset.batch(batch_size)
+
+    if onehot:
+        dataset = dataset.map(
+            lambda istreams, labels: (istreams, tf.one_hot(tf.cast(labels, tf.int32), 2)),
+            num_parallel_calls = tf.data.AUTOTUNE,
+        )
+
+    return dataset.prefetch(tf.data.AUTOTUNE)
@@ -0,0 +1,272 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Python module for training SSBML-Transfer-Model
+heads on cached embeddings.
+
+With a frozen base, the headless base model maps every clip
+to the same 512-d embedding on every epoch. The embeddings are
+computed once, saved to disk, and the head is trained on them
+directly, without running the convolutions again.
+
+The cache is a directory of .npy parts:
+
+    {weights hash}/{clip directory hash}/part-{n}.npy       (clips, 512) float32 embeddings
+    {weights hash}/{clip directory hash}/part-{n}.keys.npy  (clips,) clip keys
+
+so embeddings are keyed by the backbone's weights and by clip.
+Clip ids can be reused (eg. when a directory is clippified again),
+so clips are keyed by their file instead (see clip_keys).
+New clips are embedded into new parts; old parts are never rewritten.
+'''
+
+import os
+import hashlib
+from os import path, listdir, makedirs
+
+import numpy as np
+
+from .data import list_clips, get_clips
+from .store import is_store, open_store, META_SUFFIX
+from .transfer import NAME, default_head, default_optimizer, default_loss, default_metrics
+from .transfer import remove_head, add_new_head
+
+PART_PREFIX = 'part-'
+KEYS_SUFFIX = '.keys.npy'
+
+# number of clips pushed through the backbone at once
+EMBED_BATCH_SIZE = 256
+
+def weights_hash(model):
+    '''Returns a hex sha1 digest of a model's weights'''
+    sha1 = hashlib.sha1()
+    for weight in model.get_weights():
+        sha1.update(str(weight.shape).encode())
+        sha1.update(np.ascontiguousarray(weight).tobytes())
+    return sha1.hexdigest()
+
+def clip_keys(input_directory, clips):
+    '''
+    Keys clips (as listed by data.list_clips) by the file they are in,
+    so a clip that is written again gets a new key
+
+    Returns
+    -----------
+    keys (ndarray) : '{filename}:{size}:{mtime}' of every pickled clip,
+                     '{shard}:{offset}:{mtime}' of every clip store row
+    '''
+
+    if is_store(input_directory):
+        store = open_store(input_directory)
+        shards = np.array([
+            f'{name}:{{}}:{os.stat(path.join(input_directory, name + META_SUFFIX)).st_mtime_ns}'
+            for name in store.names
+        ])
+        return np.array([
+            shards[store.shard[clip]].format(store.offset[clip])
+            for clip in clips
+        ], dtype=str)
+
+    keys = []
+    for f in clips:
+        info = os.stat(path.join(input_directory, f))
+        keys.append(f'{f}:{info.st_size}:{info.st_mtime_ns}')
+    return np.array(keys, dtype=str)
+
+class EmbeddingCache:
+    '''
+    On-disk cache of backbone embeddings of clips.
+    '''
+
+    def __init__(self, directory):
+        '''
+        Parameters
+        -----------
+        directory (string) : directory to keep the embeddings in
+        '''
+
+        self.directory = path.abspath(directory)
+        makedirs(self.directory, exist_ok=True)
+
+    def entry_directory(self, backbone, input_directory):
+        '''Returns the directory holding backbone's embeddings of the clips in input_directory'''
+        clips_hash = hashlib.sha1(path.abspath(input_directory).encode()).hexdigest()[:16]
+        return path.join(self.directory, weights_hash(backbone), clips_hash)
+
+    def load(self, entry):
+        '''
+        Opens the parts in an entry directory
+
+        Returns
+        -----------
+        keys (ndarray) : clip key of every cached embedding (see clip_keys)
+        embeddings (list) : memory-mapped (clips, 512) array of every part
+        '''
+
+        if not path.isdir(entry):
+            return np.zeros(0, dtype=str), []
+
+        names = sorted(
+            f[:-len(KEYS_SUFFIX)] for f in listdir(entry)
+            if f.startswith(PART_PREFIX) and f.endswith(KEYS_SUFFIX)
+        )
+        keys = [np.load(path.join(entry, name + KEYS_SUFFIX)) for name in names]
+        embeddings = [np.load(path.join(entry, name + '.npy'), mmap_mode='r') for name in names]
+        keys = np.concatenate(keys) if keys else np.zeros(0, dtype=str)
+        return keys, embeddings
+
+    def embed(
+            self,
+            backbone,
+            input_directory,
+            clip_filter = None,
+            batch_size = EMBED_BATCH_SIZE
+        ):
+        '''
+        Returns backbone's embeddings of the clips in input_directory,
+        computing (and caching) only the ones that are not cached yet.
+
+        Parameters
+        -----------
+        backbone (Sequential) : headless base model (see transfer.remove_head)
+        input_directory (string) : directory (of pickled clips or a clip store)
+        clip_filter (dict) : if given, only embed the matching clips (see data.list_clips)
+        batch_size (int) : number of clips pushed through the backbone at once
+
+        Outputs
+        -----------
+        embeddings (ndarray) : (clips, 512) float32 array,
+                               in data.list_clips order
+        '''
+
+        clips = list_clips(input_directory, clip_filter)
+        if not len(clips):
+            return np.empty((0, backbone.output_shape[-1]), dtype=np.float32)
+        keys = clip_keys(input_directory, clips)
+
+        entry = self.entry_directory(backbone, input_directory)
+        cached_keys, parts = self.load(entry)
+
+        # embed the clips that are not cached yet into a new part
+        missing = ~np.isin(keys, cached_keys)
+        if missing.any():
+            new_clips = [clip for clip, m in zip(clips, missing) if m]
+            new_embeddings = np.concatenate([
+                backbone(
+                    get_clips(new_clips[i:i+batch_size], input_directory)[0],
+                    training = False
+                ).numpy()
+                for i in range(0, len(new_clips), batch_size)
+            ]).astype(np.float32)
+
+            makedirs(entry, exist_ok=True)
+            name = path.join(entry, f'{PART_PREFIX}{len(parts):06d}')
+
+            # the keys file marks a part as complete, so it is written last
+            for array, final_path in ((new_embeddings, name + '.npy'), (keys[missing], name + KEYS_SUFFIX)):
+                tmp_path = final_path + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, array)
+                os.replace(tmp_path, final_path)
+
+            cached_keys, parts = self.load(entry)
+
+        # gather the requested clips from the memory-mapped parts
+        part = np.concatenate([np.full(len(p), i) for i, p in enumerate(parts)])
+        offset = np.concatenate([np.arange(len(p)) for p in parts])
+        rows = dict(zip(cached_keys.tolist(), range(len(cached_keys))))
+        rows = np.array([rows[key] for key in keys.tolist()], dtype=np.int64)
+
+        embeddings = np.empty((len(keys),) + parts[0].shape[1:], dtype=np.float32)
+        for p in np.unique(part[rows]):
+            mask = part[rows] == p
+            embeddings[mask] = parts[p][offset[rows][mask]]
+
+        return embeddings
+
+def train_head(
+        base_model,
+        player_dir,
+        anonymous_dir,
+        cache,
+        head = None,
+        name = NAME,
+        optimizer = None,
+        loss = None,
+        metrics = None,
+        ratio = 1,
+        epochs = 10,
+        batch_size = 32,
+        player_filter = None,
+        anonymous_filter = None,
+        **fit_kwargs
+    ):
+    '''
+    Trains a new head for base_model on cached embeddings,
+    and returns SSBML-Transfer-Model with the trained head.
+
+    Equivalent to training replace_head(base_model) (frozen base)
+    on player_data, except that dropout inside the base is not applied,
+    since every clip always gets the same cached embedding.
+
+    Parameters
+    -----------
+    base_model (Sequential) : trained SSBML-Base-Model
+    player_dir (string) : directory containing the player's data
+    anonymous_dir (string) : directory containing random data that is not the player's
+    cache (EmbeddingCache) : cache to read and write embeddings in
+    head (Sequential) : keras sequential model to act as new head
+                        (default: a new transfer.default_head())
+    name (string) : name of new model
+    optimizer : optimizer for the head (default: see transfer.py)
+    loss : loss function for the head (default: see transfer.py)
+    metrics : metrics for the head (default: see transfer.py)
+    ratio (int | float) : ratio of Anonymous clips with given player's clips (Anonymous / Player)
+    epochs (int) : number of epochs to train the head for
+    batch_size (int) : number of embeddings per batch
+    player_filter (dict) : if given, only use the matching clips of player_dir (see data.list_clips)
+    anonymous_filter (dict) : if given, only use the matching clips of anonymous_dir
+    fit_kwargs : passed on to head.fit
+
+    Outputs
+    -----------
+    model (Sequential) : full model (headless base_model + trained head)
+    history (History) : head's training history
+    '''
+
+    if not ratio > 0:
+        raise ValueError
+
+    head = default_head() if head is None else head
+    optimizer = default_optimizer() if optimizer is None else optimizer
+    loss = default_loss() if loss is None else loss
+    metrics = default_metrics() if metrics is None else metrics
+
+    backbone = remove_head(base_model)
+
+    player = cache.embed(backbone, player_dir, player_filter)
+    if not len(player):
+        raise ValueError(f'no player clips in {player_dir} (filter: {player_filter})')
+    anonymous = cache.embed(backbone, anonymous_dir, anonymous_filter)
+    if not len(anonymous):
+        raise ValueError(f'no anonymous clips in {anonymous_dir} (filter: {anonymous_filter})')
+
+    # sample anonymous clips to the requested ratio
+    n_anonymous = int(round(ratio * len(player)))
+    anonymous = anonymous[np.random.choice(
+        len(anonymous),
+        n_anonymous,
+        replace = n_anonymous > len(anonymous)
+    )]
+
+    # label for player is 1, label for anonymous is 0
+    x = np.concatenate([player, anonymous])
+    y = np.concatenate([np.ones(len(player)), np.zeros(len(anonymous))]).astype(np.float32)
+
+    head.compile(optimizer, loss, metrics)
+    history = head.fit(x, y, batch_size=batch_size, epochs=epochs, shuffle=True, **fit_kwargs)
+
+    model = add_new_head(backbone, head, name, optimizer, loss, metrics)
+    return model, history
@@ -0,0 +1,316 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Python module to export SSBML-Base-Model and
+SSBML-Transfer-Model for CPU inference.
+
+fold_model rebuilds a model as one flat Sequential with:
+
+    Dropout             removed (it does nothing at inference)
+    BatchNormalization  folded into the weights of a neighbouring
+                        Conv1D or Dense layer
+
+In the conv cells BatchNormalization comes after the activation,
+so it is folded forward into the inputs of the next Conv1D/Dense,
+through MaxPooling1D (when all of its scales are positive, as max
+pooling only commutes with increasing maps) and GlobalAveragePooling1D.
+In the dense cells it directly follows a linear Dense layer and is
+folded into that layer's outputs.
+
+export_tflite then converts the folded model to TFLite, as float32,
+float16 (weights) or int8 (weights and activations, calibrated on a
+sample of clips), and TFLiteModel runs the result with the same
+predict_on_batch interface as a keras model (see predict.py).
+'''
+
+from os import path, makedirs
+
+import numpy as np
+import tensorflow as tf
+from tensorflow import keras
+
+from .stream import flatten_layers, batch_norm
+
+# TFLite artifacts export can write
+QUANTIZATIONS = ('float32', 'float16', 'int8')
+
+# default number of clips to calibrate int8 models on
+CALIBRATION_CLIPS = 256
+
+def clone_layer(layer, weights=None):
+    '''Copy of a keras layer, with its own (or the given) weights'''
+    config = layer.get_config()
+    config.pop('batch_input_shape', None)
+    copy = type(layer).from_config(config)
+    return copy, layer.get_weights() if weights is None else weights
+
+def fold_model(model, window=30):
+    '''
+    Folds BatchNormalization into neighbouring layers and strips Dropout
+
+    Parameters
+    -----------
+    model (Sequential) : SSBML-Base-Model or SSBML-Transfer-Model
+    window (int or float) : clip length in seconds the model is built for
+
+    Returns
+    -----------
+    folded (Sequential) : flat model with the same outputs (up to float error)
+    '''
+
+    # (layer, weights) of the folded model
+    layers = []
+
+    # (scale, shift) of a BatchNormalization waiting to be
+    # folded into the inputs of the next Conv1D / Dense
+    pending = None
+
+    for layer in flatten_layers(model):
+
+        if isinstance(layer, keras.layers.Dropout):
+            continue
+
+        if isinstance(layer, keras.layers.BatchNormalization):
+            last = layers[-1][0] if layers else None
+            if (
+                pending is None
+                and isinstance(last, (keras.layers.Conv1D, keras.layers.Dense))
+                and last.activation is keras.activations.linear
+                and last.use_bias
+            ):
+                # linear layer right before: scale its outputs
+                scale, shift = batch_norm(layer)
+                kernel, bias = layers[-1][1]
+                layers[-1] = (last, [kernel * scale, bias * scale + shift])
+            else:
+                if pending is not None:
+                    layers.append(clone_layer(pending[2]))
+                pending = batch_norm(layer) + (layer,)
+            continue
+
+        if pending is not None:
+            scale, shift, bn = pending
+            folds_into = (
+                isinstance(layer, keras.layers.Dense)
+                or (isinstance(layer, keras.layers.Conv1D) and layer.padding == 'valid')
+            ) and layer.use_bias
+            passes = (
+                isinstance(layer, (keras.layers.GlobalAveragePooling1D, keras.layers.Flatten))
+                or (isinstance(layer, keras.layers.MaxPooling1D) and (scale > 0).all())
+            )
+
+            if folds_into:
+                # inputs x -> x * scale + shift, taken into the layer's weights.
+                # kernel is (inputs, outputs), or (size, inputs, outputs) for a Conv1D
+                kernel, bias = layer.get_weights()
+                shifted = np.tensordot(kernel, shift, axes=([-2], [0]))
+                bias = bias + shifted.reshape(-1, kernel.shape[-1]).sum(axis=0)
+                kernel = kernel * scale[:, None]
+                layers.append(clone_layer(layer, [kernel, bias]))
+                pending = None
+                continue
+
+            if not passes:
+                layers.append(clone_layer(bn))
+                pending = None
+
+        layers.append(clone_layer(layer))
+
+    if pending is not None:
+        layers.append(clone_layer(pending[2]))
+
+    folded = keras.Sequential(
+        [keras.Input(shape=(int(window * 60), 13))] + [layer for layer, _ in layers],
+        name = model.name
+    )
+    for layer, weights in layers:
+        layer.set_weights(weights)
+    return folded
+
+def calibration_clips(input_directory, n_clips=CALIBRATION_CLIPS, clip_filter=None, seed=0):
+    '''
+    Samples clips to calibrate int8 models on
+
+    Parameters
+    -----------
+    input_directory (string) : directory of pickled clips or a clip store
+    n_clips (int) : number of clips to sample, None for every clip
+    clip_filter (dict) : if given, only sample the matching clips (see data.list_clips)
+    seed (int) : seed of the sample
+
+    Returns
+    -----------
+    clips (ndarray) : (n_clips, frames, 13) float32 istreams
+    '''
+
+    from .data import list_clips, get_clips
+
+    clips = list_clips(input_directory, clip_filter)
+    rng = np.random.default_rng(seed)
+    sample = [clips[i] for i in rng.permutation(len(clips))[:n_clips]]
+    istreams, _ = get_clips(sample, input_directory)
+    return np.asarray(istreams, dtype=np.float32)
+
+def export_tflite(model, output_path, quantization='float32', calibration=None, window=30, fold=True):
+    '''
+    Converts a model to a TFLite flatbuffer
+
+    Parameters
+    -----------
+    model (Sequential) : SSBML-Base-Model or SSBML-Transfer-Model
+    output_path (string) : path of the .tflite file to write
+    quantization (string) : 'float32', 'float16' (float16 weights),
+                            or 'int8' (int8 weights and activations,
+                            float32 inputs and outputs)
+    calibration (ndarray) : (clips, frames, 13) clips to calibrate
+                            int8 activation ranges on (see calibration_clips)
+    window (int or float) : clip length in seconds the model is exported for
+    fold (bool) : whether to fold BatchNormalization and strip Dropout first
+
+    Returns
+    -----------
+    size (int) : bytes written
+    '''
+
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f'quantization must be one of {QUANTIZATIONS}')
+    if quantization == 'int8' and calibration is None:
+        raise ValueError('int8 quantization needs calibration clips')
+
+    if fold:
+        model = fold_model(model, window)
+
+    # fixed clip length, any batch size
+    frames = int(window * 60)
+    forward = tf.function(
+        lambda istreams: model(istreams, training=False),
+        input_signature = [tf.TensorSpec((None, frames, 13), tf.float32)]
+    )
+    converter = tf.lite.TFLiteConverter.from_concrete_functions(
+        [forward.get_concrete_function()], model
+    )
+
+    if quantization == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+
+    elif quantization == 'int8':
+        calibration = np.asarray(calibration, dtype=np.float32)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([clip[None]] for clip in calibration)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    flatbuffer = converter.convert()
+
+    makedirs(path.dirname(path.abspath(output_path)), exist_ok=True)
+    with open(output_path, 'wb') as f:
+        f.write(flatbuffer)
+    return len(flatbuffer)
+
+def export_models(models, output_directory, calibration=None, quantizations=('float16', 'int8'), window=30):
+    '''
+    Exports models in every requested quantization,
+    as {output_directory}/{model name}-{quantization}.tflite
+
+    Parameters
+    -----------
+    models (list) : keras models, eg. [base_model, replace_head(base_model)]
+    output_directory (string) : directory to write the artifacts into
+    calibration (ndarray) : clips to calibrate int8 models on
+    quantizations (tuple) : quantizations to export (see export_tflite)
+    window (int or float) : clip length in seconds the models are exported for
+
+    Returns
+    -----------
+    artifacts (dict) : (model name, quantization) -> path of the .tflite file
+    '''
+
+    artifacts = {}
+    for model in models:
+        for quantization in quantizations:
+            output_path = path.join(output_directory, f'{model.name}-{quantization}.tflite')
+            export_tflite(model, output_path, quantization, calibration, window)
+            artifacts[model.name, quantization] = output_path
+    return artifacts
+
+class TFLiteModel:
+    '''
+    Runs an exported .tflite model.
+
+    Has the predict_on_batch method of keras models, so it can
+    replace one in predict.predict_game / predict_directory.
+    '''
+
+    def __init__(self, model_path, num_threads=None):
+        '''
+        Parameters
+        -----------
+        model_path (string) : path of a .tflite file (see export_tflite)
+        num_threads (int) : number of CPU threads to run on (None for the default)
+        '''
+
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads)
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self.batch_size = None
+
+    def predict_on_batch(self, istreams):
+        '''
+        Parameters
+        -----------
+        istreams (ndarray) : (batch size, frames, 13) istreams
+
+        Returns
+        -----------
+        scores (ndarray) : model outputs
+        '''
+
+        istreams = np.asarray(istreams, dtype=np.float32)
+        if istreams.shape[0] != self.batch_size:
+            self.interpreter.resize_tensor_input(self.input['index'], istreams.shape)
+            self.interpreter.allocate_tensors()
+            self.batch_size = istreams.shape[0]
+
+        self.interpreter.set_tensor(self.input['index'], istreams)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output['index'])
+
+def parity(model, exported, clips, batch_size=32):
+    '''
+    Compares an exported model to the keras model it came from
+
+    Parameters
+    -----------
+    model : keras model
+    exported : exported model (eg. TFLiteModel, or a folded keras model)
+    clips (ndarray) : (clips, frames, 13) istreams to compare on
+
+    Returns
+    -----------
+    report (dict) : max and mean absolute output error, and the fraction
+                    of clips on which both models make the same prediction
+                    (same argmax, or same side of .5 for a single output)
+    '''
+
+    expected = []
+    actual = []
+    for i in range(0, len(clips), batch_size):
+        batch = np.asarray(clips[i:i + batch_size], dtype=np.float32)
+        expected.append(np.asarray(model.predict_on_batch(batch)))
+        actual.append(np.asarray(exported.predict_on_batch(batch)))
+    expected = np.concatenate(expected)
+    actual = np.concatenate(actual)
+
+    if expected.shape[-1] == 1:
+        agreement = np.mean((expected[:, 0] > .5) == (actual[:, 0] > .5))
+    else:
+        agreement = np.mean(expected.argmax(axis=-1) == actual.argmax(axis=-1))
+
+    error = np.abs(expected - actual)
+    return {
+        'max_abs_error': float(error.max()),
+        'mean_abs_error': float(error.mean()),
+        'agreement': float(agreement),
+    }
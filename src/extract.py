@@ -10,10 +10,42 @@ and store/return it as a python dictionary.
 
 from slippi import Game
 from slippi.parse import ParseError
-from scipy.sparse import lil_matrix, csr_matrix
+from slippi.event import Buttons
+from scipy.sparse import csr_matrix
 from os.path import basename
+from contextlib import nullcontext
+from collections import deque
+from itertools import count
+import os
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+import ctypes
 import numpy as np
 
+from .slp import Replay, MIN_GAME_FRAMES
+from .compact import CompactIstream, encode_analog, encode_buttons
+from .rle import rle_istream
+
+# decoders that extract can parse a replay with
+BACKENDS = ('slippi', 'raw')
+
+# bump whenever the output of extract changes,
+# so stale cached payloads are not reused (see cache.py)
+EXTRACTOR_VERSION = 1
+
+# physical button bitmasks, in istream column order (columns 6-12)
+BUTTON_MASKS = np.array([
+    Buttons.Physical.Y,
+    Buttons.Physical.X,
+    Buttons.Physical.B,
+    Buttons.Physical.A,
+    Buttons.Physical.L,
+    Buttons.Physical.R,
+    Buttons.Physical.Z,
+], dtype=np.uint16)
+
 
 class InvalidGameError(ValueError):
     '''
@@ -27,7 +59,7 @@ class GameTooShortError(ValueError):
     '''
     pass
 
-def get_istreams(game, as_sparse=True):
+def get_istreams(game, as_sparse=True, compact=False, run_length=False):
     ''' 
     Gets the controller input streams from a game
 
@@ -36,6 +68,10 @@ def get_istreams(game, as_sparse=True):
     game (slippi.Game) : game to get istreams from
     as_sparse (bool) : If true, return istream as a scipy csr matrix
                         otherwise return as numpy array
+    compact (bool) : If true, return istream as a compact.CompactIstream
+                     (overrides as_sparse)
+    run_length (bool) : If true, return istream as a rle.RunLengthIstream
+                        (overrides as_sparse and compact)
 
     Returns
     --------
@@ -44,73 +80,115 @@ def get_istreams(game, as_sparse=True):
                        Inactive ports return as None.
     '''
 
-    istreams = []
-
-    # loop over all 4 controller ports
-    for j in range(4):
+    n_frames = len(game.frames)
 
-        # using scipy.sparse.lil_matrix to be
-        # efficient incrementally filling in entries row by row
-        istream = lil_matrix((len(game.frames), 13))
+    # preallocated columns for every controller port
+    # analog: joystick x/y, cstick x/y, trigger l/r
+    # buttons: raw physical button bitmask
+    analog = np.zeros((4, n_frames, 6))
+    buttons = np.zeros((4, n_frames), dtype=np.uint16)
+    active = [True] * 4
 
-        # Rows: frames (time)
-        # Cols: buttons/joysticks
-
-        for i, frame in enumerate(game.frames):
+    # single pass over the frames, filling in all 4 ports at once
+    for i, frame in enumerate(game.frames):
+        for j in range(4):
 
             # if this port is empty (no controller plugged in)
+            if not active[j]:
+                continue
             if frame.ports[j] is None:
-                istream = None
-                break
-            
+                active[j] = False
+                continue
+
             port = frame.ports[j].leader.pre
 
             # for the analog inputs extract x and y pos
             # (l and r for the triggers)
-            istream[i, 0] = port.joystick.x
-            istream[i, 1] = port.joystick.y
-            istream[i, 2] = port.cstick.x
-            istream[i, 3] = port.cstick.y
-            istream[i, 4] = port.triggers.physical.l
-            istream[i, 5] = port.triggers.physical.r
-            
-            # for the digital inputs, fill in with 1
-            # if button is active (leave as 0 if not)
-            b = port.buttons
-            if b.Physical.Y in b.physical.pressed():
-                istream[i, 6] = 1
-            
-            if b.Physical.X in b.physical.pressed():
-                istream[i, 7] = 1
-            
-            if b.Physical.B in b.physical.pressed():
-                istream[i, 8] = 1
-            
-            if b.Physical.A in b.physical.pressed():
-                istream[i, 9] = 1
-            
-            if b.Physical.L in b.physical.pressed():
-                istream[i, 10] = 1
-            
-            if b.Physical.R in b.physical.pressed():
-                istream[i, 11] = 1
-            
-            if b.Physical.Z in b.physical.pressed():
-                istream[i, 12] = 1
-
-        else: # if port is inactive, this block will not run.
-            if as_sparse:
-                istream = csr_matrix(istream)
-            else:
-                istream = istream.toarray()
-            
-        istreams.append(istream)
-    
+            analog[j, i] = (
+                port.joystick.x,
+                port.joystick.y,
+                port.cstick.x,
+                port.cstick.y,
+                port.triggers.physical.l,
+                port.triggers.physical.r,
+            )
+            buttons[j, i] = port.buttons.physical
+
     # len(istreams) == 4
     # each element represents istream for 
     # one of the four controller ports (players 1-4)
     # empty ports give an 'istream' of None
-    return tuple(istreams)
+    return tuple(
+        build_istream(analog[j], buttons[j], as_sparse, compact, run_length) if active[j] else None
+        for j in range(4)
+    )
+
+def get_replay_istreams(replay, as_sparse=True, compact=False, run_length=False):
+    ''' 
+    Gets the controller input streams from a replay
+    decoded with the raw .slp decoder
+
+    Parameters
+    -----------
+    replay (slp.Replay) : replay to get istreams from
+    as_sparse (bool) : If true, return istream as a scipy csr matrix
+                        otherwise return as numpy array
+    compact (bool) : If true, return istream as a compact.CompactIstream
+                     (overrides as_sparse)
+    run_length (bool) : If true, return istream as a rle.RunLengthIstream
+                        (overrides as_sparse and compact)
+
+    Returns
+    --------
+    istreams (tuple) : 4-tuple representing the controller
+                       inputs from every controller port.
+                       Inactive ports return as None.
+    '''
+
+    return tuple(
+        build_istream(replay.analog[j], replay.buttons[j], as_sparse, compact, run_length)
+        if replay.active[j] else None
+        for j in range(4)
+    )
+
+def build_istream(analog, buttons, as_sparse=True, compact=False, run_length=False):
+    ''' 
+    Assembles the istream of one controller port
+    from its analog positions and button bitmasks
+
+    Parameters
+    -----------
+    analog (ndarray) : (frames, 6) joystick, cstick and trigger positions
+    buttons (ndarray) : (frames,) physical button bitmasks
+    as_sparse (bool) : If true, return istream as a scipy csr matrix
+                        otherwise return as numpy array
+    compact (bool) : If true, return istream as a compact.CompactIstream
+                     (overrides as_sparse)
+    run_length (bool) : If true, return istream as a rle.RunLengthIstream
+                        (overrides as_sparse and compact)
+
+    Returns
+    --------
+    istream (csr_matrix | ndarray | CompactIstream | RunLengthIstream) : (frames, 13) istream
+    '''
+
+    # for the digital inputs, decode the bitmask
+    # into one column per button (1 if pressed, 0 if not)
+    pressed = (buttons[:, None] & BUTTON_MASKS) != 0
+
+    if compact or run_length:
+        codes, table = encode_analog(analog)
+        istream = CompactIstream(codes, encode_buttons(pressed), table)
+        return rle_istream(istream) if run_length else istream
+
+    # Rows: frames (time)
+    # Cols: buttons/joysticks
+    istream = np.concatenate((analog, pressed), axis=1)
+
+    if as_sparse:
+        istream = csr_matrix(istream)
+
+    return istream
 
 def get_player_characters(game):
     ''' 
@@ -211,7 +289,7 @@ def get_id(f):
 
     return basename(f)
 
-def extract(f, as_sparse=True): 
+def extract(f, as_sparse=True, backend='slippi', compact=False, run_length=False, stats=None): 
     ''' 
     Extracts the istream payloads from a .slp file
 
@@ -220,6 +298,18 @@ def extract(f, as_sparse=True):
     f (string) : Full path to game replay file
     as_sparse (bool) : If true, return istream as a scipy csr matrix
                         otherwise return as numpy array
+    backend (string) : 'slippi' to parse the replay with slippi.Game,
+                       'raw' to decode only the inputs and player info
+                       straight from the .slp event stream (see slp.py)
+    compact (bool) : If true, return istream as a compact.CompactIstream,
+                     about 8x smaller than a float64 csr matrix
+                     (overrides as_sparse)
+    run_length (bool) : If true, return istream as a rle.RunLengthIstream,
+                        which only stores the frames where inputs change
+                        (overrides as_sparse and compact)
+    stats (GameStats) : if given, time spent parsing the replay and
+                        extracting the istreams is added to its
+                        'parse' and 'extract' stages (see stats.py)
 
     Returns
     -----------
@@ -229,39 +319,325 @@ def extract(f, as_sparse=True):
                                object that will be sent to mongodb in export.py
     '''
 
+    if backend not in BACKENDS:
+        raise ValueError(f'backend must be one of {BACKENDS}')
+
     # get game_id and game data using f (filename)
     game_id = get_id(f)
-    game = Game(f)
+    stage = stats.stage if stats is not None else lambda name: nullcontext()
+
+    with stage('parse'):
+        if backend == 'slippi':
+            game = Game(f)
+            n_frames = len(game.frames)
+        else:
+            game = Replay(f)
+            n_frames = game.n_frames
 
     # reject games less than a minute long
-    if len(game.frames)/3600 < 1:
+    if n_frames < MIN_GAME_FRAMES:
         raise GameTooShortError('Game is too short')
 
     # get outpt payload for each active controller port
-    try:
-        payload = [
-        {
-            'game_id': game_id,
-            'istream': istream,
-            'character': character,
-            'name': name,
-            'code': code,
-        } 
-        for istream, character, name, code
-            in zip(get_istreams(game, as_sparse=as_sparse), 
-                   get_player_characters(game),
-                   get_player_names(game),
-                   get_player_codes(game))
-            if character is not None
-        ]
-
-    # raise parsing errors
-    except ParseError:
-        raise
+    with stage('extract'):
+        try:
+            if backend == 'slippi':
+                players = zip(get_istreams(game, as_sparse=as_sparse, compact=compact, run_length=run_length), 
+                              get_player_characters(game),
+                              get_player_names(game),
+                              get_player_codes(game))
+            else:
+                players = zip(get_replay_istreams(game, as_sparse=as_sparse, compact=compact, run_length=run_length),
+                              game.characters,
+                              game.names,
+                              game.codes)
+
+            payload = [
+            {
+                'game_id': game_id,
+                'istream': istream,
+                'character': character,
+                'name': name,
+                'code': code,
+            } 
+            for istream, character, name, code in players
+                if character is not None
+            ]
+
+        # raise parsing errors
+        except ParseError:
+            raise
     
-    # if unexpected error, raise InvalidGameError
-    except:
-        raise InvalidGameError
+        # if unexpected error, raise InvalidGameError
+        except:
+            raise InvalidGameError
         
-    else:
-        return tuple(payload)
+        else:
+            return tuple(payload)
+
+
+# ==============================
+#   extracting many replays
+# ==============================
+
+# shared memory blocks of a replay are named {prefix}-{i}, with a prefix
+# the parent picks, so it can free the blocks of results it never received
+BLOCK_PREFIX = 'ssbml'
+block_prefixes = count()
+
+class SharedArray:
+    '''
+    Picklable handle of an array a worker process
+    copied into a shared memory block.
+    '''
+
+    def __init__(self, array, name):
+        '''Copies array into a new shared memory block of the given name (in the worker)'''
+        array = np.ascontiguousarray(array)
+        self.shape = array.shape
+        self.dtype = array.dtype.str
+
+        block = SharedMemory(name, create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, array.dtype, buffer=block.buf)[...] = array
+        self.name = block.name
+        block.close()
+
+    def open(self):
+        '''The array, mapped from the shared memory block without a copy (in the parent)'''
+        return np.asarray(SharedBlock(self))
+
+class SharedBlock:
+    '''
+    Owner of a mapped shared memory block, exposed as an array.
+
+    Arrays made from it (np.asarray) keep it alive, and the block is
+    unmapped once the last of them is freed. Its name is unlinked as
+    soon as it is mapped, so the memory is never leaked.
+    '''
+
+    def __init__(self, shared):
+        self.block = SharedMemory(name=shared.name)
+        self.block.unlink()
+
+        # holds the mapping until the block is closed
+        self.pointer = ctypes.c_char.from_buffer(self.block.buf)
+        self.__array_interface__ = {
+            'shape': shared.shape,
+            'typestr': shared.dtype,
+            'data': (ctypes.addressof(self.pointer), False),
+            'version': 3,
+        }
+
+    def __del__(self):
+        del self.pointer
+        self.block.close()
+
+def share_istream(istream, names):
+    '''
+    Moves a dense or csr istream into shared memory blocks named
+    by the names iterator, other istreams are small enough to pickle
+    '''
+    if isinstance(istream, np.ndarray):
+        return SharedArray(istream, next(names))
+    if isinstance(istream, csr_matrix):
+        return (
+            'csr', istream.shape,
+            SharedArray(istream.data, next(names)),
+            SharedArray(istream.indices, next(names)),
+            SharedArray(istream.indptr, next(names)),
+        )
+    return istream
+
+def unlink_blocks(prefix):
+    '''Frees the shared memory blocks of a replay whose result was lost (see extract_worker)'''
+    for i in count():
+        try:
+            block = SharedMemory(f'{prefix}-{i}')
+        except FileNotFoundError:
+            return
+        block.unlink()
+        block.close()
+
+def open_istream(istream):
+    '''Inverse of share_istream, in the parent process'''
+    if isinstance(istream, SharedArray):
+        return istream.open()
+    if isinstance(istream, tuple) and istream[0] == 'csr':
+        _, shape, data, indices, indptr = istream
+        return csr_matrix((data.open(), indices.open(), indptr.open()), shape=shape, copy=False)
+    return istream
+
+def extract_worker(f, prefix, kwargs):
+    '''
+    Extracts one replay in a worker process, returning (f, payload or the error).
+    If prefix is given, istreams are moved into shared memory blocks
+    named {prefix}-0, {prefix}-1, ... (see share_istream)
+    '''
+    try:
+        payload = extract(f, **kwargs)
+    except Exception as e:
+        return f, e
+
+    if prefix is not None:
+        names = (f'{prefix}-{i}' for i in count())
+        payload = tuple(dict(doc, istream=share_istream(doc['istream'], names)) for doc in payload)
+    return f, payload
+
+def open_payload(payload):
+    '''Maps the shared istreams of a worker's payload (see extract_worker)'''
+    if isinstance(payload, Exception):
+        return payload
+    return tuple(dict(doc, istream=open_istream(doc['istream'])) for doc in payload)
+
+def extract_many(
+        paths,
+        workers = 1,
+        as_sparse = True,
+        backend = 'slippi',
+        compact = False,
+        run_length = False,
+        ordered = False,
+        shared = True,
+        prefetch = 2
+    ):
+    '''
+    Extracts many replays with worker processes
+
+    Dense and csr istreams are handed back through shared memory
+    instead of being pickled: the worker copies them into shared
+    memory blocks, and the parent maps those without a copy.
+
+    Errors of a replay (GameTooShortError, ParseError, InvalidGameError,
+    or any other) are returned as its result instead of raised.
+    If a worker process dies, the pool is replaced, and every replay
+    that was in flight is retried in a process of its own. The replay
+    that kills its own process gets the BrokenProcessPool error as its
+    result, and the other replays are unaffected.
+
+    Parameters
+    -----------
+    paths (iterable) : full paths of the replay files
+    workers (int) : number of worker processes, 1 to extract in this process
+    as_sparse, backend, compact, run_length : see extract
+    ordered (bool) : if true, results come in the order of paths,
+                     otherwise in the order the workers finish them
+    shared (bool) : whether to hand dense and csr istreams back
+                    through shared memory (otherwise they are pickled)
+    prefetch (int) : replays queued per worker ahead of the results
+
+    Outputs (yield)
+    -----------
+    f (string) : path of the replay
+    payload (tuple of dicts | Exception) : see extract, or the error of the replay
+    '''
+
+    kwargs = {
+        'as_sparse': as_sparse,
+        'backend': backend,
+        'compact': compact,
+        'run_length': run_length,
+    }
+
+    if workers <= 1:
+        for f in paths:
+            yield extract_worker(f, None, kwargs)
+        return
+
+    # workers register the blocks they create with the parent's resource
+    # tracker, which forgets them again when the parent unlinks them
+    if shared:
+        resource_tracker.ensure_running()
+
+    paths = iter(paths)
+    queue = deque()
+    pool = [ProcessPoolExecutor(workers)]
+
+    def run(task):
+        '''Submits task, to the pool or (once it is suspected of killing a worker) to a process of its own'''
+        executor = ProcessPoolExecutor(1) if task.isolated else pool[0]
+        if shared:
+            task.prefix = f'{BLOCK_PREFIX}-{os.getpid()}-{next(block_prefixes)}'
+        task.future = executor.submit(extract_worker, task.f, task.prefix, kwargs)
+        if task.isolated:
+            executor.shutdown(wait=False)
+
+    def recover():
+        '''Replaces the broken pool, and retries every replay it lost in isolation'''
+        pool[0].shutdown(wait=True)
+        pool[0] = ProcessPoolExecutor(workers)
+        for task in queue:
+            if not task.isolated and task.broken():
+                task.free()
+                task.isolated = True
+                run(task)
+
+    def submit():
+        '''Tops the queue up to prefetch replays per worker'''
+        while len(queue) < workers * prefetch:
+            f = next(paths, None)
+            if f is None:
+                return
+            task = ExtractTask(f)
+            queue.append(task)
+            try:
+                run(task)
+            except BrokenProcessPool:
+                task.future = None
+                recover()
+
+    try:
+        submit()
+        while queue:
+            if ordered:
+                task = queue[0]
+                wait([task.future])
+            else:
+                done, _ = wait([task.future for task in queue], return_when=FIRST_COMPLETED)
+                task = next(task for task in queue if task.future in done)
+
+            # a worker died running this replay or another one
+            if task.broken() and not task.isolated:
+                recover()
+                continue
+
+            queue.remove(task)
+            try:
+                _, payload = task.future.result()
+            except Exception as e:
+                task.free()
+                payload = e
+
+            submit()
+            yield task.f, open_payload(payload)
+
+    finally:
+        pool[0].shutdown(wait=True, cancel_futures=True)
+
+        # free the blocks of results that were never handed out
+        for task in queue:
+            if task.future is None or task.future.cancel():
+                continue
+            if task.future.exception() is None:
+                open_payload(task.future.result()[1])
+            else:
+                task.free()
+
+class ExtractTask:
+    '''A replay extract_many has in flight'''
+
+    def __init__(self, f):
+        self.f = f
+        self.future = None
+        self.prefix = None
+        self.isolated = False
+
+    def free(self):
+        '''Frees the shared memory blocks of a result that was lost'''
+        if self.prefix is not None:
+            unlink_blocks(self.prefix)
+
+    def broken(self):
+        '''Returns true if the process pool broke before the replay was extracted'''
+        if self.future is None:
+            return True
+        return self.future.done() and isinstance(self.future.exception(), BrokenProcessPool)
@@ -0,0 +1,384 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Python module for the game store - an on-disk format
+that keeps every player's full-game istream, instead of
+clips cut at fixed offsets, so training windows can be
+sampled at random on the fly.
+
+A game store is a directory holding:
+
+    frames.u8     (total frames, 7) uint8 compact rows of every
+                  player stream, back to back (see compact.py)
+    games.npy     (streams,) table of where each stream starts,
+                  its length and its metadata
+    tables.npy    (tables, 6, 256) analog lookup tables of the
+                  few streams that do not use the default table
+    games.json    marks the directory as a game store
+
+frames.u8 is opened with np.memmap, so a batch of windows
+is one fancy-index gather over the rows it covers.
+
+Streams are split into train and test by game, so the
+windows of a game are never on both sides of the split.
+'''
+
+import os
+import json
+import hashlib
+from os import path, listdir, makedirs
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from slippi.parse import ParseError
+
+from .util import display_progress
+from .extract import extract, InvalidGameError, GameTooShortError
+from .slp import DECODER_ERRORS
+from .compact import ANALOG_COLUMNS, DEFAULT_TABLE, decode_codes
+from .index import filter_terms
+
+FRAMES_FILE = 'frames.u8'
+GAMES_FILE = 'games.npy'
+TABLES_FILE = 'tables.npy'
+
+# marks a directory as a game store
+GAME_STORE_FILE = 'games.json'
+GAME_STORE_VERSION = 1
+
+# compact row: 6 analog codes and a button bitfield
+ROW_BYTES = ANALOG_COLUMNS + 1
+
+# one row per player stream.
+# table is the stream's row of tables.npy, -1 for the default table
+GAMES = np.dtype([
+    ('offset', np.int64),
+    ('length', np.int64),
+    ('character', 'U16'),
+    ('code', 'U16'),
+    ('name', 'U32'),
+    ('game_id', 'U64'),
+    ('table', np.int32),
+])
+
+# default fraction of games held out for testing
+TEST_SIZE = .1
+
+# splits a game store can be sampled from
+SPLITS = ('train', 'test')
+
+# errors a replay is skipped for (with the raw decoder's own,
+# should any escape it, so one bad file never stops a write)
+GAME_ERRORS = (ParseError, InvalidGameError, GameTooShortError) + DECODER_ERRORS
+
+def is_game_store(directory):
+    '''Returns true if directory is a game store'''
+    return path.isfile(path.join(directory, GAME_STORE_FILE))
+
+def game_split(game_ids, test_size=TEST_SIZE):
+    '''
+    Assigns games to the train or test split
+
+    Games are assigned by a hash of their game_id, so
+    a game lands on the same side of the split every time,
+    however many games are added to the store around it.
+
+    Parameters
+    -----------
+    game_ids (array) : game_id of every stream
+    test_size (float) : fraction of games to put in the test split
+
+    Returns
+    -----------
+    test (ndarray) : bool, true for streams of test games
+    '''
+
+    buckets = np.array([
+        int(hashlib.sha1(game_id.encode()).hexdigest()[:8], 16) % 10000
+        for game_id in game_ids
+    ])
+    return buckets < test_size * 10000
+
+def load_compact(f, backend='raw'):
+    '''Extracts a replay's compact istreams, in a worker process'''
+    try:
+        return extract(f, backend=backend, compact=True)
+    except GAME_ERRORS as e:
+        return e
+
+def write_game_store(
+        input_directory,
+        output_directory,
+        backend = 'raw',
+        workers = 1,
+        max_games = None
+    ):
+    '''
+    Extracts every game of a directory of replays into a game store
+
+    Games already in the store (by game_id) are skipped,
+    so the store can be updated as replays are added.
+
+    Parameters
+    -----------
+    input_directory (string) : directory of .slp files
+    output_directory (string) : directory of the game store
+    backend (string) : replay parser to use (see extract.extract)
+    workers (int) : number of processes to parse replays with
+    max_games (int) : if given, stop after this many games
+
+    Returns
+    -----------
+    games (int) : number of games added to the store
+    failures (int) : number of replays that could not be used
+    '''
+
+    makedirs(output_directory, exist_ok=True)
+    frames_path = path.join(output_directory, FRAMES_FILE)
+    games_path = path.join(output_directory, GAMES_FILE)
+    tables_path = path.join(output_directory, TABLES_FILE)
+
+    games = [tuple(row) for row in np.load(games_path)] if path.isfile(games_path) else []
+    tables = list(np.load(tables_path)) if path.isfile(tables_path) else []
+    stored = {row[5] for row in games}
+
+    replays = sorted(
+        path.join(input_directory, f) for f in listdir(input_directory)
+        if path.splitext(f)[1] == '.slp' and f not in stored
+    )[:max_games]
+
+    # rows past the last stream of the table (left by an
+    # interrupted write) are never referenced, new rows go after them
+    offset = path.getsize(frames_path) // ROW_BYTES if path.isfile(frames_path) else 0
+
+    added = 0
+    failures = 0
+    executor = ProcessPoolExecutor(workers) if workers > 1 else None
+    try:
+        if executor is None:
+            players_of_replays = map(load_compact, replays, [backend] * len(replays))
+        else:
+            players_of_replays = executor.map(load_compact, replays, [backend] * len(replays))
+
+        with open(frames_path, 'ab') as frames:
+            for i, players in enumerate(players_of_replays):
+                display_progress(i + 1, len(replays))
+                if isinstance(players, Exception):
+                    failures += 1
+                    continue
+
+                for doc in players:
+                    istream = doc['istream']
+                    rows = np.concatenate((istream.analog, istream.buttons[:, None]), axis=1)
+                    frames.write(rows.tobytes())
+
+                    table = -1
+                    if istream.table is not DEFAULT_TABLE:
+                        table = len(tables)
+                        tables.append(istream.table)
+
+                    games.append((
+                        offset,
+                        len(rows),
+                        doc['character'] or '',
+                        doc['code'] or '',
+                        doc['name'] or '',
+                        doc['game_id'],
+                        table,
+                    ))
+                    offset += len(rows)
+                added += 1
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    # the table is written last (and replaced atomically),
+    # so it only ever points at rows that are on disk
+    if tables:
+        np.save(tables_path, np.stack(tables))
+    with open(games_path + '.tmp', 'wb') as f:
+        np.save(f, np.array(games, dtype=GAMES))
+    os.replace(games_path + '.tmp', games_path)
+
+    with open(path.join(output_directory, GAME_STORE_FILE), 'w') as f:
+        json.dump({'version': GAME_STORE_VERSION}, f)
+
+    open_game_store.cache_clear()
+    return added, failures
+
+class GameStore:
+    '''
+    Read side of a game store.
+
+    Windows are sampled uniformly over every window of
+    the chosen streams: a stream is picked with weight equal
+    to its number of windows, then a start frame within it.
+
+    Attributes
+    -----------
+    games (ndarray) : (streams,) GAMES table
+    frames (np.memmap) : (total frames, 7) compact rows
+    tables (ndarray) : (tables, 6, 256) non-default analog lookup tables
+    '''
+
+    def __init__(self, directory):
+        if not is_game_store(directory):
+            raise FileNotFoundError(f'{directory} is not a game store')
+
+        self.directory = directory
+        self.games = np.load(path.join(directory, GAMES_FILE))
+
+        frames_path = path.join(directory, FRAMES_FILE)
+        n_rows = path.getsize(frames_path) // ROW_BYTES
+        self.frames = np.memmap(frames_path, dtype=np.uint8, mode='r', shape=(n_rows, ROW_BYTES))
+
+        tables_path = path.join(directory, TABLES_FILE)
+        self.tables = np.load(tables_path) if path.isfile(tables_path) else np.empty((0,) + DEFAULT_TABLE.shape)
+
+    def __len__(self):
+        return len(self.games)
+
+    def streams(self, split=None, test_size=TEST_SIZE, clip_filter=None):
+        '''
+        Selects player streams
+
+        Parameters
+        -----------
+        split (string) : 'train' or 'test' for one side of the
+                         game-level split (see game_split), None for every game
+        test_size (float) : fraction of games in the test split
+        clip_filter (dict) : if given, only select the matching streams,
+                             eg. {'code': 'ABC#123'} (see index.filter_terms)
+
+        Returns
+        -----------
+        streams (ndarray) : rows of the selected streams in self.games
+        '''
+
+        selected = np.ones(len(self.games), dtype=bool)
+
+        if split is not None:
+            if split not in SPLITS:
+                raise ValueError(f'split must be one of {SPLITS}')
+            test = game_split(self.games['game_id'], test_size)
+            selected &= test if split == 'test' else ~test
+
+        for column, negate, values in filter_terms(clip_filter):
+            selected &= np.isin(self.games[column], values) != negate
+
+        return np.flatnonzero(selected)
+
+    def n_windows(self, streams, window_frames):
+        '''Number of distinct windows of window_frames frames in each stream'''
+        return np.maximum(self.games['length'][streams] - window_frames + 1, 0)
+
+    def sample(self, streams, batch_size, window_frames, rng=np.random, dtype=np.float32):
+        '''
+        Samples random windows of the given streams
+
+        Parameters
+        -----------
+        streams (ndarray) : rows of the streams to sample from (see streams)
+        batch_size (int) : number of windows
+        window_frames (int) : length of every window, in frames
+        rng (np.random.Generator) : random number generator
+        dtype : dtype of the istreams
+
+        Returns
+        -----------
+        batch_istreams (ndarray) : (batch_size, window_frames, 13) istreams
+        batch_streams (ndarray) : rows in self.games of the stream each window came from
+        '''
+
+        n_windows = self.n_windows(streams, window_frames)
+        total = n_windows.sum()
+        if not total:
+            raise ValueError(f'no streams of at least {window_frames} frames to sample from')
+
+        # stream weighted by its number of windows, then a start within it
+        chosen = rng.choice(len(streams), size=batch_size, p=n_windows / total)
+        starts = (rng.random(batch_size) * n_windows[chosen]).astype(np.int64)
+        batch_streams = streams[chosen]
+
+        # one gather of every row of every window
+        first_rows = self.games['offset'][batch_streams] + starts
+        rows = self.frames[first_rows[:, None] + np.arange(window_frames)]
+
+        table_ids = self.games['table'][batch_streams]
+        tables = [DEFAULT_TABLE if t < 0 else self.tables[t] for t in table_ids]
+        batch_istreams = decode_codes(rows[..., :ANALOG_COLUMNS], rows[..., ANALOG_COLUMNS], tables, dtype)
+        return batch_istreams, batch_streams
+
+    def segments(self, streams, max_frames=None, min_frames=1):
+        '''
+        Cuts streams into whole-game segments
+
+        Parameters
+        -----------
+        streams (ndarray) : rows of the streams to cut (see streams)
+        max_frames (int) : if given, streams longer than this are cut into
+                           the fewest equal segments of at most max_frames
+                           frames, None to keep every stream whole
+        min_frames (int) : streams shorter than this are left out
+
+        Returns
+        -----------
+        segment_streams (ndarray) : row in self.games of every segment's stream
+        starts (ndarray) : first frame of every segment in its stream
+        lengths (ndarray) : number of frames of every segment
+        '''
+
+        lengths = self.games['length'][streams]
+        keep = lengths >= min_frames
+        streams, lengths = streams[keep], lengths[keep]
+
+        pieces = np.ones(len(streams), dtype=np.int64)
+        if max_frames is not None:
+            pieces = -(-lengths // max_frames)
+
+        segment_streams = np.repeat(streams, pieces)
+        piece = np.arange(pieces.sum()) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+        size = np.repeat(-(-lengths // pieces), pieces)
+        starts = piece * size
+        lengths = np.minimum(size, np.repeat(lengths, pieces) - starts)
+        return segment_streams, starts, lengths
+
+    def gather(self, batch_streams, starts, lengths, frames=None, dtype=np.float32):
+        '''
+        Reads segments of streams into one zero-padded batch
+
+        Parameters
+        -----------
+        batch_streams (ndarray) : rows in self.games of the segments' streams
+        starts (ndarray) : first frame of every segment in its stream
+        lengths (ndarray) : number of frames of every segment
+        frames (int) : length to pad the batch to (default: the longest segment)
+        dtype : dtype of the istreams
+
+        Returns
+        -----------
+        batch_istreams (ndarray) : (segments, frames, 13) istreams,
+                                   zero after the end of every segment
+        '''
+
+        lengths = np.asarray(lengths, dtype=np.int64)
+        frames = int(lengths.max()) if frames is None else frames
+
+        # rows past the end of a segment repeat its last row, and are zeroed after decoding
+        first_rows = self.games['offset'][batch_streams] + starts
+        steps = np.minimum(np.arange(frames), lengths[:, None] - 1)
+        rows = self.frames[first_rows[:, None] + steps]
+
+        table_ids = self.games['table'][batch_streams]
+        tables = [DEFAULT_TABLE if t < 0 else self.tables[t] for t in table_ids]
+        batch_istreams = decode_codes(rows[..., :ANALOG_COLUMNS], rows[..., ANALOG_COLUMNS], tables, dtype)
+        batch_istreams[np.arange(frames) >= lengths[:, None]] = 0
+        return batch_istreams
+
+@lru_cache(maxsize=None)
+def open_game_store(directory):
+    '''Opens a game store, memoized so its table is only loaded once'''
+    return GameStore(directory)
@@ -0,0 +1,373 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Python module for identifying players by nearest
+neighbours of their clips' backbone embeddings.
+
+Instead of training a head per player (see transfer.py),
+PlayerIndex keeps the embeddings of known players' clips,
+made by the headless base model (transfer.remove_head) and
+labelled by the clips' connect codes, and answers "who is this?"
+with a cosine similarity search:
+
+    by='centroid'   against the mean embedding of every player
+                    (one vector per player, so small and fast)
+    by='clip'       against every clip, scoring each player
+                    by their most similar clip
+
+Clip directories are added incrementally: clips already in the
+index are skipped, so a directory can be re-added whenever new
+replays are clippified into it. Offline players (no code) are left out.
+'''
+
+from os import path
+
+import numpy as np
+
+from .data import list_clips, get_clips
+from .index import open_index
+from .store import is_store, open_store
+from .embeddings import clip_keys, weights_hash, EMBED_BATCH_SIZE
+from .transfer import remove_head
+
+# number of gallery clips compared with the queries at once
+SEARCH_CHUNK = 65536
+
+def normalize(embeddings):
+    '''Scales embeddings to unit length (for cosine similarity)'''
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+def top_k(similarities, k):
+    '''Returns the (columns, values) of the k largest values of every row, largest first'''
+    k = min(k, similarities.shape[1])
+    columns = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    values = np.take_along_axis(similarities, columns, axis=1)
+    order = np.argsort(-values, axis=1)
+    return np.take_along_axis(columns, order, axis=1), np.take_along_axis(values, order, axis=1)
+
+def clip_codes(input_directory, clips, clip_filter=None):
+    '''Player codes of clips (as listed by data.list_clips with clip_filter), '' for offline players'''
+    if is_store(input_directory):
+        return open_store(input_directory).metadata['code'][clips].tolist()
+    with open_index(input_directory) as index:
+        code_of = dict(index.select(clip_filter, columns=('path', 'code')))
+    return [code_of.get(f, '') for f in clips]
+
+class PlayerIndex:
+    '''
+    Nearest neighbour index of players' clip embeddings.
+
+    Usage:
+
+        index = PlayerIndex(base_model)
+        index.add_directory('clips/')                  # again as new clips arrive
+        index.identify(istreams, k=5)                  # [[(code, similarity), ...], ...]
+        index.save('players.npz')
+        index = PlayerIndex.load('players.npz', base_model)
+    '''
+
+    def __init__(self, base_model, cache=None, dtype=np.float16):
+        '''
+        Parameters
+        -----------
+        base_model (Sequential) : base model to embed clips with (with or without its head)
+        cache (EmbeddingCache) : if given, clips are embedded through this cache
+                                 (see embeddings.py), so clips already embedded
+                                 for training heads are not embedded again
+        dtype (type) : type the clip embeddings are kept in
+                       (float16 halves the memory of a large gallery)
+        '''
+
+        self.backbone = remove_head(base_model)
+        self.backbone_hash = weights_hash(self.backbone)
+        self.cache = cache
+        self.dtype = dtype
+
+        # players: code, summed embeddings and number of clips
+        self.codes = []
+        self.rows = {}
+        self.sums = None
+        self.counts = np.zeros(0, dtype=np.int64)
+
+        # clips: unit embeddings and player row, in chunks as they were added
+        self.chunks = []
+        self.labels = []
+
+        # (directory, clip key) of every clip added from a directory (see embeddings.clip_keys)
+        self.keys = set()
+
+        # gallery sorted by player and centroids, rebuilt when clips are added
+        self._gallery = None
+        self._centroids = None
+
+    def __len__(self):
+        '''Number of clips in the index'''
+        return int(self.counts.sum())
+
+    @property
+    def n_players(self):
+        return len(self.codes)
+
+    @property
+    def centroids(self):
+        '''(players, features) unit mean embedding of every player'''
+        if self._centroids is None:
+            self._centroids = normalize(self.sums / self.counts[:, None])
+        return self._centroids
+
+    def embed(self, istreams, batch_size=EMBED_BATCH_SIZE):
+        '''
+        Parameters
+        -----------
+        istreams (ndarray) : (clips, frames, 13) istreams
+
+        Returns
+        -----------
+        embeddings (ndarray) : (clips, features) unit backbone embeddings
+        '''
+
+        istreams = np.asarray(istreams, dtype=np.float32)
+        return normalize(np.concatenate([
+            self.backbone.predict_on_batch(istreams[i:i+batch_size])
+            for i in range(0, len(istreams), batch_size)
+        ]))
+
+    def add(self, embeddings, codes):
+        '''
+        Adds labelled embeddings
+
+        Parameters
+        -----------
+        embeddings (ndarray) : (clips, features) backbone embeddings
+        codes (list) : connect code of every clip ('' or None to skip a clip)
+
+        Returns
+        -----------
+        added (int) : number of clips added
+        '''
+
+        codes = ['' if code is None else str(code) for code in codes]
+        keep = np.array([code != '' for code in codes], dtype=bool)
+        if not keep.any():
+            return 0
+        embeddings = normalize(embeddings)[keep]
+        codes = [code for code, k in zip(codes, keep) if k]
+
+        for code in codes:
+            if code not in self.rows:
+                self.rows[code] = len(self.codes)
+                self.codes.append(code)
+
+        n_players = len(self.codes)
+        if self.sums is None:
+            self.sums = np.zeros((0, embeddings.shape[1]), dtype=np.float64)
+        elif embeddings.shape[1] != self.sums.shape[1]:
+            raise ValueError(f'embeddings have {embeddings.shape[1]} features, the index has {self.sums.shape[1]}')
+        if n_players > len(self.sums):
+            grow = n_players - len(self.sums)
+            self.sums = np.concatenate([self.sums, np.zeros((grow, self.sums.shape[1]))])
+            self.counts = np.concatenate([self.counts, np.zeros(grow, dtype=np.int64)])
+
+        labels = np.array([self.rows[code] for code in codes], dtype=np.int64)
+        order = np.argsort(labels, kind='stable')
+        players, starts = np.unique(labels[order], return_index=True)
+        self.sums[players] += np.add.reduceat(embeddings[order], starts, axis=0)
+        self.counts += np.bincount(labels, minlength=n_players)
+
+        self.chunks.append(embeddings.astype(self.dtype))
+        self.labels.append(labels)
+        self._gallery = self._centroids = None
+        return len(codes)
+
+    def add_directory(self, input_directory, clip_filter=None, batch_size=EMBED_BATCH_SIZE):
+        '''
+        Adds the clips of a clip directory that are not in the index yet
+
+        Parameters
+        -----------
+        input_directory (string) : directory of pickled clips or a clip store
+        clip_filter (dict) : if given, only add the matching clips (see data.list_clips)
+        batch_size (int) : number of clips pushed through the backbone at once
+
+        Returns
+        -----------
+        added (int) : number of clips added
+        '''
+
+        clips = list_clips(input_directory, clip_filter)
+        if not len(clips):
+            return 0
+        codes = clip_codes(input_directory, clips, clip_filter)
+
+        directory = path.abspath(input_directory)
+        keys = [(directory, key) for key in clip_keys(input_directory, clips).tolist()]
+        new = np.array([key not in self.keys and code != '' for key, code in zip(keys, codes)], dtype=bool)
+        if not new.any():
+            return 0
+
+        if self.cache is not None:
+            embeddings = self.cache.embed(self.backbone, input_directory, clip_filter, batch_size)[new]
+        else:
+            new_clips = [clip for clip, n in zip(clips, new) if n]
+            embeddings = np.concatenate([
+                self.backbone.predict_on_batch(get_clips(new_clips[i:i+batch_size], input_directory)[0])
+                for i in range(0, len(new_clips), batch_size)
+            ])
+
+        added = self.add(embeddings, [code for code, n in zip(codes, new) if n])
+        self.keys.update(key for key, n in zip(keys, new) if n)
+        return added
+
+    @property
+    def n_features(self):
+        '''Length of the embeddings (of the backbone's, until some are added)'''
+        if self.sums is not None:
+            return self.sums.shape[1]
+        return self.backbone.output_shape[-1]
+
+    def gallery(self):
+        '''
+        Clip embeddings sorted by player
+
+        Returns
+        -----------
+        vectors (ndarray) : (clips, features) unit embeddings
+        starts (ndarray) : (players,) first row of every player's clips
+        '''
+
+        if not self.chunks:
+            return np.empty((0, self.n_features), dtype=self.dtype), np.zeros(0, dtype=np.int64)
+
+        if self._gallery is None:
+            vectors = np.concatenate(self.chunks)
+            labels = np.concatenate(self.labels)
+            order = np.argsort(labels, kind='stable')
+            starts = np.concatenate([[0], np.cumsum(self.counts)[:-1]])
+            self.chunks, self.labels = [vectors[order]], [labels[order]]
+            self._gallery = self.chunks[0], starts
+        return self._gallery
+
+    def similarities(self, embeddings, by='centroid'):
+        '''
+        Parameters
+        -----------
+        embeddings (ndarray) : (queries, features) backbone embeddings
+        by (string) : 'centroid' to compare with every player's mean embedding,
+                      'clip' to compare with every clip and keep each player's best
+
+        Returns
+        -----------
+        similarities (ndarray) : (queries, players) cosine similarities
+        '''
+
+        if not self.codes:
+            raise ValueError('the index is empty')
+        queries = normalize(embeddings)
+
+        if by == 'centroid':
+            return queries @ self.centroids.T
+
+        if by == 'clip':
+            vectors, starts = self.gallery()
+            best = np.full((len(queries), self.n_players), -np.inf, dtype=np.float32)
+            for i in range(0, len(vectors), SEARCH_CHUNK):
+                chunk = queries @ vectors[i:i+SEARCH_CHUNK].T.astype(np.float32)
+
+                # players with clips in this chunk, and where their clips start in it
+                first = np.searchsorted(starts, i, side='right') - 1
+                last = np.searchsorted(starts, i + chunk.shape[1], side='left')
+                bounds = np.clip(starts[first:last], i, None) - i
+                best[:, first:last] = np.maximum(
+                    best[:, first:last],
+                    np.maximum.reduceat(chunk, bounds, axis=1)
+                )
+            return best
+
+        raise ValueError("by must be 'centroid' or 'clip'")
+
+    def search(self, embeddings, k=5, by='centroid'):
+        '''
+        Finds the k most similar players to every embedding
+
+        Returns
+        -----------
+        codes (ndarray) : (queries, k) player codes, most similar first
+        similarities (ndarray) : (queries, k) cosine similarities
+        '''
+
+        columns, values = top_k(self.similarities(embeddings, by), k)
+        return np.array(self.codes, dtype=object)[columns], values
+
+    def identify(self, istreams, k=5, by='centroid', combine=False):
+        '''
+        Answers "who is this?" for clips
+
+        Parameters
+        -----------
+        istreams (ndarray) : (clips, frames, 13) istreams
+        k (int) : number of candidates to return
+        by (string) : 'centroid' or 'clip' (see similarities)
+        combine (bool) : if true, the clips are of one player (eg. one game),
+                         and are identified together by their mean embedding
+
+        Returns
+        -----------
+        candidates (list) : [(code, similarity), ...] for every clip
+                            (one list if combine), most similar first
+        '''
+
+        embeddings = self.embed(istreams)
+        if combine:
+            embeddings = embeddings.mean(axis=0, keepdims=True)
+
+        codes, values = self.search(embeddings, k, by)
+        candidates = [list(zip(row, map(float, scores))) for row, scores in zip(codes, values)]
+        return candidates[0] if combine else candidates
+
+    def save(self, filepath):
+        '''Saves the index to a .npz file'''
+        vectors, _ = self.gallery()
+        keys = sorted(self.keys)
+        np.savez(
+            filepath,
+            backbone_hash = self.backbone_hash,
+            codes = np.array(self.codes, dtype=str),
+            sums = self.sums if self.sums is not None else np.zeros((0, self.n_features)),
+            counts = self.counts,
+            vectors = vectors,
+            labels = self.labels[0] if self.labels else np.zeros(0, dtype=np.int64),
+            key_directories = np.array([directory for directory, _ in keys], dtype=str),
+            key_clips = np.array([clip for _, clip in keys], dtype=str),
+        )
+
+    @classmethod
+    def load(cls, filepath, base_model, cache=None):
+        '''
+        Loads an index saved with save
+
+        Parameters
+        -----------
+        filepath (string) : path of the .npz file
+        base_model (Sequential) : the base model the index was built with
+        cache (EmbeddingCache) : see PlayerIndex
+        '''
+
+        with np.load(filepath) as saved:
+            vectors = saved['vectors']
+            index = cls(base_model, cache, vectors.dtype.type)
+            if str(saved['backbone_hash']) != index.backbone_hash:
+                raise ValueError(f'{filepath} was built with a different base model')
+
+            index.codes = saved['codes'].tolist()
+            index.rows = {code: row for row, code in enumerate(index.codes)}
+            index.sums = saved['sums']
+            index.counts = saved['counts']
+            if len(vectors):
+                index.chunks = [vectors]
+                index.labels = [saved['labels']]
+            index.keys = set(zip(saved['key_directories'].tolist(), saved['key_clips'].tolist()))
+        return index
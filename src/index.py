@@ -0,0 +1,408 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Python module for the clip index - a small SQLite
+database kept next to the clips (index.sqlite) with
+one row per clip:
+{
+    clip_id,
+    path,           (pickled clips)
+    shard,          (clip stores)
+    shard_offset,   (clip stores)
+    character,
+    code,
+    name,
+    game_id,
+    length,
+}
+clippify adds rows as it writes clips, so the loaders
+can list and filter clips ("all FOX clips", "every code
+but ABC#123") with one query instead of listing and
+unpickling a directory.
+
+Rows are keyed on where the clip is (its path, or its
+shard and offset), since separate runs into the same
+directory can reuse clip ids. Clips added or removed by
+anything other than clippify are picked up when the index
+is next opened: the index remembers the modification time
+of its directory, and is reconciled with the directory
+listing whenever that changes (see open_index).
+'''
+
+import time
+import pickle
+import sqlite3
+from os import path, listdir, stat
+
+from .store import ClipStore, is_store
+
+INDEX_FILE = 'index.sqlite'
+
+# bump whenever SCHEMA changes, older indexes are rebuilt
+INDEX_VERSION = 2
+
+# a directory modification time is only trusted once it is
+# this old, so changes within the resolution of coarse
+# filesystem timestamps are not missed
+MTIME_RESOLUTION = 2 * 10**9 # nanoseconds
+
+COLUMNS = (
+    'clip_id',
+    'path',
+    'shard',
+    'shard_offset',
+    'character',
+    'code',
+    'name',
+    'game_id',
+    'length',
+)
+
+# columns clips can be filtered on (see filter_terms)
+FILTER_COLUMNS = ('character', 'code', 'name', 'game_id', 'length')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS clips (
+    clip_id INTEGER NOT NULL,
+    path TEXT UNIQUE,
+    shard TEXT,
+    shard_offset INTEGER,
+    character TEXT NOT NULL,
+    code TEXT NOT NULL,
+    name TEXT NOT NULL,
+    game_id TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    UNIQUE (shard, shard_offset)
+);
+CREATE INDEX IF NOT EXISTS clips_clip_id ON clips (clip_id);
+CREATE INDEX IF NOT EXISTS clips_character ON clips (character);
+CREATE INDEX IF NOT EXISTS clips_code ON clips (code);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value
+);
+'''
+
+def directory_mtime(directory):
+    '''Modification time of directory in nanoseconds (changes when files are added or removed)'''
+    return stat(directory).st_mtime_ns
+
+def has_index(directory):
+    '''Returns true if directory has a clip index'''
+    return path.isfile(path.join(directory, INDEX_FILE))
+
+def index_row(clip_payload, clip_path=None, shard=None, shard_offset=None):
+    '''
+    Builds the index row of a clip
+
+    Parameters
+    -----------
+    clip_payload (dict) : clip, as made by clippify_game
+    clip_path (string) : filename of a pickled clip
+    shard (string) : name of the clip store shard holding the clip
+    shard_offset (int) : row of the clip within its shard
+
+    Returns
+    -----------
+    row (tuple) : values for each of COLUMNS.
+                  missing values (such as the code of an offline player) are ''
+    '''
+
+    return (
+        int(clip_payload['clip_id']),
+        clip_path,
+        shard,
+        shard_offset,
+        clip_payload['character'] or '',
+        clip_payload['code'] or '',
+        clip_payload['name'] or '',
+        clip_payload['game_id'] or '',
+        int(clip_payload['istream'].shape[0]),
+    )
+
+def filter_terms(clip_filter):
+    '''
+    Parses a clip filter
+
+    A clip filter is a dict of column -> value, and a clip
+    matches when it matches every entry. Values can be:
+        a single value    -> column equals value
+        a list/tuple/set  -> column is one of the values
+    Prefixing a column with 'not_' negates the test, eg.
+
+        {'character': 'FOX'}                       all Fox clips
+        {'code': 'ABC#123'}                        all of ABC#123's clips
+        {'not_code': 'ABC#123'}                    everyone else's clips
+        {'character': ['FOX', 'FALCO'], 'not_code': ''}
+
+    None matches missing values, same as ''.
+
+    Returns
+    -----------
+    terms (list) : (column, negate, values) of every entry
+    '''
+
+    terms = []
+    for key, value in (clip_filter or {}).items():
+        negate = key.startswith('not_')
+        column = key[len('not_'):] if negate else key
+        if column not in FILTER_COLUMNS:
+            raise ValueError(f'can not filter clips on {key}, columns are {FILTER_COLUMNS}')
+
+        values = list(value) if isinstance(value, (list, tuple, set, frozenset)) else [value]
+        if not values:
+            raise ValueError(f'empty list of values for {key}')
+        terms.append((column, negate, ['' if v is None else v for v in values]))
+
+    return terms
+
+def where_clause(clip_filter):
+    '''
+    Turns a clip filter (see filter_terms) into an SQL WHERE clause
+
+    Returns
+    -----------
+    clause (string) : SQL, starting with ' WHERE' (or '' for no filter)
+    params (list) : query parameters for the clause
+    '''
+
+    conditions = []
+    params = []
+    for column, negate, values in filter_terms(clip_filter):
+        if len(values) == 1:
+            operator = '!=' if negate else '='
+            conditions.append(f'{column} {operator} ?')
+        else:
+            operator = 'NOT IN' if negate else 'IN'
+            conditions.append(f'{column} {operator} ({", ".join("?" * len(values))})')
+        params += values
+
+    if not conditions:
+        return '', []
+    return ' WHERE ' + ' AND '.join(conditions), params
+
+class ClipIndex:
+    '''
+    The clip index of one directory of clips
+    (a directory of pickled clips or a clip store).
+    '''
+
+    def __init__(self, directory):
+        '''
+        Parameters
+        -----------
+        directory (string) : directory holding the clips
+        '''
+
+        self.directory = directory
+        self.connection = sqlite3.connect(path.join(directory, INDEX_FILE))
+
+        # keep the journal file between transactions, so committing
+        # does not change the modification time of the directory
+        self.connection.execute('PRAGMA journal_mode = PERSIST')
+
+        (version,) = self.connection.execute('PRAGMA user_version').fetchone()
+        if version != INDEX_VERSION:
+            self.connection.executescript('DROP TABLE IF EXISTS clips; DROP TABLE IF EXISTS state;')
+        self.connection.executescript(SCHEMA)
+        self.connection.execute(f'PRAGMA user_version = {INDEX_VERSION}')
+        self.connection.commit()
+
+    def add(self, row):
+        '''Adds the row of a clip (replacing the row of the clip at the same location), see index_row'''
+        self.connection.execute(
+            f'INSERT OR REPLACE INTO clips VALUES ({", ".join("?" * len(COLUMNS))})',
+            row
+        )
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM clips').fetchone()[0]
+
+    def select(self, clip_filter=None, columns=('path', 'shard', 'shard_offset')):
+        '''
+        Looks up the clips matching clip_filter (see filter_terms)
+
+        Returns
+        -----------
+        rows (list) : tuples of the given columns, in clip_id order
+                      (then in order of location)
+        '''
+
+        for column in columns:
+            if column not in COLUMNS:
+                raise ValueError(f'unknown column {column}')
+
+        clause, params = where_clause(clip_filter)
+        query = f'SELECT {", ".join(columns)} FROM clips{clause} ORDER BY clip_id, path, shard, shard_offset'
+        return self.connection.execute(query, params).fetchall()
+
+    def update(self):
+        '''
+        Brings the index up to date with the clips in its directory.
+
+        Pickled clips and clip store shards that are not in the index
+        yet are added (pickled clips have to be unpickled for this),
+        and rows of clips that no longer exist are removed.
+        Then the modification time of the directory is recorded,
+        unless it changed while updating (see is_current).
+        '''
+
+        mtime = directory_mtime(self.directory)
+
+        # pickled clips
+        indexed = {
+            clip_path for (clip_path,)
+            in self.connection.execute('SELECT path FROM clips WHERE path IS NOT NULL')
+        }
+        on_disk = {f for f in listdir(self.directory) if path.splitext(f)[1] == '.pkl'}
+
+        self.connection.executemany(
+            'DELETE FROM clips WHERE path = ?',
+            [(f,) for f in indexed - on_disk]
+        )
+        for f in sorted(on_disk - indexed):
+            try:
+                with open(path.join(self.directory, f), 'rb') as clip_file:
+                    clip_payload = pickle.load(clip_file)
+            except (EOFError, pickle.UnpicklingError):
+                continue
+            self.add(index_row(clip_payload, clip_path=f))
+
+        # clip store shards
+        indexed = {
+            shard for (shard,)
+            in self.connection.execute('SELECT DISTINCT shard FROM clips WHERE shard IS NOT NULL')
+        }
+        if is_store(self.directory):
+            store = ClipStore(self.directory)
+            on_disk = set(store.names)
+            for s, name in enumerate(store.names):
+                if name in indexed:
+                    continue
+                for row in (store.shard == s).nonzero()[0]:
+                    clip = store.metadata[row]
+                    self.add((
+                        int(clip['clip_id']), None, name, int(store.offset[row]),
+                        str(clip['character']), str(clip['code']),
+                        str(clip['name']), str(clip['game_id']), store.shape[0],
+                    ))
+        else:
+            on_disk = set()
+
+        self.connection.executemany(
+            'DELETE FROM clips WHERE shard = ?',
+            [(name,) for name in indexed - on_disk]
+        )
+
+        self.commit()
+
+        # (the first commit can create the journal file)
+        if directory_mtime(self.directory) == mtime and time.time_ns() - mtime > MTIME_RESOLUTION:
+            self.connection.execute("INSERT OR REPLACE INTO state VALUES ('mtime', ?)", (mtime,))
+            self.commit()
+
+    def is_current(self):
+        '''
+        Returns true if the directory is unchanged since the index
+        was last brought up to date with it (see update)
+        '''
+
+        row = self.connection.execute("SELECT value FROM state WHERE key = 'mtime'").fetchone()
+        return row is not None and row[0] == directory_mtime(self.directory)
+
+def open_index(directory):
+    '''
+    Opens the clip index of directory.
+
+    If the directory has no index yet, one is built from the
+    clips already in it, and if files were added to or removed
+    from the directory since the index was last brought up to
+    date, it is reconciled with them (see ClipIndex.update).
+    Only new pickled clips are unpickled.
+    '''
+
+    index = ClipIndex(directory)
+    if not index.is_current():
+        index.update()
+    return index
+
+class IndexWriter:
+    '''
+    Keeps the clip indexes of clippify's output directory
+    (and its train/test subdirectories) up to date.
+    '''
+
+    def __init__(self, output_directory):
+        '''
+        Parameters
+        -----------
+        output_directory (string) : directory clips are written to
+        '''
+
+        self.output_directory = output_directory
+
+        # open index of each split
+        self.indexes = {}
+
+    def add(self, split, row):
+        '''
+        Adds the row of a clip (see index_row)
+
+        Parameters
+        -----------
+        split (string) : subdirectory of output_directory the clip
+                         was written to ('train' or 'test'), or None
+        row (tuple) : row of the clip
+        '''
+
+        if split not in self.indexes:
+            directory = self.output_directory
+            if split is not None:
+                directory = path.join(directory, split)
+            self.indexes[split] = open_index(directory)
+
+        self.indexes[split].add(row)
+
+    def add_clip(self, split, clip_payload, **location):
+        '''Adds a clip, location is passed on to index_row'''
+        self.add(split, index_row(clip_payload, **location))
+
+    def commit(self):
+        for index in self.indexes.values():
+            index.commit()
+
+    def close(self):
+        for index in self.indexes.values():
+            index.close()
+        self.indexes = {}
+
+class IndexCollector:
+    '''
+    Stand-in for IndexWriter that keeps rows in memory,
+    so worker processes can hand their rows back to
+    the process that owns the index.
+    '''
+
+    def __init__(self):
+        self.rows = []
+
+    def add(self, split, row):
+        self.rows.append((split, row))
+
+    def add_clip(self, split, clip_payload, **location):
+        self.add(split, index_row(clip_payload, **location))
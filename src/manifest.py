@@ -0,0 +1,156 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Python module containing the processed-replay manifest
+that lets clippify run incrementally.
+
+The manifest is a json-lines file in the output directory
+with one record per processed replay:
+{
+    path,
+    size,
+    mtime,
+    hash,
+    first_clip_id,
+    clip_count,
+    outcome,
+}
+Records are appended as games finish, so an interrupted
+run can resume where it stopped. When a replay shows up
+more than once, its last record wins.
+'''
+
+import json
+from os import path, stat
+
+from .cache import replay_hash
+
+MANIFEST_FILE = 'manifest.jsonl'
+
+# outcome of a replay that was clippified successfully
+OK = 'ok'
+
+# replays with these outcomes are tried again on the next run,
+# every other outcome is final for as long as the file is unchanged
+RETRY_OUTCOMES = ('unknown_error',)
+
+class Manifest:
+    '''
+    Record of the replays that have been clippified into a directory.
+
+    Attributes
+    -----------
+    records (dict) : replay path -> latest record
+    next_clip_id (int) : first clip id not used by any recorded replay
+    pending (list) : records waiting for their clips to be written (see stage)
+    '''
+
+    def __init__(self, output_directory):
+        '''
+        Parameters
+        -----------
+        output_directory (string) : directory the clips are written to
+        '''
+
+        self.filepath = path.join(output_directory, MANIFEST_FILE)
+        self.records = {}
+        self.next_clip_id = 0
+        self.pending = []
+
+        if path.exists(self.filepath):
+            with open(self.filepath) as f:
+                for line in f:
+
+                    # a run that was killed mid-write
+                    # can leave a truncated last line
+                    try: record = json.loads(line)
+                    except ValueError: continue
+
+                    self._add(record)
+
+    def _add(self, record):
+        self.records[record['path']] = record
+        self.next_clip_id = max(
+            self.next_clip_id,
+            record['first_clip_id'] + record['clip_count']
+        )
+
+    def is_processed(self, filepath):
+        '''
+        Returns true if filepath was already processed
+        and has not changed since.
+
+        Size and mtime are checked first; the file is
+        only hashed when one of them has changed.
+        '''
+
+        record = self.records.get(path.abspath(filepath))
+        if record is None or record['outcome'] in RETRY_OUTCOMES:
+            return False
+
+        st = stat(filepath)
+        if st.st_size == record['size'] and st.st_mtime == record['mtime']:
+            return True
+
+        return st.st_size == record['size'] and replay_hash(filepath) == record['hash']
+
+    def make_record(self, filepath, outcome, first_clip_id=0, clip_count=0):
+        '''
+        Builds the manifest record of a processed replay
+
+        Parameters
+        -----------
+        filepath (string) : path of the .slp file
+        outcome (string) : OK, or the kind of failure
+        first_clip_id (int) : clip_id of the replay's first clip
+        clip_count (int) : number of clips made from the replay
+        '''
+
+        st = stat(filepath)
+        return {
+            'path': path.abspath(filepath),
+            'size': st.st_size,
+            'mtime': st.st_mtime,
+            'hash': replay_hash(filepath),
+            'first_clip_id': first_clip_id,
+            'clip_count': clip_count,
+            'outcome': outcome,
+        }
+
+    def record(self, record):
+        '''Appends a record to the manifest file'''
+        self.commit([record])
+
+    def stage(self, record, clips):
+        '''
+        Holds a record back until its clips are on disk.
+
+        Used with the clip store, where clips sit in the
+        writer's buffer until the next shard is written.
+
+        Returns
+        -----------
+        pending_clips (int) : number of clips behind all staged records
+        '''
+
+        self.pending.append((record, clips))
+        return sum(clips for _, clips in self.pending)
+
+    def commit(self, records=None):
+        '''Appends the given records (or every staged record) to the manifest file'''
+
+        if records is None:
+            records = [record for record, _ in self.pending]
+            self.pending = []
+
+        if not records:
+            return
+
+        with open(self.filepath, 'a') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+
+        for record in records:
+            self._add(record)
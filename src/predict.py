@@ -0,0 +1,276 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Python module for scoring whole replays with
+SSBML-Base-Model or SSBML-Transfer-Model, without
+clippifying them to disk first.
+
+Every player's full-game istream is cut into overlapping
+windows (strided views, nothing is copied until a batch
+is handed to the model), every window is scored, and
+the window scores are averaged into a game-level prediction.
+'''
+
+from os import path, listdir
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+from slippi.parse import ParseError
+
+from .util import char_from_id
+from .extract import extract, InvalidGameError, GameTooShortError
+from .slp import DECODER_ERRORS
+
+# number of windows per model call
+PREDICT_BATCH_SIZE = 256
+
+# replays that can not be scored, reported instead of raised by predict_directory
+# (with the raw decoder's own errors, should any escape it)
+PREDICT_ERRORS = (GameTooShortError, InvalidGameError, ParseError) + DECODER_ERRORS
+
+def windows(istream, window, stride):
+    '''
+    Cuts an istream into overlapping windows
+
+    Parameters
+    -----------
+    istream (ndarray) : (frames, 13) full-game istream
+    window (int) : window length in frames
+    stride (int) : frames between the starts of consecutive windows
+
+    Returns
+    -----------
+    windows (ndarray) : read-only (windows, window, 13) view of istream
+    '''
+
+    n_windows = max(0, (istream.shape[0] - window) // stride + 1)
+    frame_stride, column_stride = istream.strides
+    return as_strided(
+        istream,
+        shape = (n_windows, window, istream.shape[1]),
+        strides = (stride * frame_stride, frame_stride, column_stride),
+        writeable = False
+    )
+
+def score_windows(model, game_windows, batch_size=PREDICT_BATCH_SIZE):
+    '''
+    Scores windows with model, batch_size windows at a time
+
+    Parameters
+    -----------
+    model (Sequential) : SSBML-Base-Model or SSBML-Transfer-Model
+    game_windows (list) : (windows, window, 13) arrays, one per player
+    batch_size (int) : number of windows per model call
+
+    Returns
+    -----------
+    scores (list) : (windows, outputs) score array of every player
+    '''
+
+    counts = [len(w) for w in game_windows]
+    batch = np.empty((min(batch_size, sum(counts)),) + game_windows[0].shape[1:], dtype=np.float32)
+
+    # batches are filled straight from the strided views (the only
+    # copy of the window data) and can span several players
+    scores = []
+    n = 0
+    for w in game_windows:
+        for i in range(len(w)):
+            batch[n] = w[i]
+            n += 1
+            if n == len(batch):
+                scores.append(np.asarray(model.predict_on_batch(batch)))
+                n = 0
+    if n:
+        scores.append(np.asarray(model.predict_on_batch(batch[:n])))
+
+    # split the batch scores back up by player
+    scores = np.concatenate(scores)
+    return np.split(scores, np.cumsum(counts)[:-1])
+
+def aggregate(scores):
+    '''
+    Averages a player's window scores into a game-level prediction
+
+    Parameters
+    -----------
+    scores (ndarray) : (windows, outputs) window scores
+                       (26 softmax outputs for SSBML-Base-Model,
+                        1 sigmoid output for SSBML-Transfer-Model)
+
+    Returns
+    -----------
+    score (ndarray) : (outputs,) mean window score
+    prediction (string | bool) : predicted character, or whether the
+                                 player is the verified player
+    confidence (float) : mean score of the prediction
+    agreement (float) : fraction of windows that agree with the prediction
+    '''
+
+    score = scores.mean(axis=0)
+
+    if scores.shape[1] == 1:
+        prediction = bool(score[0] > .5)
+        confidence = float(score[0] if prediction else 1 - score[0])
+        agreement = float(np.mean((scores[:, 0] > .5) == prediction))
+    else:
+        best = int(np.argmax(score))
+        prediction = char_from_id[best]
+        confidence = float(score[best])
+        agreement = float(np.mean(np.argmax(scores, axis=1) == best))
+
+    return score, prediction, confidence, agreement
+
+def predict_game(
+        f,
+        model,
+        window = 30,
+        stride = None,
+        batch_size = PREDICT_BATCH_SIZE,
+        backend = 'raw',
+        players = None
+    ):
+    '''
+    Scores every player of a replay
+
+    Parameters
+    -----------
+    f (string) : Full path to game replay file
+    model (Sequential) : SSBML-Base-Model or SSBML-Transfer-Model
+    window (int or float) : window length in seconds (the model's clip length)
+    stride (int or float) : seconds between the starts of consecutive windows,
+                            defaults to half a window
+    batch_size (int) : number of windows per model call
+    backend (string) : extract backend to parse the replay with
+    players (tuple of dicts) : payload from extract.extract(f, as_sparse=False),
+                               if the replay was already parsed
+
+    Returns
+    -----------
+    predictions (list of dicts) : for every player that played
+                                  for at least one window:
+    {
+        game_id,
+        character,
+        name,
+        code,
+        windows,        number of windows scored
+        window_scores,  (windows, outputs) score of every window
+        score,          (outputs,) mean window score
+        prediction,     predicted character (base model),
+                        or True if the player is the verified player (transfer model)
+        confidence,     mean score of the prediction
+        agreement,      fraction of windows that agree with the prediction
+    }
+    '''
+
+    if players is None:
+        players = extract(f, as_sparse=False, backend=backend)
+
+    window_frames = int(window * 60)
+    stride_frames = int((stride if stride is not None else window / 2) * 60)
+    if window_frames < 1 or stride_frames < 1:
+        raise ValueError('window and stride must be at least one frame')
+
+    # one float32 copy of each istream, windows are views into it
+    istreams = [doc['istream'].astype(np.float32) for doc in players]
+    game_windows = [windows(istream, window_frames, stride_frames) for istream in istreams]
+
+    scored = [(doc, w) for doc, w in zip(players, game_windows) if len(w)]
+    if not scored:
+        return []
+    players, game_windows = zip(*scored)
+
+    predictions = []
+    for doc, scores in zip(players, score_windows(model, game_windows, batch_size)):
+        score, prediction, confidence, agreement = aggregate(scores)
+        predictions.append({
+            'game_id': doc['game_id'],
+            'character': doc['character'],
+            'name': doc['name'],
+            'code': doc['code'],
+            'windows': len(scores),
+            'window_scores': scores,
+            'score': score,
+            'prediction': prediction,
+            'confidence': confidence,
+            'agreement': agreement,
+        })
+
+    return predictions
+
+def load_game(f, backend='raw'):
+    '''Parses a replay for predict_game, in a worker process'''
+    try:
+        return extract(f, as_sparse=False, backend=backend)
+    except PREDICT_ERRORS as e:
+        return e
+
+def predict_directory(
+        input_directory,
+        model,
+        window = 30,
+        stride = None,
+        batch_size = PREDICT_BATCH_SIZE,
+        backend = 'raw',
+        workers = 1
+    ):
+    '''
+    Scores every replay in a directory, as a stream.
+
+    With more than one worker, replays are parsed in worker
+    processes while the model scores the previous ones.
+    Only a few parsed replays are held in memory at a time.
+
+    Parameters
+    -----------
+    input_directory (string) : directory of .slp files
+    model (Sequential) : SSBML-Base-Model or SSBML-Transfer-Model
+    window, stride, batch_size, backend : see predict_game
+    workers (int) : number of processes to parse replays with
+
+    Outputs (yield)
+    -----------
+    filepath (string) : path of the replay, in sorted order
+    predictions (list | Exception) : output of predict_game, or the error
+                                     (one of PREDICT_ERRORS) if the replay
+                                     could not be scored
+    '''
+
+    replays = [
+        path.join(input_directory, f) for f in sorted(listdir(input_directory))
+        if path.splitext(f)[1] == '.slp' and path.isfile(path.join(input_directory, f))
+    ]
+
+    def score(filepath, players):
+        if isinstance(players, Exception):
+            return filepath, players
+        return filepath, predict_game(
+            filepath, model, window, stride, batch_size, backend, players=players
+        )
+
+    if workers <= 1:
+        for filepath in replays:
+            yield score(filepath, load_game(filepath, backend))
+        return
+
+    # keep a couple of replays per worker in flight,
+    # and hand them to the model in input order
+    with ProcessPoolExecutor(workers) as executor:
+        replays = iter(replays)
+        in_flight = deque()
+        for filepath in replays:
+            in_flight.append((filepath, executor.submit(load_game, filepath, backend)))
+            if len(in_flight) >= 2 * workers:
+                break
+
+        while in_flight:
+            filepath, result = in_flight.popleft()
+            next_filepath = next(replays, None)
+            if next_filepath is not None:
+                in_flight.append((next_filepath, executor.submit(load_game, next_filepath, backend)))
+            yield score(filepath, result.result())
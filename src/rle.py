@@ -0,0 +1,184 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Python module for run-length encoded istreams.
+
+Controller inputs hold still for long stretches, so an
+istream is stored as its change points only: the frames
+on which any input changes (delta encoded, as run lengths)
+and the inputs held from each of them, in the 7 byte
+compact row format (see compact.py).
+
+    lengths  (runs,) uint16 frames each row is held for
+    rows     (runs, 7) uint8 analog codes + button bitfield
+
+Batches decode with a single np.repeat, and a window
+(eg. a 30 second clip) can be cut out of an encoded
+full game without decoding the rest of it.
+'''
+
+import numpy as np
+
+from .compact import ANALOG_COLUMNS, BUTTON_COLUMNS, DEFAULT_TABLE
+from .compact import compact_istream, decode_codes
+
+# longest run a single row can hold, longer runs are split
+MAX_RUN = np.iinfo(np.uint16).max
+
+# size of one frame of a dense float64 istream
+DENSE_FRAME_BYTES = (ANALOG_COLUMNS + BUTTON_COLUMNS) * 8
+
+class RunLengthIstream:
+    '''
+    Run-length encoded (frames, 13) istream.
+
+    Supports the parts of the csr_matrix interface the rest of
+    the project uses (shape, row slicing and toarray), so run-length
+    istreams can go anywhere a sparse istream can.
+
+    Attributes
+    -----------
+    lengths (ndarray) : (runs,) uint16 number of frames of every run
+    rows (ndarray) : (runs, 7) uint8 analog codes and button bitfield of every run
+    table (ndarray) : analog lookup table (see compact.CompactIstream)
+    '''
+
+    __slots__ = ('lengths', 'rows', 'table')
+
+    def __init__(self, lengths, rows, table=DEFAULT_TABLE):
+        self.lengths = lengths
+        self.rows = rows
+        self.table = table
+
+    @property
+    def shape(self):
+        return (int(self.lengths.sum(dtype=np.int64)), ANALOG_COLUMNS + BUTTON_COLUMNS)
+
+    @property
+    def nbytes(self):
+        table_bytes = 0 if self.table is DEFAULT_TABLE else self.table.nbytes
+        return self.lengths.nbytes + self.rows.nbytes + table_bytes
+
+    @property
+    def compression_ratio(self):
+        '''Size of the same istream as a dense float64 array, over the encoded size'''
+        return self.shape[0] * DENSE_FRAME_BYTES / self.nbytes
+
+    def __getitem__(self, rows):
+        if not isinstance(rows, slice) or rows.step not in (None, 1):
+            raise TypeError('run-length istreams can only be sliced by contiguous rows')
+        start, stop, _ = rows.indices(self.shape[0])
+        return self.window(start, stop)
+
+    def __getstate__(self):
+        table = None if self.table is DEFAULT_TABLE else self.table
+        return self.lengths, self.rows, table
+
+    def __setstate__(self, state):
+        self.lengths, self.rows, table = state
+        self.table = DEFAULT_TABLE if table is None else table
+
+    def window(self, start, stop):
+        '''
+        Cuts frames [start, stop) out of the istream,
+        without decoding anything outside of them
+
+        Returns
+        -----------
+        window (RunLengthIstream) : the frames, still run-length encoded
+        '''
+
+        ends = np.cumsum(self.lengths, dtype=np.int64)
+        start = max(start, 0)
+        stop = min(stop, ends[-1] if len(ends) else 0)
+        if start >= stop:
+            return RunLengthIstream(self.lengths[:0], self.rows[:0], self.table)
+
+        # runs that overlap the window
+        first = np.searchsorted(ends, start, side='right')
+        last = np.searchsorted(ends, stop, side='left')
+
+        lengths = self.lengths[first:last + 1].copy()
+        lengths[0] = min(ends[first], stop) - start
+        if last > first:
+            lengths[-1] = stop - (ends[last] - self.lengths[last])
+        return RunLengthIstream(lengths, self.rows[first:last + 1], self.table)
+
+    def toarray(self):
+        '''Decodes to a dense (frames, 13) float64 istream'''
+        return decode_batch([self])[0]
+
+    @staticmethod
+    def stack(istreams, dtype=np.float64):
+        return decode_batch(istreams, dtype)
+
+def rle_istream(istream):
+    '''
+    Run-length encodes an istream
+
+    Parameters
+    -----------
+    istream (csr_matrix | ndarray | CompactIstream) : (frames, 13) istream
+
+    Returns
+    -----------
+    istream (RunLengthIstream) : the same istream, run-length encoded.
+                                 Its compression_ratio attribute reports
+                                 how much smaller it is than a dense array.
+    '''
+
+    if isinstance(istream, RunLengthIstream):
+        return istream
+
+    compact = compact_istream(istream)
+    frames = np.concatenate((compact.analog, compact.buttons[:, None]), axis=1)
+
+    # change points: the first frame, and every frame that differs from the one before
+    starts = np.flatnonzero(np.any(frames[1:] != frames[:-1], axis=1)) + 1
+    starts = np.concatenate(([0], starts)) if len(frames) else starts
+    lengths = np.diff(np.append(starts, len(frames)))
+    rows = frames[starts]
+
+    # split runs that are too long for a uint16
+    pieces = -(-lengths // MAX_RUN)
+    if (pieces > 1).any():
+        rows = np.repeat(rows, pieces, axis=0)
+        split = np.full(pieces.sum(), MAX_RUN, dtype=np.int64)
+        split[np.cumsum(pieces) - 1] = lengths - (pieces - 1) * MAX_RUN
+        lengths = split
+
+    return RunLengthIstream(lengths.astype(np.uint16), np.ascontiguousarray(rows), compact.table)
+
+def decode_batch(istreams, dtype=np.float64):
+    '''
+    Decodes run-length istreams of the same length
+    with one np.repeat over every run of the batch
+
+    Parameters
+    -----------
+    istreams (list) : RunLengthIstreams, all with the same number of frames
+    dtype : dtype of the output
+
+    Returns
+    -----------
+    batch (ndarray) : (len(istreams), frames, 13) dense istreams
+    '''
+
+    frames = istreams[0].shape[0]
+    if any(istream.shape[0] != frames for istream in istreams):
+        raise ValueError('istreams in a batch must have the same number of frames')
+
+    rows = np.repeat(
+        np.concatenate([istream.rows for istream in istreams]),
+        np.concatenate([istream.lengths for istream in istreams]),
+        axis = 0
+    ).reshape(len(istreams), frames, ANALOG_COLUMNS + 1)
+
+    return decode_codes(
+        rows[..., :ANALOG_COLUMNS],
+        rows[..., ANALOG_COLUMNS],
+        [istream.table for istream in istreams],
+        dtype
+    )
@@ -0,0 +1,468 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Python module to decode the controller inputs
+and player info straight from the raw .slp event stream.
+
+Only the game-start, pre-frame and metadata events are
+decoded. Every other event is skipped by its payload size,
+and all pre-frame events are decoded at once with numpy.
+
+preflight checks a replay from its header, game-start event
+and metadata alone (a few KiB read), so replays that are
+corrupt, too short or not 1v1 are rejected before parsing.
+
+Byte layout reference:
+https://github.com/project-slippi/slippi-wiki/blob/master/SPEC.md
+'''
+
+import os
+import struct
+from io import BytesIO
+
+import numpy as np
+import ubjson
+from slippi.id import CSSCharacter
+from slippi.parse import ParseError
+
+# the first frame of the game is indexed -123
+FIRST_FRAME_INDEX = -123
+
+# event codes
+EVENT_PAYLOADS = 0x35
+GAME_START = 0x36
+FRAME_PRE = 0x37
+
+# every .slp file starts with these bytes,
+# followed by the length of the raw event stream
+RAW_HEADER = b'{U\x03raw[$U#l'
+METADATA_HEADER = b'U\x08metadata'
+
+# errors the decoder can trip over on a corrupt replay
+# (Replay raises them as ParseError)
+DECODER_ERRORS = (struct.error, IndexError, ValueError)
+
+# games shorter than a minute are rejected
+MIN_GAME_FRAMES = 3600
+
+# bytes preflight reads from the start of a replay, enough for
+# the event payloads and game-start events of every version
+PREFLIGHT_HEAD = 4096
+
+# reasons preflight rejects a replay for
+# (the same as the outcomes clippify records, see manifest.py)
+PARSE_ERROR = 'parse_error'
+TOO_SHORT = 'too_short'
+NOT_1V1 = 'not_1v1'
+
+# offsets into the game-start payload (after the event code)
+PLAYER_BLOCK = 100
+PLAYER_BLOCK_SIZE = 36
+
+# player types that count as an active port
+ACTIVE_PLAYER_TYPES = (0, 1) # human, cpu
+
+# fields of the pre-frame payload that make up an istream,
+# with their big-endian types and offsets (after the event code)
+PRE_FRAME_FIELDS = {
+    'frame':       ('>i4', 0),
+    'port':        ('u1',  4),
+    'is_follower': ('?',   5),
+    'joystick_x':  ('>f4', 24),
+    'joystick_y':  ('>f4', 28),
+    'cstick_x':    ('>f4', 32),
+    'cstick_y':    ('>f4', 36),
+    'buttons':     ('>u2', 48),
+    'trigger_l':   ('>f4', 50),
+    'trigger_r':   ('>f4', 54),
+}
+
+# minimum pre-frame payload size that holds all of the fields above
+PRE_FRAME_SIZE = 58
+
+ANALOG_FIELDS = (
+    'joystick_x', 'joystick_y',
+    'cstick_x', 'cstick_y',
+    'trigger_l', 'trigger_r',
+)
+
+def read_header(data):
+    '''
+    Checks the .slp file header and returns
+    the position and length of the raw event stream.
+
+    Parameters
+    -----------
+    data (bytes) : contents of a .slp file
+
+    Returns
+    -----------
+    start (int) : position of the first event
+    length (int) : length of the raw event stream in bytes
+                   (0 for replays that were never finalized)
+    '''
+
+    if data[:len(RAW_HEADER)] != RAW_HEADER:
+        raise ParseError('not a .slp file', pos=0)
+
+    start = len(RAW_HEADER) + 4
+    if len(data) < start:
+        raise ParseError('unexpected end of file', pos=len(data))
+
+    (length,) = struct.unpack_from('>l', data, len(RAW_HEADER))
+    return start, length
+
+def read_payload_sizes(data, pos):
+    '''
+    Reads the event payloads event,
+    which gives the payload size of every other event.
+
+    Parameters
+    -----------
+    data (bytes) : contents of a .slp file
+    pos (int) : position of the event payloads event
+
+    Returns
+    -----------
+    sizes (dict) : event code -> payload size
+    pos (int) : position of the next event
+    '''
+
+    if len(data) < pos + 2:
+        raise ParseError('unexpected end of file', pos=len(data))
+    if data[pos] != EVENT_PAYLOADS:
+        raise ParseError('expected event payloads', pos=pos)
+
+    size = data[pos + 1]
+    if len(data) < pos + 1 + size:
+        raise ParseError('unexpected end of file', pos=len(data))
+
+    sizes = {EVENT_PAYLOADS: size}
+    for p in range(pos + 2, pos + 1 + size, 3):
+        code, code_size = struct.unpack_from('>BH', data, p)
+        sizes[code] = code_size
+
+    return sizes, pos + 1 + size
+
+def read_player_slots(data, pos, size):
+    '''
+    Reads the character and player type
+    of every port from the game-start event.
+
+    Parameters
+    -----------
+    data (bytes) : contents of a .slp file
+    pos (int) : position of the game-start event
+    size (int) : payload size of the game-start event
+
+    Returns
+    -----------
+    characters (tuple) : 4-tuple of CSS character ids.
+                         Inactive ports return as None.
+    '''
+
+    if size < PLAYER_BLOCK + 4 * PLAYER_BLOCK_SIZE:
+        raise ParseError('game start event is too short', pos=pos)
+
+    characters = [None]*4
+    for i in range(4):
+        block = pos + 1 + PLAYER_BLOCK + i * PLAYER_BLOCK_SIZE
+        character, player_type = data[block], data[block + 1]
+        if player_type in ACTIVE_PLAYER_TYPES:
+            characters[i] = character
+
+    return tuple(characters)
+
+def read_metadata(data, pos):
+    '''
+    Reads the ubjson metadata that follows the raw event stream.
+
+    Parameters
+    -----------
+    data (bytes) : contents of a .slp file
+    pos (int) : position right after the raw event stream
+
+    Returns
+    -----------
+    metadata (dict) : the replay's metadata
+    '''
+
+    if data[pos:pos + len(METADATA_HEADER)] != METADATA_HEADER:
+        raise ParseError('expected metadata', pos=pos)
+
+    stream = BytesIO(data)
+    stream.seek(pos + len(METADATA_HEADER))
+    try:
+        return ubjson.load(stream)
+    except Exception as e:
+        raise ParseError(str(e), pos=pos)
+
+def find_events(data, pos, end, sizes):
+    '''
+    Walks the raw event stream, jumping from event
+    to event by payload size, and locates the
+    game-start and pre-frame events.
+
+    Parameters
+    -----------
+    data (bytes) : contents of a .slp file
+    pos (int) : position of the first event after event payloads
+    end (int) : position of the end of the raw event stream
+    sizes (dict) : event code -> payload size
+
+    Returns
+    -----------
+    start (int) : position of the game-start event
+    pre_frames (ndarray) : positions of every pre-frame event
+    '''
+
+    start = None
+    pre_frames = []
+
+    try:
+        while pos < end:
+            code = data[pos]
+            if code == FRAME_PRE:
+                pre_frames.append(pos)
+            elif code == GAME_START:
+                start = pos
+            pos += sizes[code] + 1
+    except KeyError:
+        raise ParseError(f'unexpected event type: 0x{code:02x}', pos=pos)
+    except IndexError:
+        raise ParseError('unexpected end of file', pos=pos)
+
+    if pos > end:
+        raise ParseError('unexpected end of file', pos=end)
+
+    if start is None:
+        raise ParseError('no game start event')
+
+    return start, np.array(pre_frames, dtype=np.int64)
+
+def gather(data, positions, dtype):
+    '''
+    Reads one value of the given dtype at every position in data.
+
+    Values are read through zero-copy views of the buffer,
+    one view per byte alignment, so no per-event bytes are copied.
+
+    Parameters
+    -----------
+    data (bytes) : contents of a .slp file
+    positions (ndarray) : byte positions of the values
+    dtype (np.dtype) : type of the values
+
+    Returns
+    -----------
+    values (ndarray) : values read at positions, in native byte order
+    '''
+
+    dtype = np.dtype(dtype)
+    size = dtype.itemsize
+    values = np.empty(len(positions), dtype=dtype.newbyteorder('='))
+
+    for alignment in range(size):
+        mask = positions % size == alignment
+        view = np.frombuffer(
+            data,
+            dtype = dtype,
+            offset = alignment,
+            count = (len(data) - alignment) // size,
+        )
+        values[mask] = view[(positions[mask] - alignment) // size]
+
+    return values
+
+def decode_pre_frames(data, positions):
+    '''
+    Decodes every pre-frame event in one go.
+
+    Parameters
+    -----------
+    data (bytes) : contents of a .slp file
+    positions (ndarray) : positions of the pre-frame events
+
+    Returns
+    -----------
+    pre_frames (dict) : field name -> ndarray of values,
+                        for every field in PRE_FRAME_FIELDS
+    '''
+
+    # skip the event code
+    positions = positions + 1
+
+    return {
+        field: gather(data, positions + offset, dtype)
+        for field, (dtype, offset) in PRE_FRAME_FIELDS.items()
+    }
+
+def preflight(f, min_frames=MIN_GAME_FRAMES, n_players=2):
+    '''
+    Checks a replay without parsing it: only the header, the
+    event payloads and game-start events, and the metadata
+    at the end of the file are read.
+
+    Never rejects a replay that extract would accept, except
+    for its number of players (extract accepts any number).
+    Replays without a lastFrame in their metadata (eg. ones
+    that were never finalized) pass the length check.
+
+    Parameters
+    -----------
+    f (string) : Full path to game replay file
+    min_frames (int) : reject games with fewer frames than this
+    n_players (int) : reject games without exactly this
+                      many active ports (None to accept any)
+
+    Returns
+    -----------
+    reason (string) : None if the replay should be parsed,
+                      otherwise PARSE_ERROR, NOT_1V1 or TOO_SHORT
+    '''
+
+    try:
+        with open(f, 'rb') as fp:
+            head = fp.read(PREFLIGHT_HEAD)
+            start, length = read_header(head)
+            sizes, pos = read_payload_sizes(head, start)
+
+            if GAME_START not in sizes:
+                raise ParseError('no game start event')
+            if len(head) < pos + 1 + sizes[GAME_START]:
+                fp.seek(0)
+                head = fp.read(pos + 1 + sizes[GAME_START])
+            if head[pos] != GAME_START:
+                raise ParseError('expected game start', pos=pos)
+            slots = read_player_slots(head, pos, sizes[GAME_START])
+
+            metadata = {}
+            if length:
+                end = start + length
+                if end > os.fstat(fp.fileno()).st_size:
+                    raise ParseError('unexpected end of file', pos=end)
+                fp.seek(end)
+                metadata = read_metadata(fp.read(), 0)
+
+    except (OSError, ParseError, IndexError, struct.error):
+        return PARSE_ERROR
+
+    if n_players is not None and sum(c is not None for c in slots) != n_players:
+        return NOT_1V1
+
+    last_frame = metadata.get('lastFrame') if isinstance(metadata, dict) else None
+    if isinstance(last_frame, int) and last_frame - FIRST_FRAME_INDEX + 1 < min_frames:
+        return TOO_SHORT
+
+    return None
+
+class Replay:
+    '''
+    Controller inputs and player info from a .slp file.
+
+    A lightweight stand-in for slippi.Game,
+    holding only what extract needs.
+
+    Attributes
+    -----------
+    n_frames (int) : number of frames in the game
+    analog (ndarray) : (4, n_frames, 6) joystick, cstick and trigger
+                       positions for every controller port
+    buttons (ndarray) : (4, n_frames) physical button bitmasks
+    active (tuple) : 4-tuple of bools, true if a port has
+                     inputs on every frame of the game
+    characters (tuple) : 4-tuple of character names
+    names (tuple) : 4-tuple of player names
+    codes (tuple) : 4-tuple of player netplay codes
+    '''
+
+    def __init__(self, f):
+        '''
+        Parameters
+        -----------
+        f (string) : Full path to game replay file
+        '''
+
+        with open(f, 'rb') as fp:
+            data = fp.read()
+
+        try:
+            self._parse(data)
+        except ParseError as e:
+            e.filename = f
+            raise
+
+        # anything else the decoder trips over is a corrupt file too,
+        # so both extract backends reject corrupt replays the same way
+        except DECODER_ERRORS as e:
+            raise ParseError(str(e), filename=f)
+
+    def _parse(self, data):
+
+        start, length = read_header(data)
+        end = start + length if length else len(data)
+
+        sizes, pos = read_payload_sizes(data, start)
+        if FRAME_PRE not in sizes or sizes[FRAME_PRE] < PRE_FRAME_SIZE:
+            raise ParseError('pre-frame events are missing inputs')
+
+        game_start, positions = find_events(data, pos, end, sizes)
+
+        # follower (nana) inputs are not part of any istream
+        is_follower = gather(data, positions + 1 + PRE_FRAME_FIELDS['is_follower'][1], '?')
+        pre = decode_pre_frames(data, positions[~is_follower])
+
+        frames = pre['frame'].astype(np.int64) - FIRST_FRAME_INDEX
+        ports = pre['port'].astype(np.int64)
+        if len(frames) and (frames.min() < 0 or ports.max() > 3):
+            raise ParseError('invalid frame or port index')
+
+        self.n_frames = int(frames.max()) + 1 if len(frames) else 0
+
+        # every frame has a pre-frame event, so a larger frame
+        # index is corrupt (and would allocate a huge istream)
+        if self.n_frames > len(frames):
+            raise ParseError('invalid frame index')
+
+        # on rollback the same frame shows up again later in the
+        # stream, so keep only the last event for every (port, frame)
+        key = ports * self.n_frames + frames
+        _, last = np.unique(key[::-1], return_index=True)
+        keep = len(key) - 1 - last
+        frames, ports = frames[keep], ports[keep]
+
+        self.analog = np.zeros((4, self.n_frames, 6))
+        self.buttons = np.zeros((4, self.n_frames), dtype=np.uint16)
+        for i, field in enumerate(ANALOG_FIELDS):
+            self.analog[ports, frames, i] = pre[field][keep]
+        self.buttons[ports, frames] = pre['buttons'][keep]
+
+        # a port only has an istream if it has inputs on every frame
+        counts = np.bincount(ports, minlength=4)
+        self.active = tuple(bool(c == self.n_frames) for c in counts[:4])
+
+        slots = read_player_slots(data, game_start, sizes[GAME_START])
+        try:
+            self.characters = tuple(
+                None if c is None else CSSCharacter(c).name
+                for c in slots
+            )
+        except ValueError as e:
+            raise ParseError(str(e), pos=game_start)
+
+        names = [None]*4
+        codes = [None]*4
+        if length:
+            metadata = read_metadata(data, end)
+            players = metadata.get('players', {})
+            for i in range(4):
+                try: netplay = players[str(i)]['names']
+                except (KeyError, TypeError): continue
+                if 'netplay' in netplay and 'code' in netplay:
+                    names[i] = netplay['netplay']
+                    codes[i] = netplay['code']
+
+        self.names = tuple(names)
+        self.codes = tuple(codes)
@@ -0,0 +1,250 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Python module for clippify's run statistics.
+
+Every replay is timed stage by stage:
+
+    preflight   checking the replay before parsing it (see slp.preflight)
+    parse       opening and parsing the replay
+                (or loading it from the extraction cache)
+    extract     building istreams and player info from the parsed game
+    slice       cutting clips out of the full-game istreams
+    serialize   pickling clips (or stacking clip store shards)
+    write       writing clip files (or clip store shards) to disk
+
+GameStats holds the timings of one replay, and ClippifyStats
+adds them up for a whole run, with throughput, an ETA and the
+slowest replays, and can log every replay to a JSON lines file:
+
+    {'type': 'game', path, outcome, seconds, stages, clips, frames, bytes_written, ...}
+    {'type': 'preflight', path, outcome, seconds, stages, ...}
+    {'type': 'summary', ...}
+'''
+
+import json
+import time
+import heapq
+from collections import Counter
+from contextlib import contextmanager
+
+from .manifest import OK
+
+STAGES = ('preflight', 'parse', 'extract', 'slice', 'serialize', 'write')
+
+# number of slowest replays kept by ClippifyStats
+SLOWEST = 10
+
+class GameStats:
+    '''
+    Stage timings and output counts of one replay
+    (or of the clip store writer, for a whole run).
+
+    Plain attributes only, so worker processes can
+    send their GameStats back to clippify.
+    '''
+
+    def __init__(self, path=None):
+        self.path = path
+        self.seconds = dict.fromkeys(STAGES, 0.)
+        self.clips = 0
+        self.frames = 0
+        self.bytes_written = 0
+
+    @contextmanager
+    def stage(self, name):
+        '''Adds the time spent in the with block to stage name'''
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - t
+
+    @property
+    def total_seconds(self):
+        return sum(self.seconds.values())
+
+    def as_dict(self):
+        return {
+            'path': self.path,
+            'seconds': self.total_seconds,
+            'stages': dict(self.seconds),
+            'clips': self.clips,
+            'frames': self.frames,
+            'bytes_written': self.bytes_written,
+        }
+
+class ClippifyStats:
+    '''
+    Statistics of a clippify run.
+
+    Attributes
+    -----------
+    n_replays (int) : number of replays the run will process
+    games (int) : number of replays processed so far
+    outcomes (Counter) : number of replays of every outcome (see manifest.py),
+                         including the ones rejected at preflight
+    preflight_rejections (Counter) : number of replays of every outcome
+                                     rejected at preflight, without
+                                     being parsed (see reject)
+    seconds (dict) : total seconds spent in every stage, summed over
+                     worker processes (so with several workers the
+                     stages can add up to more than the elapsed time)
+    clips (int) : number of clips made
+    frames (int) : number of frames of the replays clips were made from
+    bytes_written (int) : bytes of clip files (or shards) written
+    store (GameStats) : timings of the clip store writer, which
+                        serializes and writes shards for many replays at once
+    '''
+
+    def __init__(self, n_replays, log=None, slowest=SLOWEST):
+        '''
+        Parameters
+        -----------
+        n_replays (int) : number of replays the run will process
+        log (string) : if given, path of a JSON lines file to append
+                       a record of every replay and of the run to
+        slowest (int) : number of slowest replays to keep
+        '''
+
+        self.n_replays = n_replays
+        self.started = time.perf_counter()
+        self.games = 0
+        self.outcomes = Counter()
+        self.preflight_rejections = Counter()
+        self.seconds = dict.fromkeys(STAGES, 0.)
+        self.clips = 0
+        self.frames = 0
+        self.bytes_written = 0
+        self.store = GameStats()
+
+        self.n_slowest = slowest
+        self._slowest = []
+        self.log = open(log, 'a') if log is not None else None
+
+    @property
+    def elapsed(self):
+        '''Wall clock seconds since the run started'''
+        return time.perf_counter() - self.started
+
+    @property
+    def clips_per_sec(self):
+        elapsed = self.elapsed
+        return self.clips / elapsed if elapsed > 0 else 0.
+
+    @property
+    def eta(self):
+        '''Estimated seconds until every replay is processed'''
+        if not self.games:
+            return None
+        return self.elapsed / self.games * (self.n_replays - self.games)
+
+    @property
+    def slowest(self):
+        '''(seconds, path) of the slowest replays, slowest first'''
+        return sorted(self._slowest, reverse=True)
+
+    def add(self, game_stats, outcome):
+        '''
+        Adds the stats of a processed replay
+
+        Parameters
+        -----------
+        game_stats (GameStats) : timings and counts of the replay
+        outcome (string) : how processing the replay ended (see manifest.py)
+        '''
+
+        self.games += 1
+        self.outcomes[outcome] += 1
+        for stage, seconds in game_stats.seconds.items():
+            self.seconds[stage] += seconds
+        self.clips += game_stats.clips
+        self.frames += game_stats.frames
+        self.bytes_written += game_stats.bytes_written
+
+        entry = (game_stats.total_seconds, game_stats.path)
+        if len(self._slowest) < self.n_slowest:
+            heapq.heappush(self._slowest, entry)
+        else:
+            heapq.heappushpop(self._slowest, entry)
+
+        if self.log is not None:
+            record = {'type': 'game', 'outcome': outcome, **game_stats.as_dict()}
+            record.update(clips_per_sec=self.clips_per_sec, eta=self.eta)
+            self.log.write(json.dumps(record) + '\n')
+            self.log.flush()
+
+    def reject(self, game_stats, outcome):
+        '''
+        Adds a replay rejected at preflight. It is not one of
+        the n_replays the run processes, so it does not count
+        towards games, the ETA or the slowest replays.
+
+        Parameters
+        -----------
+        game_stats (GameStats) : timings of the replay
+        outcome (string) : why the replay was rejected (see slp.preflight)
+        '''
+
+        self.outcomes[outcome] += 1
+        self.preflight_rejections[outcome] += 1
+        for stage, seconds in game_stats.seconds.items():
+            self.seconds[stage] += seconds
+
+        if self.log is not None:
+            record = {'type': 'preflight', 'outcome': outcome, **game_stats.as_dict()}
+            self.log.write(json.dumps(record) + '\n')
+            self.log.flush()
+
+    @property
+    def parse_rejections(self):
+        '''Number of replays of every outcome that failed after being parsed'''
+        return Counter({
+            outcome: count - self.preflight_rejections[outcome]
+            for outcome, count in self.outcomes.items()
+            if outcome != OK and count > self.preflight_rejections[outcome]
+        })
+
+    def as_dict(self):
+        '''Totals of the run, clip store writer included'''
+        seconds = {
+            stage: self.seconds[stage] + self.store.seconds[stage]
+            for stage in STAGES
+        }
+        return {
+            'replays': self.n_replays,
+            'games': self.games,
+            'outcomes': dict(self.outcomes),
+            'preflight_rejections': dict(self.preflight_rejections),
+            'parse_rejections': dict(self.parse_rejections),
+            'elapsed': self.elapsed,
+            'stages': seconds,
+            'clips': self.clips,
+            'frames': self.frames,
+            'bytes_written': self.bytes_written + self.store.bytes_written,
+            'clips_per_sec': self.clips_per_sec,
+            'slowest': [{'path': p, 'seconds': s} for s, p in self.slowest],
+        }
+
+    def close(self):
+        '''Logs the summary of the run and closes the log'''
+        if self.log is not None:
+            self.log.write(json.dumps({'type': 'summary', **self.as_dict()}) + '\n')
+            self.log.close()
+            self.log = None
+
+    def __str__(self):
+        summary = self.as_dict()
+        total = sum(summary['stages'].values()) or 1.
+        stages = ', '.join(
+            f'{stage} {seconds:.1f}s ({100 * seconds / total:.0f}%)'
+            for stage, seconds in summary['stages'].items()
+        )
+        return (
+            f'{summary["clips"]} clips in {summary["elapsed"]:.1f}s '
+            f'({summary["clips_per_sec"]:.1f} clips/sec, '
+            f'{summary["bytes_written"] / 2**20:.1f} MiB written)\n'
+            f'    stages: {stages}'
+        )
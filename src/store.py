@@ -0,0 +1,283 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Python module for the sharded clip store -
+an on-disk format for the clips dataset that packs
+many clips into a few large .npy files instead of
+writing one pickle file per clip.
+
+A store is a directory of shard pairs:
+
+    shard-{first_clip_id}.npy       (clips, frames, 13) float32 istreams
+    shard-{first_clip_id}.meta.npy  (clips,) metadata table
+
+plus a small store.json file that marks the directory as a store.
+
+Shards are opened with np.memmap, so building a batch
+is a fancy-index gather with no per-clip file opens.
+'''
+
+import os
+import json
+from os import path, listdir, makedirs
+from contextlib import nullcontext
+
+import numpy as np
+
+# number of clips per shard
+SHARD_SIZE = 1024
+
+SHARD_PREFIX = 'shard-'
+META_SUFFIX = '.meta.npy'
+
+# marks a directory as a clip store
+STORE_FILE = 'store.json'
+STORE_VERSION = 1
+
+# one row per clip.
+# strings are fixed width so tables from every shard share a dtype,
+# missing values (such as the code of an offline player) are stored as ''
+METADATA = np.dtype([
+    ('clip_id', np.int64),
+    ('character', 'U16'),
+    ('code', 'U16'),
+    ('name', 'U32'),
+    ('game_id', 'U64'),
+])
+
+def is_store(directory):
+    '''Returns true if directory is a clip store'''
+    return path.isfile(path.join(directory, STORE_FILE))
+
+class ShardWriter:
+    '''
+    Writes clip payloads (as made by clippify) into a clip store.
+
+    Clips are buffered in memory and written one full shard at a time.
+    Call close (or use as a context manager) to write the last shard.
+    '''
+
+    def __init__(self, output_directory, shard_size=SHARD_SIZE, index=None, stats=None):
+        '''
+        Parameters
+        -----------
+        output_directory (string) : directory to write the store(s) into
+        shard_size (int) : number of clips per shard,
+                           None to only write shards on flush/close
+        index (IndexWriter) : if given, clips are added to the clip
+                              index (see index.py) as their shard is written
+        stats (GameStats) : if given, stacking and writing shards is timed
+                            into its 'serialize' and 'write' stages, and
+                            the bytes written are counted (see stats.py)
+        '''
+
+        self.output_directory = output_directory
+        self.shard_size = shard_size
+        self.index = index
+        self.stats = stats
+
+        # clips waiting to be written, for each split
+        self.buffers = {}
+
+    def write(self, clip_payload, split=None):
+        '''
+        Adds a clip to the store
+
+        Parameters
+        -----------
+        clip_payload (dict) : clip, as made by clippify_game
+        split (string) : subdirectory of output_directory to write into
+                         ('train' or 'test'), or None
+        '''
+
+        buffer = self.buffers.setdefault(split, [])
+        buffer.append(clip_payload)
+        if self.shard_size is not None and len(buffer) >= self.shard_size:
+            self.flush(split)
+
+    def flush(self, split=None):
+        '''Writes the buffered clips of one split to a new shard'''
+
+        buffer = self.buffers.pop(split, [])
+        if not buffer:
+            return
+
+        directory = self.output_directory
+        if split is not None:
+            directory = path.join(directory, split)
+        makedirs(directory, exist_ok=True)
+
+        store_file = path.join(directory, STORE_FILE)
+        if not path.exists(store_file):
+            with open(store_file, 'w') as f:
+                json.dump({'version': STORE_VERSION}, f)
+
+        with self.stage('serialize'):
+            istreams = np.stack([
+                clip['istream'].toarray() if hasattr(clip['istream'], 'toarray')
+                else clip['istream']
+                for clip in buffer
+            ]).astype(np.float32)
+
+            metadata = np.array([
+                (
+                    clip['clip_id'],
+                    clip['character'] or '',
+                    clip['code'] or '',
+                    clip['name'] or '',
+                    clip['game_id'] or '',
+                )
+                for clip in buffer
+            ], dtype=METADATA)
+
+        name = f'{SHARD_PREFIX}{buffer[0]["clip_id"]:010d}'
+        shard_path = path.join(directory, name + '.npy')
+        meta_path = path.join(directory, name + META_SUFFIX)
+
+        # write through temporary files so readers never see
+        # half a shard; the metadata file marks a shard as complete
+        with self.stage('write'):
+            for array, final_path in ((istreams, shard_path), (metadata, meta_path)):
+                tmp_path = final_path + '.tmp'
+                with open(tmp_path, 'wb') as f:
+                    np.save(f, array)
+                os.replace(tmp_path, final_path)
+                if self.stats is not None:
+                    self.stats.bytes_written += path.getsize(final_path)
+
+        # (in case the new shard did not change the modification time)
+        STORES.pop(directory, None)
+
+        if self.index is not None:
+            for offset, clip in enumerate(buffer):
+                self.index.add_clip(split, clip, shard=name, shard_offset=offset)
+            self.index.commit()
+
+    def stage(self, name):
+        '''Times a stage of writing shards, when the writer has stats'''
+        return self.stats.stage(name) if self.stats is not None else nullcontext()
+
+    def close(self):
+        '''Writes every remaining buffered clip'''
+        for split in list(self.buffers):
+            self.flush(split)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class ClipStore:
+    '''
+    Read-only view of a clip store.
+
+    Attributes
+    -----------
+    names (list) : shard names, in store order
+    metadata (ndarray) : structured array (METADATA dtype),
+                         one row per clip, across every shard
+    shard (ndarray) : shard number of every clip
+    offset (ndarray) : row of every clip within its shard
+    shape (tuple) : (frames, 13) shape of every clip
+    '''
+
+    def __init__(self, directory):
+        '''
+        Parameters
+        -----------
+        directory (string) : directory containing the shards
+        '''
+
+        names = sorted(
+            f[:-len(META_SUFFIX)] for f in listdir(directory)
+            if f.startswith(SHARD_PREFIX) and f.endswith(META_SUFFIX)
+        )
+        if not names:
+            raise FileNotFoundError(f'no clip store shards in {directory}')
+
+        self.names = names
+        self.shards = []
+        tables = []
+        for name in names:
+            shard = np.load(path.join(directory, name + '.npy'), mmap_mode='r')
+            table = np.load(path.join(directory, name + META_SUFFIX))
+            if len(shard) != len(table):
+                raise ValueError(f'shard {name} does not match its metadata')
+            self.shards.append(shard)
+            tables.append(table)
+
+        shapes = {shard.shape[1:] for shard in self.shards}
+        if len(shapes) != 1:
+            raise ValueError(f'clips in {directory} have different shapes: {shapes}')
+        self.shape = shapes.pop()
+
+        self.metadata = np.concatenate(tables)
+        self.shard = np.concatenate([
+            np.full(len(table), i) for i, table in enumerate(tables)
+        ])
+        self.offset = np.concatenate([
+            np.arange(len(table)) for table in tables
+        ])
+
+        # row of the first clip of every shard
+        starts = np.cumsum([0] + [len(table) for table in tables[:-1]])
+        self.first_row = dict(zip(names, starts.tolist()))
+
+    def __len__(self):
+        return len(self.metadata)
+
+    def istreams(self, indices):
+        '''
+        Gathers the istreams of the given clips
+
+        Parameters
+        -----------
+        indices (array-like) : rows of the clips in the store
+
+        Returns
+        -----------
+        istreams (ndarray) : (len(indices), frames, 13) float32 array
+        '''
+
+        indices = np.asarray(indices, dtype=np.int64)
+        istreams = np.empty((len(indices),) + self.shape, dtype=np.float32)
+
+        shards = self.shard[indices]
+        offsets = self.offset[indices]
+        for s in np.unique(shards):
+            mask = shards == s
+            istreams[mask] = self.shards[s][offsets[mask]]
+
+        return istreams
+
+    def rows(self, shards, offsets):
+        '''
+        Maps (shard name, offset) pairs, as kept in the clip index,
+        to rows of the store. Clips from shards written after the
+        store was opened are left out.
+        '''
+
+        return [
+            self.first_row[shard] + offset
+            for shard, offset in zip(shards, offsets)
+            if shard in self.first_row
+        ]
+
+# directory -> (modification time, ClipStore) of every opened store
+STORES = {}
+
+def open_store(directory):
+    '''
+    Opens the clip store in directory, and reuses it until
+    shards are added to or removed from the directory
+    (which changes its modification time)
+    '''
+
+    mtime = os.stat(directory).st_mtime_ns
+    opened = STORES.get(directory)
+    if opened is None or opened[0] != mtime:
+        opened = STORES[directory] = (mtime, ClipStore(directory))
+    return opened[1]
@@ -0,0 +1,326 @@
+'''
+Author : Zack Magnotti
+Email : zack@magnotti.net
+Date : 10/18/2026
+
+Python module for scoring a live controller stream,
+one frame at a time, with SSBML-Base-Model or
+SSBML-Transfer-Model.
+
+Running the model over a whole 30 second window for every
+new frame would redo almost all of its work, since every
+window shares all but one frame with the one before it.
+StreamingVerifier instead keeps the recent inputs of every
+convolution (and the partial maximum of every pooling layer)
+and only computes the activations that a new frame completes:
+
+    every frame        one ConvCell-1 output
+    every 4 frames     one ConvCell-2 output
+    every 16 frames    one ConvCell-3 output
+    every 32 frames    one ConvCell-4 output and a new score
+
+The score is the model's output on the most recent window
+that starts on that 32 frame grid, computed with numpy.
+
+By default the work of the slower convolutions is also split
+evenly over the frames until their next input arrives. That
+keeps the cost of every frame about the same, but delays
+each new score by 49 frames (under a second).
+'''
+
+import numpy as np
+from tensorflow import keras
+
+def swish(x):
+    return x / (1 + np.exp(-x))
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+def softmax(x):
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+# numpy versions of the keras activations used in the models
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'tanh': np.tanh,
+    'swish': swish,
+    'silu': swish,
+    'sigmoid': sigmoid,
+    'softmax': softmax,
+}
+
+def activation(fn):
+    '''Returns the numpy version of a keras activation function'''
+    name = getattr(fn, '__name__', str(fn))
+    if name not in ACTIVATIONS:
+        raise ValueError(f'unsupported activation {name}')
+    return ACTIVATIONS[name]
+
+def flatten_layers(model):
+    '''Lists the layers of a (nested) Sequential model, in order'''
+    layers = []
+    for layer in model.layers:
+        if isinstance(layer, keras.Sequential):
+            layers += flatten_layers(layer)
+        else:
+            layers.append(layer)
+    return layers
+
+def batch_norm(layer):
+    '''Returns the inference-mode (scale, shift) of a BatchNormalization layer'''
+    gamma = layer.gamma.numpy() if layer.scale else 1.
+    beta = layer.beta.numpy() if layer.center else 0.
+    scale = gamma / np.sqrt(layer.moving_variance.numpy() + layer.epsilon)
+    shift = beta - layer.moving_mean.numpy() * scale
+    return scale.astype(np.float32), np.float32(shift)
+
+def add_dense_layer(head, layer):
+    '''
+    Adds a keras layer to a numpy dense head, a list of
+    [weights, bias, activation] of every Dense layer.
+    BatchNormalization is merged into the Dense layer before it,
+    Activation sets its activation, Flatten and Dropout do nothing.
+    '''
+
+    if isinstance(layer, (keras.layers.Flatten, keras.layers.Dropout)):
+        return
+
+    if isinstance(layer, keras.layers.Dense):
+        weights = layer.kernel.numpy()
+        bias = layer.bias.numpy() if layer.use_bias else np.zeros(weights.shape[1], np.float32)
+        head.append([weights, bias, activation(layer.activation)])
+
+    elif isinstance(layer, keras.layers.BatchNormalization):
+        if not head or head[-1][2] is not ACTIVATIONS['linear']:
+            raise ValueError(f'{layer.name}: BatchNormalization must directly follow a linear Dense layer')
+        scale, shift = batch_norm(layer)
+        weights, bias, _ = head[-1]
+        head[-1][:2] = weights * scale, bias * scale + shift
+
+    elif isinstance(layer, keras.layers.Activation):
+        if not head or head[-1][2] is not ACTIVATIONS['linear']:
+            raise ValueError(f'{layer.name}: Activation must follow a linear Dense layer')
+        head[-1][2] = activation(layer.activation)
+
+    else:
+        raise ValueError(f'{layer.name}: {type(layer).__name__} layers can not be streamed')
+
+class Conv:
+    '''
+    Streaming Conv1D (stride 1, valid padding),
+    followed by any elementwise layers after it.
+
+    The last kernel_size inputs are kept in a ring buffer
+    stored twice over, so the current window is always
+    one contiguous slice.
+
+    A new input only arrives every `period` frames, so the
+    matrix product for an output is split into `period` chunks
+    and one chunk is computed per frame. Every frame then costs
+    about the same, instead of the big convolutions all landing
+    on the same frame every 32 frames.
+    '''
+
+    def __init__(self, layer, period=1):
+        if layer.strides != (1,) or layer.dilation_rate != (1,) or layer.padding != 'valid':
+            raise ValueError(f'{layer.name}: only stride 1, undilated, valid convolutions can be streamed')
+
+        kernel = layer.kernel.numpy()
+        self.size, channels, filters = kernel.shape
+        self.kernel = kernel.reshape(self.size * channels, filters)
+        self.bias = layer.bias.numpy() if layer.use_bias else np.zeros(filters, np.float32)
+        self.post = [activation(layer.activation)]
+        self.chunk = -(-len(self.kernel) // period)
+
+        self.buffer = np.zeros((2 * self.size, channels), dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        self.filled = 0
+        self.position = 0
+
+        # output being computed: its input window, partial sum and next row
+        self.window = None
+        self.output = None
+        self.row = 0
+
+    def push(self, x):
+        '''Called every frame, with the new input or None; returns the new output or None'''
+
+        if x is not None:
+            self.buffer[self.position] = x
+            self.buffer[self.position + self.size] = x
+            self.position = (self.position + 1) % self.size
+            self.filled += 1
+            if self.filled >= self.size:
+                self.window = self.buffer[self.position:self.position + self.size].reshape(-1).copy()
+                self.output = self.bias.copy()
+                self.row = 0
+
+        if self.window is None:
+            return None
+
+        end = self.row + self.chunk
+        self.output += self.window[self.row:end] @ self.kernel[self.row:end]
+        self.row = end
+        if self.row < len(self.kernel):
+            return None
+
+        y = self.output
+        for fn in self.post:
+            y = fn(y)
+        self.window = None
+        return y
+
+class MaxPool:
+    '''Streaming MaxPooling1D (stride = pool size, valid padding)'''
+
+    def __init__(self, layer):
+        if layer.strides != layer.pool_size or layer.padding != 'valid':
+            raise ValueError(f'{layer.name}: only non-overlapping pooling can be streamed')
+        self.size = layer.pool_size[0]
+        self.reset()
+
+    def reset(self):
+        self.maximum = None
+        self.count = 0
+
+    def push(self, x):
+        if x is None:
+            return None
+        self.maximum = x if self.count == 0 else np.maximum(self.maximum, x)
+        self.count += 1
+        if self.count < self.size:
+            return None
+        self.count = 0
+        return self.maximum
+
+class StreamingVerifier:
+    '''
+    Scores a controller stream frame by frame.
+
+    Usage:
+
+        verifier = StreamingVerifier(model)
+        for frame_inputs in stream:             # (13,) istream rows
+            score = verifier.push(frame_inputs)  # None until the first full window
+    '''
+
+    def __init__(self, model, window=30, spread=True):
+        '''
+        Parameters
+        -----------
+        model (Sequential) : SSBML-Base-Model or SSBML-Transfer-Model
+                             (Conv1D / MaxPooling1D / BatchNormalization / Dropout
+                              layers, then GlobalAveragePooling1D, then Dense layers)
+        window (int or float) : window length in seconds (the model's clip length)
+        spread (bool) : if true, split the work of every convolution over the
+                        frames until its next input, so every frame costs about
+                        the same (scores arrive 49 frames later)
+        '''
+
+        self.stages = []
+        self.head = []
+
+        layers = flatten_layers(model)
+        length = int(window * 60)
+        pooled = False
+
+        # frames between the inputs of the current stage
+        period = 1
+
+        for layer in layers:
+            if isinstance(layer, keras.layers.Dropout):
+                continue
+
+            elif pooled:
+                self.add_head_layer(layer)
+
+            elif isinstance(layer, keras.layers.Conv1D):
+                self.stages.append(Conv(layer, period if spread else 1))
+                length -= layer.kernel_size[0] - 1
+
+            elif isinstance(layer, keras.layers.MaxPooling1D):
+                self.stages.append(MaxPool(layer))
+                length //= layer.pool_size[0]
+                period *= layer.pool_size[0]
+
+            elif isinstance(layer, (keras.layers.BatchNormalization, keras.layers.Activation)):
+                if not self.stages or not isinstance(self.stages[-1], Conv):
+                    raise ValueError(f'{layer.name}: elementwise layers must follow a Conv1D')
+                if isinstance(layer, keras.layers.BatchNormalization):
+                    scale, shift = batch_norm(layer)
+                    self.stages[-1].post.append(lambda y, scale=scale, shift=shift: y * scale + shift)
+                else:
+                    self.stages[-1].post.append(activation(layer.activation))
+
+            elif isinstance(layer, keras.layers.GlobalAveragePooling1D):
+                pooled = True
+
+            else:
+                raise ValueError(f'{layer.name}: {type(layer).__name__} layers can not be streamed')
+
+        if not pooled:
+            raise ValueError('model has no GlobalAveragePooling1D layer')
+        if length < 1:
+            raise ValueError(f'a {window}s window is too short for this model')
+
+        # the last `length` outputs of the final stage make up a window
+        self.length = length
+        self.features = np.zeros((length, self.stages[-1].kernel.shape[1]), dtype=np.float32)
+        self.filled = 0
+        self.position = 0
+
+        self.score = None
+        self.frames = 0
+
+    def add_head_layer(self, layer):
+        '''Adds a layer after the global pooling, merging affine layers into Dense ones'''
+        add_dense_layer(self.head, layer)
+
+    def reset(self):
+        '''Clears the stream, eg. at the start of a new game'''
+        for stage in self.stages:
+            stage.reset()
+        self.filled = self.position = 0
+        self.score = None
+        self.frames = 0
+
+    def push(self, frame_inputs):
+        '''
+        Adds one frame to the stream
+
+        Parameters
+        -----------
+        frame_inputs (array-like) : (13,) istream row of the new frame
+
+        Returns
+        -----------
+        score (ndarray) : model output on the latest complete window,
+                          or None until the first window is complete
+        '''
+
+        self.frames += 1
+
+        # every stage runs every frame, to work on its current output
+        x = np.asarray(frame_inputs, dtype=np.float32)
+        for stage in self.stages:
+            x = stage.push(x)
+        if x is None:
+            return self.score
+
+        # a new output of the last convolution completes a new window
+        self.features[self.position] = x
+        self.position = (self.position + 1) % self.length
+        self.filled += 1
+        if self.filled < self.length:
+            return self.score
+
+        x = self.features.mean(axis=0)
+        for weights, bias, fn in self.head:
+            x = fn(x @ weights + bias)
+        self.score = x
+        return self.score
@@ -5,59 +5,86 @@ Date : 3/19/2021
 
 Python containing the Keras code to
 create SSBML-Transfer-Model by removing
-and replacing the head of SSBML-Base-Model.
+and replacing the head of SSBML-Base-Model,
+and to verify clips against many players'
+transfer models at once (MultiHeadVerifier).
 '''
 
+import numpy as np
 from tensorflow import keras
 from tensorflow.keras import metrics
 from tensorflow.keras import Sequential
 from tensorflow.keras.layers import Dense, BatchNormalization, Activation, Dropout
 from tensorflow.keras.activations import swish
 from tensorflow.keras.models import load_model
-from tensorflow_addons.losses import SigmoidFocalCrossEntropy as Focal
 
-HEAD = Sequential([
+from .stream import flatten_layers, add_dense_layer
 
-    # dense cell 1
-    Sequential([
-        Dense(128),
-        BatchNormalization(),
-        Activation(swish),
-        Dropout(.5),
-    ],  name = 'DenseCell-1'),
+NAME = 'SSBML-Transfer-Model'
 
-    # dense cell 2
-    Sequential([
-        Dense(128),
-        BatchNormalization(),
-        Activation(swish),
-        Dropout(.5),
-    ],  name = 'DenseCell-2'),
+# The default head, optimizer, loss and metrics are only built when
+# a model is re-headed (importing tensorflow_addons for the focal loss
+# and building keras objects takes seconds). HEAD, OPTIMIZER, LOSS and
+# METRICS are still importable, and build new objects on every access,
+# so transfer models never share (and co-train) one head's layers.
 
-    # final output layer
-    Dense(1, activation = 'sigmoid', name = 'output'),
+def default_head():
+    return Sequential([
 
-], name = 'Binary-Classifier')
+        # dense cell 1
+        Sequential([
+            Dense(128),
+            BatchNormalization(),
+            Activation(swish),
+            Dropout(.5),
+        ],  name = 'DenseCell-1'),
 
-NAME = 'SSBML-Transfer-Model'
+        # dense cell 2
+        Sequential([
+            Dense(128),
+            BatchNormalization(),
+            Activation(swish),
+            Dropout(.5),
+        ],  name = 'DenseCell-2'),
 
-OPTIMIZER = 'adam'
-
-LOSS = Focal()
-
-METRICS = [
-    metrics.BinaryAccuracy(name='accuracy'),
-    metrics.Precision(),
-    metrics.Recall(),
-    
-    # this is an ugly hack but it is neccessary as
-    # keras does not have simply a "specificity" metric
-    metrics.SpecificityAtSensitivity(
-        sensitivity = .01, # this doesn't matter
-        num_thresholds = 1, # so we only get score at threshold = .5
-        name = 'specificity'
-    )
-]
+        # final output layer
+        Dense(1, activation = 'sigmoid', name = 'output'),
+
+    ], name = 'Binary-Classifier')
+
+def default_optimizer():
+    return 'adam'
+
+def default_loss():
+    from tensorflow_addons.losses import SigmoidFocalCrossEntropy as Focal
+    return Focal()
+
+def default_metrics():
+    return [
+        metrics.BinaryAccuracy(name='accuracy'),
+        metrics.Precision(),
+        metrics.Recall(),
+        
+        # this is an ugly hack but it is neccessary as
+        # keras does not have simply a "specificity" metric
+        metrics.SpecificityAtSensitivity(
+            sensitivity = .01, # this doesn't matter
+            num_thresholds = 1, # so we only get score at threshold = .5
+            name = 'specificity'
+        )
+    ]
+
+DEFAULTS = {
+    'HEAD': default_head,
+    'OPTIMIZER': default_optimizer,
+    'LOSS': default_loss,
+    'METRICS': default_metrics,
+}
+
+def __getattr__(name):
+    if name in DEFAULTS:
+        return DEFAULTS[name]()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 def remove_head(
         base_model, 
@@ -91,11 +118,11 @@ def remove_head(
 
 def add_new_head(
         headless_base_model,
-        head = HEAD,
+        head = None,
         name = NAME,
-        optimizer = OPTIMIZER,
-        loss = LOSS,
-        metrics = METRICS
+        optimizer = None,
+        loss = None,
+        metrics = None
     ):
     ''' 
     Adds a new head to headless_base_model
@@ -105,27 +132,35 @@ def add_new_head(
     headless_base_model (Sequential) : base model to be re-headed
     name (string) : name of new model
     head (Sequential) : keras sequential model to act as new head
-    optimizer : optimizer for output model
-    loss : loss function for output model
-    metrics : metrics for output model
+                        (default: a new binary classifier head)
+    optimizer : optimizer for output model (default: adam)
+    loss : loss function for output model (default: sigmoid focal cross entropy)
+    metrics : metrics for output model (default: accuracy, precision, recall and specificity)
 
     Outputs (yield)
     -----------
     model (Sequential) : full model with new head
     '''
 
-    model = Sequential([headless_base_model, head], name=name)
-    model.compile(optimizer, loss, metrics)
+    model = Sequential([
+        headless_base_model,
+        default_head() if head is None else head
+    ], name=name)
+    model.compile(
+        default_optimizer() if optimizer is None else optimizer,
+        default_loss() if loss is None else loss,
+        default_metrics() if metrics is None else metrics
+    )
     model.build(input_shape=(None, None, 13))
     return model
 
 def replace_head(
         base_model,
-        head = HEAD,
+        head = None,
         name = NAME,
-        optimizer = OPTIMIZER,
-        loss = LOSS,
-        metrics = METRICS,
+        optimizer = None,
+        loss = None,
+        metrics = None,
         trainable_base = False
     ):
     ''' 
@@ -138,9 +173,10 @@ def replace_head(
     base_model (Sequential) : base model to be re-headed
     name (string) : name of new model
     head (Sequential) : keras sequential model to act as new head
-    optimizer : optimizer for output model
-    loss : loss function for output model
-    metrics : metrics for output model
+                        (default: a new binary classifier head)
+    optimizer : optimizer for output model (default: adam)
+    loss : loss function for output model (default: sigmoid focal cross entropy)
+    metrics : metrics for output model (default: accuracy, precision, recall and specificity)
 
     Outputs (yield)
     -----------
@@ -150,3 +186,212 @@ def replace_head(
     model = remove_head(base_model, trainable_base)
     model = add_new_head(model, head, name, optimizer, loss, metrics)
     return model
+
+def split_head(model):
+    '''
+    Splits the layers of a (nested) model at its last flatten layer
+
+    Returns
+    -----------
+    backbone (list) : layers up to and including the flatten layer
+                      (empty if model is only a head)
+    head (list) : layers after the flatten layer
+    '''
+
+    layers = flatten_layers(model)
+    for i in reversed(range(len(layers))):
+        if isinstance(layers[i], keras.layers.Flatten):
+            return layers[:i + 1], layers[i + 1:]
+    return [], layers
+
+class MultiHeadVerifier:
+    '''
+    Verifies clips against many players at once.
+
+    The transfer models of every player share the same headless
+    base model (replace_head freezes it) and only differ in their
+    heads. MultiHeadVerifier runs that backbone once per batch of
+    clips, then evaluates every player's head together: the Dense
+    weights of the heads (with BatchNormalization folded in and
+    Dropout left out) are stacked, so each layer of all the heads
+    is one batched matrix multiply.
+
+    Players are added and removed by editing the stacked weights,
+    the keras backbone is never rebuilt, and verifying a clip costs
+    one backbone pass however many players are registered.
+
+    Usage:
+
+        verifier = MultiHeadVerifier(base_model)
+        verifier.add_player('ABC#123', transfer_model)  # or just its head
+        scores = verifier.predict_on_batch(istreams)      # (clips, players)
+    '''
+
+    def __init__(self, base_model):
+        '''
+        Parameters
+        -----------
+        base_model (Sequential) : base model the player models were made from
+                                  (with or without its head)
+        '''
+
+        self.backbone = remove_head(base_model)
+        self.backbone_layers = flatten_layers(self.backbone)
+        self.features = self.backbone.output_shape[-1] if self.backbone.built else None
+
+        # player name -> [weights, bias, activation] of every Dense layer of its head
+        self.heads = {}
+
+        # stacked weights of the heads, rebuilt when the players change
+        self._stacked = None
+
+    @property
+    def players(self):
+        '''Names of the registered players, in the order of the score columns'''
+        return list(self.heads)
+
+    def __len__(self):
+        return len(self.heads)
+
+    def __contains__(self, name):
+        return name in self.heads
+
+    def check_backbone(self, layers):
+        '''Raises a ValueError if layers are not (a copy of) the shared backbone'''
+
+        if len(layers) != len(self.backbone_layers):
+            raise ValueError('player model was not made from this base model')
+
+        for layer, shared in zip(layers, self.backbone_layers):
+            if layer is shared:
+                continue
+            weights, shared_weights = layer.get_weights(), shared.get_weights()
+            if (
+                type(layer) is not type(shared)
+                or len(weights) != len(shared_weights)
+                or not all(np.array_equal(a, b) for a, b in zip(weights, shared_weights))
+            ):
+                raise ValueError(f'{layer.name}: player model has a different backbone (was it trained with trainable_base?)')
+
+    def add_player(self, name, model):
+        '''
+        Registers a player, or replaces their head
+
+        Parameters
+        -----------
+        name (string) : name of the player (eg. their connect code)
+        model (Sequential) : the player's transfer model (see replace_head),
+                             or only its head (Dense / BatchNormalization /
+                             Activation / Dropout layers)
+        '''
+
+        backbone, layers = split_head(model)
+        if backbone:
+            self.check_backbone(backbone)
+
+        head = []
+        for layer in layers:
+            add_dense_layer(head, layer)
+        if not head:
+            raise ValueError('player model has no head')
+
+        # every head must have the same layer shapes and activations to be stacked
+        reference = next(iter(self.heads.values()), None)
+        if reference is None:
+            if self.features is not None and head[0][0].shape[0] != self.features:
+                raise ValueError(f'head takes {head[0][0].shape[0]} features, the backbone makes {self.features}')
+        elif [(w.shape, fn) for w, _, fn in head] != [(w.shape, fn) for w, _, fn in reference]:
+            raise ValueError('head does not have the same layers as the registered heads')
+
+        self.heads[name] = head
+        self._stacked = None
+
+    def remove_player(self, name):
+        '''Unregisters a player'''
+        del self.heads[name]
+        self._stacked = None
+
+    def stacked(self):
+        '''
+        Stacked weights of the heads
+
+        Returns
+        -----------
+        layers (list) : [weights, biases, activation] of every Dense layer, where
+                        the first layer's weights are (features, players * outputs)
+                        (one matrix multiply for every head) and the others'
+                        are (players, inputs, outputs); biases are (players, outputs)
+        '''
+
+        if self._stacked is None:
+            heads = list(self.heads.values())
+            layers = []
+            for i, (weights, _, fn) in enumerate(heads[0]):
+                kernels = np.stack([head[i][0] for head in heads])
+                if i == 0:
+                    kernels = kernels.transpose(1, 0, 2).reshape(weights.shape[0], -1)
+                biases = np.stack([head[i][1] for head in heads])
+                layers.append([np.ascontiguousarray(kernels, np.float32), biases.astype(np.float32), fn])
+            self._stacked = layers
+        return self._stacked
+
+    def score_features(self, features):
+        '''
+        Scores backbone outputs with every player's head
+
+        Parameters
+        -----------
+        features (ndarray) : (clips, features) outputs of the backbone
+
+        Returns
+        -----------
+        scores (ndarray) : (clips, players) scores (or (clips, players, outputs)
+                           for heads with more than one output)
+        '''
+
+        if not self.heads:
+            raise ValueError('no players registered')
+
+        features = np.asarray(features, dtype=np.float32)
+        n_players = len(self.heads)
+        layers = self.stacked()
+
+        # first layer, for every head at once: (players, clips, outputs)
+        weights, biases, fn = layers[0]
+        x = (features @ weights).reshape(len(features), n_players, -1).transpose(1, 0, 2)
+        x = fn(x + biases[:, None])
+
+        # other layers, batched over the heads
+        for weights, biases, fn in layers[1:]:
+            x = fn(np.matmul(x, weights) + biases[:, None])
+
+        scores = x.transpose(1, 0, 2)
+        return scores[..., 0] if scores.shape[-1] == 1 else scores
+
+    def predict_on_batch(self, istreams):
+        '''
+        Parameters
+        -----------
+        istreams (ndarray) : (clips, frames, 13) istreams
+
+        Returns
+        -----------
+        scores (ndarray) : (clips, players) scores, in the order of self.players
+        '''
+
+        features = self.backbone.predict_on_batch(np.asarray(istreams, dtype=np.float32))
+        return self.score_features(features)
+
+    def verify(self, istreams):
+        '''
+        Parameters
+        -----------
+        istreams (ndarray) : (clips, frames, 13) istreams
+
+        Returns
+        -----------
+        scores (dict) : player name -> (clips,) scores
+        '''
+
+        scores = self.predict_on_batch(istreams)
+        return {name: scores[:, i] for i, name in enumerate(self.heads)}
@@ -8,7 +8,7 @@ Python module containg miscellaneous functions and objects
 
 from sys import stdout
 
-def display_progress(i, N):
+def display_progress(i, N, eta=None):
     ''' 
     Displays a "progress bar".
 
@@ -19,18 +19,29 @@ def display_progress(i, N):
     -----------
     i (int) : current iteration
     N (int) : total number of iterations in process
+    eta (float) : if given, estimated seconds left, shown after the bar
     '''
 
     bar_length = 20
 
-    progress = int((bar_length * i) // N)
-    progress_percent =  round(100 * i / N, 2)
+    # an empty process is already complete
+    if N == 0:
+        progress = bar_length
+        progress_percent = 100.0
+    else:
+        progress = int((bar_length * i) // N)
+        progress_percent =  round(100 * i / N, 2)
 
     progress_bar = ('#' * progress)
     progress_bar += ('.' * (bar_length - progress))
     progress_bar = '[' + progress_bar + ']'
 
-    stdout.write(f'\r{progress_bar} {i} of {N} - {progress_percent}% ')
+    message = f'\r{progress_bar} {i} of {N} - {progress_percent}% '
+    if eta is not None:
+        minutes, seconds = divmod(int(eta), 60)
+        message += f'- ETA {minutes}m{seconds:02d}s '
+
+    stdout.write(message)
     stdout.flush()
 
 # list of all character names, ordered by id